@@ -1,21 +1,77 @@
+import os
+
 from flask import Flask
 
+from routes.api_routes import api_bp
 from routes.dashboard_routes import dashboard_bp
 from routes.employees_routes import employees_bp
 from routes.in_progress_routes import in_progress_bp
-from services.core_services import secret_key
+from routes.metrics_routes import metrics_bp
+from services.core_services import release_connection
+from services.session_services import session_interface
+from services.metrics_services import init_metrics
+from services.log_services import init_logging
+from services.asset_services import init_assets
 
 from routes.auth_routes import auth_bp
 
-app = Flask(__name__)
-app.secret_key = secret_key
 
-# Blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(dashboard_bp)
-app.register_blueprint(in_progress_bp)
-app.register_blueprint(employees_bp)
+def create_app(config: dict = None):
+    """
+    Creates the Flask application.
+
+    The services read their settings from the environment when they are imported, so the entry points
+    (manage.py, serve.py, the benchmarks; `flask run` does it by itself) load the .env file before
+    importing this module.
+
+    :param config: Settings added to app.config, e.g. {'SECRET_KEY': ..., 'TESTING': True}.
+                   SECRET_KEY defaults to the SECRET_KEY environment variable.
+    :return: The Flask application.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config.from_mapping(config or {})
+    app.session_interface = session_interface  # Server-side sessions, the cookie only holds the session ID
+
+    # Blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(in_progress_bp)
+    app.register_blueprint(employees_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(api_bp)
+
+    # Request latency, queries per request, query and render times, exposed on /metrics
+    init_metrics(app)
+
+    # JSON logs written by a background thread, request IDs and sampled traces of the requests
+    init_logging(app)
+
+    # Hashed, precompressed and immutable static files once `python manage.py assets build` was run
+    init_assets(app)
+
+    # Give the request-scoped database connection back to the pool
+    app.teardown_appcontext(release_connection)
+
+    return app
+
+
+def warm_templates(app):
+    """
+    Compiles every template of the application, so that no request pays for it.
+    In a preforked server this runs in the master: the workers share the compiled templates.
+
+    :param app: The Flask application.
+    :return: The number of templates compiled.
+    """
+    names = app.jinja_env.list_templates()
+
+    for name in names:
+        app.jinja_env.get_template(name)
+
+    return len(names)
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
\ No newline at end of file
+    # Development server; `flask --app app run --debug` also loads the .env file
+    create_app().run(host='0.0.0.0', debug=True)
@@ -0,0 +1,3 @@
+from dotenv import load_dotenv
+
+load_dotenv()  # The benchmarks are entry points: load the .env file before the services read their settings
@@ -0,0 +1,63 @@
+"""
+Measures the cost of requests rejected by @require_role.
+
+Usage: python -m benchmarks.access_control [--requests N]
+
+Every request is sent with a non-admin (or no) session to an admin-only route. The connection pool is
+replaced by one whose connect callable counts its calls, so the report shows both the time per
+rejected request and the number of database connections the rejected requests tried to open (expected: 0).
+"""
+import argparse
+import time
+
+import services.core_services as core_services
+from app import create_app
+from services.pool_services import ConnectionPool
+
+
+ADMIN_ROUTES = [('GET', '/dashboard', None),
+                ('GET', '/employees', None),
+                ('GET', '/api/v1/employees', None),
+                ('GET', '/api/v1/employees?filterBy=asc&searchBar=pop', None),
+                ('POST', '/employees/add', {'lastName': 'Pop', 'firstName': 'Ion'}),
+                ('PUT', '/employees/edit', {'ID': 1, 'lastName': 'Pop'}),
+                ('DELETE', '/employees/delete', {'userID': 1})]
+
+NON_ADMIN_USER = {'id': 2, 'last_name': 'popescu', 'first_name': 'ion', 'role': 'Operator', 'active': True}
+
+
+def run(requests_per_route: int):
+    connect_calls = []
+
+    def counting_connect():
+        connect_calls.append(time.perf_counter())
+        return core_services.open_mysql_connection()
+
+    core_services._pool = ConnectionPool(counting_connect)
+    client = create_app().test_client()
+
+    for label, user in (('no session', None), ('non-admin session', NON_ADMIN_USER)):
+        with client.session_transaction() as session:
+            session.clear()
+
+            if user is not None:
+                session['user'] = user
+
+        print(f'\n{label}:')
+
+        for method, path, body in ADMIN_ROUTES:
+            start = time.perf_counter()
+
+            for _ in range(requests_per_route):
+                response = client.open(path, method=method, json=body)
+
+            elapsed = (time.perf_counter() - start) / requests_per_route
+            print(f'  {method:6} {path:20} -> {response.status_code}  {elapsed * 1e6:8.1f} us/request')
+
+    print(f'\nDatabase connections attempted by rejected requests: {len(connect_calls)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests sent to each route.')
+    run(parser.parse_args().requests)
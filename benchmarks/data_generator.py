@@ -0,0 +1,194 @@
+"""
+Fills the users table with synthetic Romanian employees.
+
+Usage: python -m benchmarks.data_generator --rows N [--skew S] [--seed N] [--truncate] [--sqlite PATH]
+
+Without --sqlite the rows are written to the storage backend of the application, chosen by DB_BACKEND
+(see services.repository_services; for MySQL run `python manage.py db migrate` first). With --sqlite they
+are written to a bare SQLite stand-in of the users table, the one the micro benchmarks of this package read.
+The memory backend only lives as long as the process, so filling it is only useful from the load driver.
+
+Counties, departments and roles are drawn from a Zipf-like distribution: the value of rank r (in the
+order of the lists below) has the weight 1 / r ** skew, so --skew 0 is uniform and larger values
+concentrate the employees in the first counties and roles, as in production. The same seed always
+produces the same rows, and every employee can log in with the password create_password() gives them.
+"""
+import argparse
+import datetime
+import random
+import sqlite3
+import time
+
+from services.core_services import transaction, on_commit
+from services.cache_services import invalidate_employees
+from services.search_services import name_index
+from services.employees_services import create_password
+from services.repository_services import repository, INSERT_COLUMNS
+from services.change_services import publish_reload
+from services.counter_services import count_added, count_cleared
+from services.login_services import invalidate_logins
+from services.bulk_services import DEPARTMENT_ROLES as FORM_DEPARTMENT_ROLES
+
+
+LAST_NAMES = ('Popescu', 'Ionescu', 'Popa', 'Pop', 'Radu', 'Dumitru', 'Stan', 'Stoica', 'Gheorghe', 'Matei',
+              'Ciobanu', 'Rusu', 'Munteanu', 'Constantin', 'Moldovan', 'Serban', 'Marin', 'Lazar', 'Florea',
+              'Ilie', 'Dinu', 'Nistor', 'Tudor', 'Barbu', 'Neagu', 'Cristea', 'Dobre', 'Mihai', 'Ene', 'Toma',
+              'Vasile', 'Ungureanu', 'Sandu', 'Zamfir', 'Oprea', 'Tanase', 'Preda', 'Anghel', 'Voicu', 'Dragomir',
+              'Enache', 'Iordache', 'Coman', 'Mocanu', 'Rosu', 'Craciun', 'Nedelcu', 'Avram', 'Sava', 'Olteanu')
+
+FIRST_NAMES = ('Andrei', 'Alexandru', 'Mihai', 'Ion', 'Gabriel', 'Stefan', 'Florin', 'Adrian', 'Cristian',
+               'Marius', 'Daniel', 'Bogdan', 'Razvan', 'Vlad', 'Ionut', 'Catalin', 'Sorin', 'Radu', 'Lucian',
+               'Ovidiu', 'Maria', 'Elena', 'Ioana', 'Andreea', 'Ana', 'Alexandra', 'Cristina', 'Mihaela',
+               'Gabriela', 'Daniela', 'Raluca', 'Simona', 'Alina', 'Roxana', 'Diana', 'Larisa', 'Bianca',
+               'Oana', 'Irina', 'Camelia')
+
+# Roughly in decreasing order of headcount, so that a positive skew favours the largest ones
+COUNTIES = ('Bucuresti', 'Iasi', 'Cluj', 'Prahova', 'Constanta', 'Timis', 'Suceava', 'Bacau', 'Dolj', 'Ilfov',
+            'Bihor', 'Arges', 'Galati', 'Brasov', 'Mures', 'Neamt', 'Dambovita', 'Maramures', 'Buzau', 'Olt',
+            'Arad', 'Vaslui', 'Hunedoara', 'Botosani', 'Sibiu', 'Teleorman', 'Valcea', 'Alba', 'Braila',
+            'Giurgiu', 'Satu Mare', 'Calarasi', 'Ialomita', 'Bistrita-Nasaud', 'Gorj', 'Vrancea', 'Harghita',
+            'Caras-Severin', 'Mehedinti', 'Tulcea', 'Salaj', 'Covasna')
+
+# The roles of the employee forms (bulk_services.DEPARTMENT_ROLES, which lists them from the top of each
+# department down), reversed so that the most numerous come first, with the largest department first;
+# admins are only generated as the first ADMINS rows
+DEPARTMENT_ROLES = {department: tuple(role for role in reversed(FORM_DEPARTMENT_ROLES[department]) if role != 'Admin')
+                    for department in ('Operational', 'IT')}
+
+ADMINS = 5  # The first rows, and the only ones, are active admins, so that the load driver can log in
+INACTIVE_RATE = 0.05  # Share of the other employees with an inactive (informative) account
+INSERT_BATCH_SIZE = 5000
+FIRST_EMPLOYMENT_DATE = datetime.date(2005, 1, 1)
+
+
+def zipf_weights(count: int, skew: float):
+    """
+    :param count: The number of values.
+    :param skew: The exponent of the distribution, 0 for a uniform one.
+    :return: The weights of the values, the first one the heaviest.
+    """
+    return [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def generate_employees(rows: int, skew: float = 1.0, seed: int = 1):
+    """
+    Generates synthetic employees in the column order of the users table, without the ID:
+    (last_name, first_name, password, department, role, employment_date, county, phone_number, its_active).
+
+    :param rows: The number of employees.
+    :param skew: The skew of the counties, departments and roles (see the module documentation).
+    :param seed: The seed of the random generator.
+    :return: A generator of row tuples.
+    """
+    randomizer = random.Random(seed)
+    county_weights = zipf_weights(len(COUNTIES), skew)
+    departments = tuple(DEPARTMENT_ROLES)
+    department_weights = zipf_weights(len(departments), skew)
+    role_weights = {department: zipf_weights(len(roles), skew) for department, roles in DEPARTMENT_ROLES.items()}
+    days = (datetime.date.today() - FIRST_EMPLOYMENT_DATE).days
+
+    for index in range(rows):
+        last_name = randomizer.choice(LAST_NAMES)
+        first_name = randomizer.choice(FIRST_NAMES)
+
+        if index < ADMINS:
+            department, role, its_active = 'IT', 'Admin', 1
+        else:
+            department = randomizer.choices(departments, department_weights)[0]
+            role = randomizer.choices(DEPARTMENT_ROLES[department], role_weights[department])[0]
+            its_active = 0 if randomizer.random() < INACTIVE_RATE else 1
+
+        employment_date = str(FIRST_EMPLOYMENT_DATE + datetime.timedelta(days=randomizer.randrange(days)))
+        county = randomizer.choices(COUNTIES, county_weights)[0]
+        phone_number = f'07{randomizer.randrange(10 ** 8):08d}'
+
+        # Same argument order as the add route, so the password is the one the user would have been given
+        password = create_password(last_name, first_name, employment_date, role)
+
+        yield (last_name, first_name, password, department, role, employment_date, county, phone_number, its_active)
+
+
+def _batches(rows, size: int):
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def fill_database(rows: int, skew: float = 1.0, seed: int = 1, truncate: bool = False):
+    """
+    Inserts synthetic employees through the repository, one transaction per batch, and clears the caches
+    of this process; with MySQL every batch also bumps the users version, which clears the other processes.
+
+    :param rows: The number of employees.
+    :param skew: The skew of the counties, departments and roles.
+    :param seed: The seed of the random generator.
+    :param truncate: Delete every existing user first.
+    :raises Exception: If a batch fails; the rows inserted by the previous batches stay.
+    """
+    if truncate:
+        with transaction():
+            repository.clear()
+            count_cleared()
+
+    for batch in _batches(generate_employees(rows, skew, seed), INSERT_BATCH_SIZE):
+        with transaction():
+            repository.insert_employees(batch)
+            count_added([dict(zip(INSERT_COLUMNS, row)) for row in batch])
+
+            on_commit(invalidate_employees)
+            on_commit(invalidate_logins)
+            on_commit(name_index.invalidate)
+
+    with transaction():
+        publish_reload()  # The employees pages open meanwhile reload their list
+
+
+def create_sqlite_database(rows: int, skew: float = 1.0, seed: int = 1, path: str = ':memory:'):
+    """
+    Creates a SQLite stand-in of the users table filled with synthetic employees.
+    Dates are stored as text.
+
+    :param rows: The number of employees.
+    :param skew: The skew of the counties, departments and roles.
+    :param seed: The seed of the random generator.
+    :param path: The database file, in memory by default.
+    :return: The open sqlite3 connection.
+    """
+    connection = sqlite3.connect(path)
+    connection.execute('DROP TABLE IF EXISTS users')
+    connection.execute('CREATE TABLE users (ID INTEGER PRIMARY KEY, last_name TEXT, first_name TEXT, password TEXT, '
+                       'department TEXT, role TEXT, employment_date TEXT, county TEXT, phone_number TEXT, '
+                       'its_active INTEGER)')
+    connection.executemany('INSERT INTO users (last_name, first_name, password, department, role, employment_date, '
+                           'county, phone_number, its_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           generate_employees(rows, skew, seed))
+    connection.commit()
+
+    return connection
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Employees to generate.')
+    parser.add_argument('--skew', type=float, default=1.0, help='Skew of counties, departments and roles (0: uniform).')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the random generator.')
+    parser.add_argument('--truncate', action='store_true', help='Delete the existing users first (not with --sqlite).')
+    parser.add_argument('--sqlite', metavar='PATH', help='Write to a bare SQLite stand-in of the users table.')
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+
+    if arguments.sqlite:
+        create_sqlite_database(arguments.rows, arguments.skew, arguments.seed, arguments.sqlite).close()
+    else:
+        fill_database(arguments.rows, arguments.skew, arguments.seed, arguments.truncate)
+
+    print(f'Generated {arguments.rows} employees in {time.perf_counter() - start:.1f} s')
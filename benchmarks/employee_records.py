@@ -0,0 +1,84 @@
+"""
+Compares fetching rows as raw tuples with SELECT * against fetching projected EmployeeRecord objects.
+
+Usage: python -m benchmarks.employee_records [--rows N] [--repeat N]
+
+The rows are read from an in-memory SQLite stand-in of the users table filled by benchmarks.data_generator,
+so the benchmark runs without MySQL; the driver cost is similar for both variants, the difference is the projection and the decoding.
+Dates are stored as text, so that their conversion, the same for both variants, does not hide the difference.
+The report shows the time to fetch and decode N rows, the time to read the fields the employee list
+uses from them, and the memory held by the fetched rows.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.data_generator import create_sqlite_database
+from services.employees_services import LIST_COLUMNS
+from services.record_services import USERS_COLUMNS, fetch_records, select_columns
+
+
+def fetch_tuples(connection):
+    return connection.execute('SELECT * FROM users').fetchall()
+
+
+def fetch_projected_records(connection):
+    cursor = connection.execute(f'SELECT {select_columns(LIST_COLUMNS)} FROM users')
+
+    return fetch_records(cursor, LIST_COLUMNS)
+
+
+def read_tuples(rows):
+    return [(row[0], row[1], row[2], row[4], row[5], row[6], row[8], row[9]) for row in rows]
+
+
+def read_records(rows):
+    return [(row.ID, row.last_name, row.first_name, row.department, row.role, row.employment_date, row.phone_number,
+             row.its_active) for row in rows]
+
+
+def best_time(function, repeat: int):
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def held_memory(function):
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+
+    return size
+
+
+def run(rows: int, repeat: int):
+    connection = create_sqlite_database(rows)
+    scale = 100_000 / rows
+
+    print(f'Rows: {rows}, times per 100k rows (best of {repeat})\n')
+    print(f'{"":38}{"fetch+decode":>14}{"field reads":>14}{"memory":>12}')
+
+    for label, fetch, read in ((f'tuples, SELECT * ({len(USERS_COLUMNS)} columns)', fetch_tuples, read_tuples),
+                               (f'EmployeeRecord ({len(LIST_COLUMNS)} columns)', fetch_projected_records, read_records)):
+        fetch_time, fetched = best_time(lambda: fetch(connection), repeat)
+        read_time, _ = best_time(lambda: read(fetched), repeat)
+        memory = held_memory(lambda: fetch(connection))
+
+        print(f'{label:38}{fetch_time * scale * 1000:11.1f} ms{read_time * scale * 1000:11.1f} ms'
+              f'{memory * scale / 1024 / 1024:9.1f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000, help='Rows in the table.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs timed, the best one is reported.')
+    arguments = parser.parse_args()
+    run(arguments.rows, arguments.repeat)
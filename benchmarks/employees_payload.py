@@ -0,0 +1,72 @@
+"""
+Measures the size and the encoding time of the employees sent to the employees page.
+
+Usage: python -m benchmarks.employees_payload [--rows N] [--repeat N]
+
+The page receives its employee cards from /api/v1/employees as a columnar JSON payload and renders them in
+the browser. The payload is built here the way that route builds it (encode_columnar() with the default
+fields, then compact JSON), for N synthetic employees, without a database. The report shows the bytes of
+JSON per employee and the encoding time per 1,000 rows, plus the one-off size of the shared edit form sent
+with the employees page.
+"""
+import argparse
+import json
+import random
+import time
+
+from flask import render_template
+
+from app import create_app
+from routes.api_routes import DEFAULT_EMPLOYEE_FIELDS
+from services.bulk_services import DEPARTMENT_ROLES
+from services.employees_services import LIST_COLUMNS, encode_columnar
+from services.record_services import get_decoder
+
+
+def make_employees(count: int):
+    randomizer = random.Random(1)
+    employees = []
+
+    for employee_id in range(1, count + 1):
+        department = randomizer.choice(list(DEPARTMENT_ROLES))
+        employees.append((employee_id, f'Popescu{employee_id}', 'Ion', department,
+                          randomizer.choice(DEPARTMENT_ROLES[department]),
+                          f'20{randomizer.randint(10, 24)}-0{randomizer.randint(1, 9)}-1{randomizer.randint(0, 9)}',
+                          'Cluj', f'07{randomizer.randint(10000000, 99999999)}', randomizer.randint(0, 1)))
+
+    return get_decoder(LIST_COLUMNS)(employees)
+
+
+def encode_page(employees: list):
+    payload = {'count': len(employees), 'next_cursor': None, 'version': 0,
+               **encode_columnar(employees, DEFAULT_EMPLOYEE_FIELDS)}
+
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+
+
+def run(rows: int, repeat: int):
+    employees = make_employees(rows)
+    body = encode_page(employees)
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        encode_page(employees)
+
+    elapsed = (time.perf_counter() - start) / repeat
+
+    with create_app().test_request_context():
+        form_bytes = len(render_template('partials/edit_employee_form.html').encode())
+
+    print(f'Rows encoded:               {rows}')
+    print(f'JSON bytes per employee:    {len(body.encode()) / rows:8.0f}')
+    print(f'Encode time per 1000 rows:  {elapsed * 1000 / rows * 1000:8.2f} ms')
+    print(f'Shared edit form (once):    {form_bytes:8d} bytes')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Employees encoded.')
+    parser.add_argument('--repeat', type=int, default=20, help='Encodings timed.')
+    arguments = parser.parse_args()
+    run(arguments.rows, arguments.repeat)
@@ -0,0 +1,203 @@
+"""
+Replays a mix of user traffic against the application and reports throughput and latency per route.
+
+Usage: python -m benchmarks.load_driver [--rows 1000,100000,1000000] [--duration S] [--workers N] [--skew S]
+                                        [--no-generate] [--save PATH] [--baseline PATH] [--tolerance F]
+
+For every table size, the users of the storage backend chosen by DB_BACKEND (MySQL by default) are
+deleted and refilled by benchmarks.data_generator (unless --no-generate), then the workers, each with
+its own test client logged in as a generated admin, run TRAFFIC_MIX for --duration seconds. The requests
+go through the whole application in process (routing, sessions, services and storage) without an HTTP
+server in front, so DB_BACKEND=memory or sqlite compares the backends under the same traffic.
+The users are deleted: never run this against production data.
+
+With --save the results are written as JSON; with --baseline they are compared with a previous
+--save and the command exits with status 1 if the p95 of a route got slower than --tolerance allows.
+"""
+import argparse
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from app import create_app
+from benchmarks import report
+from benchmarks.data_generator import fill_database, COUNTIES, LAST_NAMES
+from services.employees_services import create_password
+from services.repository_services import repository, ORDER_BY_ID
+
+
+# Scenario -> weight; a scenario may send several requests (search-as-you-type sends one per keystroke)
+TRAFFIC_MIX = {'login': 5, 'dashboard': 10, 'employees_page': 10, 'search': 45, 'api_page': 20, 'write': 10}
+
+DEFAULT_ROWS = (1000, 100_000, 1_000_000)
+
+
+def load_admin_credentials(limit: int = 20):
+    """
+    :param limit: The maximum number of admins returned.
+    :return: A list of (username, password) of active admins, the password computed as the add route does.
+    """
+    admins = repository.find_employees(('last_name', 'first_name', 'employment_date', 'role', 'its_active'),
+                                       role='Admin', order=ORDER_BY_ID)
+
+    return [(f'{admin.last_name} {admin.first_name}',
+             create_password(admin.last_name, admin.first_name, str(admin.employment_date), admin.role))
+            for admin in admins if admin.its_active == 1][:limit]
+
+
+class Worker(threading.Thread):
+    """
+    A simulated admin running random scenarios of TRAFFIC_MIX until the deadline.
+    """
+
+    def __init__(self, app, number: int, credentials: tuple, deadline: float, samples: dict, lock: threading.Lock):
+        super().__init__(name=f'load-worker-{number}', daemon=True)
+        self.number = number
+        self.credentials = credentials
+        self.deadline = deadline
+        self.samples = samples
+        self.lock = lock
+
+        self.client = app.test_client()
+        self.randomizer = random.Random(number)
+        self.counter = itertools.count()
+        self.recorded = defaultdict(list)
+
+    def request(self, method: str, path: str, label: str = None, **kwargs):
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        self.recorded[f'{method} {label or path}'].append((elapsed, response.status_code < 400))
+
+        return response
+
+    def login(self):
+        username, password = self.credentials
+        self.request('POST', '/', json={'username': username, 'password': password})
+
+    def dashboard(self):
+        self.request('GET', '/dashboard')
+
+    def employees_page(self):
+        self.request('GET', '/employees')
+
+    def search(self):
+        # Search-as-you-type: one request per keystroke of a name, as the search bar sends them
+        name = self.randomizer.choice(LAST_NAMES).lower()
+
+        for length in range(1, self.randomizer.randint(3, len(name)) + 1):
+            self.request('GET', f'/api/v1/employees?searchBar={name[:length]}', label='/api/v1/employees (typing)')
+
+    def api_page(self):
+        filter_by = self.randomizer.choice(['asc', 'desc', 'date_asc', 'date_desc'])
+        self.request('GET', f'/api/v1/employees?filterBy={filter_by}', label='/api/v1/employees')
+
+    def write(self):
+        last_name = f'Benchmark{self.number}x{next(self.counter)}'
+        employee = {'lastName': last_name, 'firstName': 'Test', 'department': 'Operational', 'role': 'Operator',
+                    'date': '2024-01-15', 'county': self.randomizer.choice(COUNTIES), 'phone': '0700000000',
+                    'itsActive': 1}
+
+        self.request('POST', '/employees/add', json=employee)
+
+        found = self.request('GET', f'/api/v1/employees?searchBar={last_name}&fields=ID',
+                             label='/api/v1/employees (search)').get_json(silent=True)
+
+        if not found or not found.get('count'):
+            return
+
+        user_id = found['columns']['ID'][0]
+
+        self.request('PUT', '/employees/edit', json={'ID': user_id, 'county': self.randomizer.choice(COUNTIES)})
+        self.request('DELETE', '/employees/delete', json={'userID': user_id})
+
+    def run(self):
+        scenarios = [getattr(self, name) for name in TRAFFIC_MIX]
+        weights = list(TRAFFIC_MIX.values())
+
+        try:
+            self.login()
+
+            while time.perf_counter() < self.deadline:
+                self.randomizer.choices(scenarios, weights)[0]()
+
+        finally:
+            with self.lock:
+                for route, route_samples in self.recorded.items():
+                    self.samples[route].extend(route_samples)
+
+
+def run_load(duration: float, workers: int):
+    """
+    Runs the traffic mix against the data currently in the database.
+
+    :param duration: The duration of the run, in seconds.
+    :param workers: The number of concurrent simulated admins.
+    :return: The summary of the run, see report.summarize().
+    :raises RuntimeError: If the database holds no active admin to log in with.
+    """
+    credentials = load_admin_credentials()
+
+    if not credentials:
+        raise RuntimeError('No active admin in the users table; run benchmarks.data_generator first.')
+
+    app = create_app({'LOGIN_GATE': False})  # The simulated admins log in far more often than people do
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    start = time.perf_counter()
+    threads = [Worker(app, number, credentials[number % len(credentials)], start + duration, samples, lock)
+               for number in range(workers)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return report.summarize(samples, time.perf_counter() - start)
+
+
+def main(arguments):
+    results = {}
+
+    for rows in arguments.rows:
+        if arguments.generate:
+            fill_database(rows, arguments.skew, truncate=True)
+
+        results[rows] = run_load(arguments.duration, arguments.workers)
+
+        print(report.format_summary(f'\n{rows} rows, {arguments.workers} workers, {arguments.duration:.0f} s',
+                                    results[rows]))
+
+    if arguments.save:
+        report.save_results(arguments.save, results)
+
+    if arguments.baseline:
+        regressions = report.find_regressions({str(rows): summary for rows, summary in results.items()},
+                                              report.load_results(arguments.baseline), arguments.tolerance)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=lambda value: [int(rows) for rows in value.split(',')],
+                        default=list(DEFAULT_ROWS), help='Comma-separated table sizes (default: 1000,100000,1000000).')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load per table size.')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent simulated admins.')
+    parser.add_argument('--skew', type=float, default=1.0, help='Skew of the generated data.')
+    parser.add_argument('--no-generate', dest='generate', action='store_false',
+                        help='Keep the current users instead of generating them (use a single --rows value).')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as JSON.')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare with the results of a previous --save.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 increase over the baseline.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+"""
+Measures the cost of the structured logging and of the request tracing on the request throughput.
+
+Usage: python -m benchmarks.logging_overhead [--rows N] [--requests N] [--rounds N] [--threshold F]
+                                             [--no-generate]
+
+The same sequence of admin requests (dashboard, employees page, search-as-you-type, API pages) is sent
+through a test client of three applications: without tracing (LOG_TRACING off), with the configured
+sampling (LOG_SAMPLE_RATE, 0.01 by default) and with every request traced. The modes take turns for
+--rounds short rounds of --requests requests; the overhead of a mode is the median, over the rounds, of
+its time compared with the round without tracing run next to it, so that the slower and faster periods
+of the machine cancel out. The requests go through the whole application in process, with nothing in
+front of it, so the overhead is measured at the highest request rate the process reaches: at a lower
+rate it is a smaller part of the time of a request.
+
+The records are written to LOG_FILE, the null device by default, by the writer thread of the process,
+whose time is part of the measure. The users of the storage backend chosen by DB_BACKEND are deleted and
+refilled by benchmarks.data_generator (unless --no-generate): never run this against production data.
+The command exits with status 1 if the sampled tracing costs more than --threshold.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('LOG_FILE', os.devnull)  # Before the application configures the logging
+
+from app import create_app
+from benchmarks.data_generator import fill_database, LAST_NAMES
+
+
+ADMIN_USER = {'id': 1, 'last_name': 'logging', 'first_name': 'benchmark', 'role': 'Admin', 'active': True}
+
+MODES = {'off': {'LOG_TRACING': False},
+         'sampled': {},
+         'every request': {'LOG_SAMPLE_RATE': 1.0}}
+
+
+def build_requests(count: int, seed: int = 1):
+    """
+    :param count: The number of requests.
+    :param seed: The seed of the random generator.
+    :return: A list of (method, path, json body) sent by every mode.
+    """
+    randomizer = random.Random(seed)
+    requests = []
+
+    while len(requests) < count:
+        scenario = randomizer.choice(('dashboard', 'employees', 'search', 'search', 'api'))
+
+        if scenario == 'dashboard':
+            requests.append(('GET', '/dashboard', None))
+        elif scenario == 'employees':
+            requests.append(('GET', '/employees', None))
+        elif scenario == 'api':
+            filter_by = randomizer.choice(['asc', 'desc', 'date_asc', 'date_desc'])
+            requests.append(('GET', f'/api/v1/employees?filterBy={filter_by}', None))
+        else:
+            name = randomizer.choice(LAST_NAMES).lower()
+
+            for length in range(1, min(len(name), 4) + 1):
+                requests.append(('GET', f'/api/v1/employees?searchBar={name[:length]}', None))
+
+    return requests[:count]
+
+
+def make_client(config: dict):
+    client = create_app(config).test_client()
+
+    with client.session_transaction() as session:
+        session['user'] = ADMIN_USER
+
+    return client
+
+
+def run_round(client, requests: list):
+    """
+    :return: The seconds taken by the requests.
+    :raises SystemExit: If a request fails, which would measure the error path instead.
+    """
+    start = time.perf_counter()
+
+    for method, path, body in requests:
+        response = client.open(path, method=method, json=body)
+        response.get_data()  # Consumes the streamed pages
+
+        if response.status_code >= 400:
+            raise SystemExit(f'{method} {path} answered {response.status_code}')
+
+    return time.perf_counter() - start
+
+
+def run(requests_per_round: int, rounds: int):
+    """
+    :return: Mode -> (median seconds of a round, median overhead over the round without tracing).
+    """
+    clients = {mode: make_client(config) for mode, config in MODES.items()}
+    requests = build_requests(requests_per_round)
+    durations = {mode: [] for mode in MODES}
+
+    for client in clients.values():
+        run_round(client, requests)  # Warm-up: templates, connections and caches
+
+    for number in range(rounds):
+        modes = list(MODES)
+        random.Random(number).shuffle(modes)
+
+        for mode in modes:
+            durations[mode].append(run_round(clients[mode], requests))
+
+    # Each round is compared with the round without tracing run just before or after it, so that the
+    # slower and faster periods of the machine cancel out
+    return {mode: (statistics.median(mode_durations),
+                   statistics.median(duration / baseline - 1 for duration, baseline
+                                     in zip(mode_durations, durations['off'])))
+            for mode, mode_durations in durations.items()}
+
+
+def format_results(results: dict, requests_per_round: int, rounds: int):
+    lines = [f'Logging overhead, {rounds} rounds of {requests_per_round} requests',
+             f'{"mode":<16}{"req/s":>10}{"ms/req":>10}{"overhead":>10}']
+
+    for mode, (duration, overhead) in results.items():
+        lines.append(f'{mode:<16}{requests_per_round / duration:>10.0f}{duration / requests_per_round * 1000:>10.3f}'
+                     f'{overhead * 100:>9.2f}%')
+
+    return '\n'.join(lines)
+
+
+def main(arguments):
+    if arguments.generate:
+        fill_database(arguments.rows, truncate=True)
+
+    results = run(arguments.requests, arguments.rounds)
+    print(format_results(results, arguments.requests, arguments.rounds))
+
+    overhead = results['sampled'][1]
+
+    if overhead > arguments.threshold:
+        print(f'The sampled tracing costs {overhead * 100:.2f}%, more than {arguments.threshold * 100:.2f}%')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Employees generated.')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per round.')
+    parser.add_argument('--rounds', type=int, default=100, help='Rounds per mode.')
+    parser.add_argument('--threshold', type=float, default=0.02, help='Allowed overhead of the sampled tracing.')
+    parser.add_argument('--no-generate', dest='generate', action='store_false',
+                        help='Use the employees already in the database.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,175 @@
+"""
+Floods the login route with synthetic attempts and reports the database queries they cause, with and
+without the login gate.
+
+Usage: python -m benchmarks.login_flood [--rows N] [--rates 50,200,800] [--duration S] [--users N]
+                                        [--no-generate]
+
+Every attempt is one of TRAFFIC_MIX:
+- stuffing: a username no employee has, never repeated, from one of ATTACKER_ADDRESSES;
+- guessing: the name of an employee with a wrong password, from one of ATTACKER_ADDRESSES;
+- legitimate: one of --users active employees with the right password, from an address of its own.
+For each rate of --rates, the attempts are sent at that rate for --duration seconds through a test client
+of the whole application, once with the gate off (LOGIN_GATE = False) and once with it on. The queries
+are those counted by the metrics for the login route, so the storage backend chosen by DB_BACKEND must run
+SQL (sqlite or mysql); they are reported separately for the attacks and for the legitimate logins, which
+grow with the rate and must reach the database. Without the gate the queries of the attacks grow with
+the rate of the flood; with it they stay flat: they are bounded by the limits of the attacker addresses
+and by the login caches. The share of the legitimate logins that succeeded shows that the gate does not
+lock the employees out.
+
+The users are deleted and refilled by benchmarks.data_generator (unless --no-generate): never run this
+against production data.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+from app import create_app
+from benchmarks.data_generator import fill_database, LAST_NAMES
+from services.employees_services import create_password
+from services.metrics_services import queries_per_request
+from services.repository_services import repository, ORDER_BY_ID
+from services.login_services import ip_buckets, username_buckets, invalidate_logins
+
+
+TRAFFIC_MIX = {'stuffing': 60, 'guessing': 30, 'legitimate': 10}
+
+ATTACKER_ADDRESSES = [f'203.0.113.{number}' for number in range(1, 9)]
+
+DEFAULT_RATES = (50, 200, 800)
+
+
+def load_credentials(limit: int):
+    """
+    :param limit: The maximum number of employees returned.
+    :return: A list of (username, password) of active employees of every role, the password computed as the
+             add route does.
+    """
+    employees = repository.find_employees(('last_name', 'first_name', 'employment_date', 'role', 'its_active'),
+                                          order=ORDER_BY_ID)
+
+    return [(f'{employee.last_name} {employee.first_name}',
+             create_password(employee.last_name, employee.first_name, str(employee.employment_date), employee.role))
+            for employee in employees if employee.its_active == 1][:limit]
+
+
+def reset_gate():
+    ip_buckets.clear()
+    username_buckets.clear()
+    invalidate_logins()
+
+
+def flood(client, rate: float, duration: float, credentials: list, randomizer: random.Random):
+    """
+    Sends login attempts at a fixed rate (or as fast as the application answers, if that is slower).
+
+    :return: A dictionary with the attempts made, the attempts rejected with 429, the legitimate attempts
+             and the successful ones, the queries run by the attacks and by the legitimate logins and
+             the elapsed seconds.
+    """
+    scenarios = list(TRAFFIC_MIX)
+    weights = list(TRAFFIC_MIX.values())
+    counter = itertools.count()
+    result = {'attempts': 0, 'throttled': 0, 'legitimate': 0, 'logged_in': 0, 'attack_queries': 0,
+              'legitimate_queries': 0}
+
+    start = time.perf_counter()
+    deadline = start + duration
+
+    while True:
+        now = time.perf_counter()
+
+        if now >= deadline:
+            break
+
+        next_attempt = start + result['attempts'] / rate
+
+        if next_attempt > now:
+            time.sleep(next_attempt - now)
+
+        scenario = randomizer.choices(scenarios, weights)[0]
+
+        if scenario == 'legitimate':
+            number = randomizer.randrange(len(credentials))
+            username, password = credentials[number]
+            address = f'10.1.{number // 250}.{number % 250 + 1}'
+        elif scenario == 'guessing':
+            username, password = randomizer.choice(credentials)[0], 'wrong-password'
+            address = randomizer.choice(ATTACKER_ADDRESSES)
+        else:
+            username, password = f'{randomizer.choice(LAST_NAMES)} Bot{next(counter)}', 'password'
+            address = randomizer.choice(ATTACKER_ADDRESSES)
+
+        queries_before = queries_per_request.totals('/')[0]
+        response = client.post('/', json={'username': username, 'password': password},
+                               environ_base={'REMOTE_ADDR': address})
+        response.close()  # Runs the teardown, which counts the queries of the request
+        queries = queries_per_request.totals('/')[0] - queries_before
+
+        result['attempts'] += 1
+        result['throttled'] += response.status_code == 429
+
+        if scenario == 'legitimate':
+            result['legitimate'] += 1
+            result['logged_in'] += response.status_code == 302
+            result['legitimate_queries'] += queries
+        else:
+            result['attack_queries'] += queries
+
+    result['elapsed'] = time.perf_counter() - start
+
+    return result
+
+
+def format_result(mode: str, rate: float, result: dict):
+    elapsed = result['elapsed']
+    logged_in = result['logged_in'] / result['legitimate'] * 100 if result['legitimate'] else 0
+
+    return (f'{mode:<6}{rate:>8.0f}{result["attempts"] / elapsed:>12.0f}{result["throttled"] / elapsed:>8.0f}'
+            f'{result["attack_queries"] / elapsed:>18.1f}{result["legitimate_queries"] / elapsed:>17.1f}'
+            f'{logged_in:>11.0f}%')
+
+
+def main(arguments):
+    if os.getenv('DB_BACKEND', 'mysql') == 'memory':
+        print('The memory backend runs no SQL query: use DB_BACKEND=sqlite or mysql.', file=sys.stderr)
+        return 1
+
+    if arguments.generate:
+        fill_database(arguments.rows, truncate=True)
+
+    credentials = load_credentials(arguments.users)
+
+    if not credentials:
+        print('No active employee in the users table; run benchmarks.data_generator first.', file=sys.stderr)
+        return 1
+
+    print(f'Login flood, {arguments.duration:.0f} s per rate')
+    print(f'{"gate":<6}{"offered":>8}{"attempts/s":>12}{"429/s":>8}{"attack queries/s":>18}'
+          f'{"legit queries/s":>17}{"logged in":>12}')
+
+    for gate in (False, True):
+        client = create_app({'LOGIN_GATE': gate}).test_client()
+
+        for rate in arguments.rates:
+            reset_gate()
+            result = flood(client, rate, arguments.duration, credentials, random.Random(rate))
+            print(format_result('on' if gate else 'off', rate, result))
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Employees generated.')
+    parser.add_argument('--rates', type=lambda value: [float(rate) for rate in value.split(',')],
+                        default=list(DEFAULT_RATES), help='Attempts per second, comma-separated.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of flood per rate.')
+    parser.add_argument('--users', type=int, default=200, help='Employees logging in and whose names are guessed.')
+    parser.add_argument('--no-generate', dest='generate', action='store_false',
+                        help='Use the employees already in the database.')
+    sys.exit(main(parser.parse_args()))
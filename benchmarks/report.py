@@ -0,0 +1,98 @@
+"""
+Summarizes the latencies recorded by the load driver and compares them with a saved baseline.
+"""
+import json
+import math
+
+
+def percentile(sorted_values: list, fraction: float):
+    """
+    :param sorted_values: The values, in increasing order.
+    :param fraction: The percentile as a fraction, e.g. 0.95.
+    :return: The nearest-rank percentile, or None if there is no value.
+    """
+    if not sorted_values:
+        return None
+
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def summarize(samples: dict, duration: float):
+    """
+    Computes the throughput and the latency percentiles of every route.
+
+    :param samples: Route label -> list of (latency in seconds, whether the response was a success).
+    :param duration: The wall-clock duration of the run, in seconds.
+    :return: Route label -> {'requests', 'errors', 'throughput', 'p50', 'p95', 'p99'}, the latencies
+             in milliseconds, the throughput in requests per second.
+    """
+    summary = {}
+
+    for route, route_samples in sorted(samples.items()):
+        latencies = sorted(latency * 1000 for latency, _ in route_samples)
+
+        summary[route] = {'requests': len(route_samples),
+                          'errors': sum(1 for _, success in route_samples if not success),
+                          'throughput': len(route_samples) / duration,
+                          'p50': percentile(latencies, 0.50),
+                          'p95': percentile(latencies, 0.95),
+                          'p99': percentile(latencies, 0.99)}
+
+    return summary
+
+
+def format_summary(title: str, summary: dict):
+    """
+    :param title: The title of the table.
+    :param summary: A summary returned by summarize().
+    :return: The summary as a text table.
+    """
+    lines = [title, f'{"route":34}{"requests":>10}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}']
+
+    for route, row in summary.items():
+        lines.append(f'{route:34}{row["requests"]:>10}{row["errors"]:>8}{row["throughput"]:>9.1f}'
+                     f'{row["p50"]:>9.1f}{row["p95"]:>9.1f}{row["p99"]:>9.1f}')
+
+    total = sum(row['throughput'] for row in summary.values())
+    lines.append(f'{"total":34}{"":>18}{total:>9.1f}')
+
+    return '\n'.join(lines)
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float):
+    """
+    Compares the p95 latency of every route with the one of a baseline run.
+
+    :param results: Table size -> summary, as saved by save_results().
+    :param baseline: Results of a previous run, in the same format.
+    :param tolerance: The allowed increase, as a fraction of the baseline p95 (0.2: 20% slower).
+    :return: A list of messages, one per regressed route; routes missing from either run are skipped.
+    """
+    regressions = []
+
+    for rows, summary in results.items():
+        for route, row in summary.items():
+            previous = baseline.get(rows, {}).get(route)
+
+            if previous and row['p95'] > previous['p95'] * (1 + tolerance):
+                regressions.append(f'{rows} rows, {route}: p95 {previous["p95"]:.1f} ms -> {row["p95"]:.1f} ms')
+
+    return regressions
+
+
+def save_results(path: str, results: dict):
+    """
+    :param path: The JSON file to write.
+    :param results: Table size -> summary.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({str(rows): summary for rows, summary in results.items()}, file, indent=2)
+
+
+def load_results(path: str):
+    """
+    :param path: A JSON file written by save_results().
+    :return: Table size (str) -> summary.
+    """
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,113 @@
+"""
+Measures the startup of the application: import, create_app(), warm-up and the first requests.
+
+Usage: python -m benchmarks.startup [--runs N] [--path PATH]
+
+Every run starts a fresh interpreter, which imports app.py, calls create_app() and sends GET PATH
+(/employees by default) twice through a test client logged in as an admin: the first request pays
+for the work done lazily (template compilation, connection pool, caches), the second one does not.
+Half of the runs first warm the application up as serve.py does (warm_templates() and the pool
+prefill), so the report shows how much of the first-request latency the warm-up moves out of it.
+The storage backend is the one chosen by DB_BACKEND; the median of every phase is reported.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+PHASES = ('process', 'import', 'create_app', 'warm_up', 'first_request', 'second_request')
+
+ADMIN_USER = {'id': 1, 'last_name': 'startup', 'first_name': 'benchmark', 'role': 'Admin', 'active': True}
+
+
+def probe(path: str, warm: bool):
+    """
+    Runs one startup in the current interpreter and prints its timings as JSON, in seconds.
+
+    :param path: The path requested.
+    :param warm: Warm the application up before the first request.
+    """
+    start = time.perf_counter()
+    import app as application
+    imported = time.perf_counter()
+
+    flask_app = application.create_app()
+    created = time.perf_counter()
+
+    if warm:
+        from services.core_services import get_pool
+
+        application.warm_templates(flask_app)
+        get_pool().prefill()
+
+    warmed = time.perf_counter()
+
+    client = flask_app.test_client()
+
+    with client.session_transaction() as session:
+        session['user'] = ADMIN_USER
+
+    timings = {'import': imported - start, 'create_app': created - imported, 'warm_up': warmed - created}
+
+    for phase in ('first_request', 'second_request'):
+        request_start = time.perf_counter()
+        status = client.get(path).status_code
+        timings[phase] = time.perf_counter() - request_start
+
+        if status >= 400:
+            raise SystemExit(f'GET {path} answered {status}')
+
+    print(json.dumps(timings))
+
+
+def run(runs: int, path: str):
+    """
+    :param runs: The number of fresh interpreters started per mode.
+    :param path: The path requested.
+    :return: Mode ('cold' or 'warm') -> phase -> median duration in milliseconds.
+    """
+    results = {}
+
+    for mode in ('cold', 'warm'):
+        samples = {phase: [] for phase in PHASES}
+
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--probe', '--path', path]
+                                    + (['--warm'] if mode == 'warm' else []),
+                                    capture_output=True, text=True, check=True).stdout
+            samples['process'].append(time.perf_counter() - start)
+
+            for phase, duration in json.loads(output.strip().splitlines()[-1]).items():
+                samples[phase].append(duration)
+
+        results[mode] = {phase: statistics.median(durations) * 1000 for phase, durations in samples.items()}
+
+    return results
+
+
+def format_results(results: dict, runs: int, path: str):
+    lines = [f'Startup, median of {runs} runs, GET {path}',
+             f'{"phase":<16}{"cold ms":>10}{"warm ms":>10}']
+
+    for phase in PHASES:
+        lines.append(f'{phase:<16}{results["cold"][phase]:>10.1f}{results["warm"][phase]:>10.1f}')
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters started per mode.')
+    parser.add_argument('--path', default='/employees', help='Path requested after the startup.')
+    parser.add_argument('--probe', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', action='store_true', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.probe:
+        probe(arguments.path, arguments.warm)
+    else:
+        print(format_results(run(arguments.runs, arguments.path), arguments.runs, arguments.path))
@@ -0,0 +1,176 @@
+import click
+from dotenv import load_dotenv
+
+load_dotenv()  # Before the services are imported: they read their settings from the environment
+
+from app import create_app
+from services.migration_services import migrate, get_migration_status, explain_check
+from services.core_services import get_replica_set
+from services.bulk_services import import_employees, export_employees, guess_format, IMPORT_FORMATS, \
+    IMPORT_BATCH_SIZE, IMPORT_TRANSACTION_SIZE
+from services.asset_services import build_assets, brotli
+
+
+app = create_app()
+
+
+@click.group()
+def cli():
+    """
+    Magnum OPUS management commands.
+    """
+
+
+@cli.group()
+def db():
+    """
+    Database schema commands.
+    """
+
+
+@db.command('migrate')
+@click.option('--target', type=int, default=None, help='Last migration version to apply (default: all).')
+def db_migrate(target):
+    """
+    Applies the pending migrations from the migrations directory.
+    """
+    applied = migrate(target)
+
+    if applied:
+        click.echo(f'Applied migrations: {", ".join(str(version) for version in applied)}')
+    else:
+        click.echo('The schema is up to date.')
+
+
+@db.command('status')
+def db_status():
+    """
+    Lists the migrations and whether they were applied.
+    """
+    for migration in get_migration_status():
+        state = 'applied' if migration['applied'] else 'pending'
+
+        if migration['changed']:
+            state += ' (file changed after it was applied)'
+
+        click.echo(f'{migration["version"]:04d} {migration["name"]}: {state}')
+
+
+@db.command('check-indexes')
+def db_check_indexes():
+    """
+    Runs EXPLAIN on every query emitted by the services and fails on full table scans.
+    """
+    failures, warnings = explain_check(app)
+
+    for warning in warnings:
+        click.echo(f'WARNING full scan chosen although an index exists ({warning["possible_keys"]}): {warning["sql"]}')
+
+    for failure in failures:
+        click.echo(f'FAIL full table scan on {failure["table"]}: {failure["sql"]}', err=True)
+
+    if failures:
+        raise SystemExit(1)
+
+    click.echo('No query needs a full table scan.')
+
+
+@db.command('replicas')
+def db_replicas():
+    """
+    Checks the read replicas listed in DB_REPLICAS and shows their lag; fails if one is ejected.
+    """
+    replicas = get_replica_set()
+
+    if replicas is None:
+        click.echo('No read replica: every query goes to the primary.')
+        return
+
+    replicas.check()
+
+    for replica in replicas.status():
+        state = f'healthy, {replica["lag"]:.0f} s behind' if replica['healthy'] else f'ejected ({replica["error"]})'
+        click.echo(f'{replica["name"]}: {state}')
+
+    if not all(replica['healthy'] for replica in replicas.status()):
+        raise SystemExit(1)
+
+
+@cli.group()
+def employees():
+    """
+    Employee data commands.
+    """
+
+
+@employees.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='File format (default: guessed from the extension).')
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows inserted by one statement.')
+@click.option('--transaction-size', type=int, default=IMPORT_TRANSACTION_SIZE, help='Rows committed together.')
+def employees_import(path, file_format, batch_size, transaction_size):
+    """
+    Imports the employees of a CSV or NDJSON file.
+    """
+    with open(path, 'rb') as import_file:
+        report = import_employees(import_file, file_format or guess_format(path), batch_size, transaction_size)
+
+    for rejected in report['errors']:
+        click.echo(f'line {rejected["line"]}: {" ".join(rejected["errors"])}', err=True)
+
+    click.echo(f'Imported: {report["imported"]}, rejected: {report["rejected"]}')
+
+    if report['rejected']:
+        raise SystemExit(1)
+
+
+@employees.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='File format (default: guessed from the extension).')
+def employees_export(path, file_format):
+    """
+    Exports every employee (without passwords) to a CSV or NDJSON file.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as export_file:
+        for chunk in export_employees(file_format or guess_format(path)):
+            export_file.write(chunk)
+
+    click.echo(f'Exported to {path}')
+
+
+@cli.group()
+def assets():
+    """
+    Static asset commands.
+    """
+
+
+@assets.command('build')
+def assets_build():
+    """
+    Fingerprints, compresses and optimizes the static files into static/dist; restart the server to serve them.
+    """
+    built = build_assets(app.static_folder)
+
+    for asset in built:
+        sizes = [f'{asset["size"]} B', f'built {asset["built_size"]} B']
+
+        if asset['gzip_size'] is not None:
+            sizes.append(f'gzip {asset["gzip_size"]} B')
+
+        if asset['brotli_size'] is not None:
+            sizes.append(f'br {asset["brotli_size"]} B')
+
+        click.echo(f'{asset["source"]} -> {asset["built"]} ({", ".join(sizes)})')
+
+    if brotli is None:
+        click.echo('The brotli package is not installed: only gzip variants were built.', err=True)
+
+    click.echo(f'Built {len(built)} assets; original {sum(asset["size"] for asset in built)} B, '
+               f'built {sum(asset["built_size"] for asset in built)} B.')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,41 @@
+-- Baseline schema of the users table and the indexes matching the queries of services/.
+
+CREATE TABLE IF NOT EXISTS Magnum_OPUS.users (
+    ID INT NOT NULL AUTO_INCREMENT,
+    last_name VARCHAR(100) NOT NULL,
+    first_name VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    department VARCHAR(50) NOT NULL,
+    role VARCHAR(50) NOT NULL,
+    employment_date DATE NOT NULL,
+    county VARCHAR(50) NOT NULL,
+    phone_number VARCHAR(15) NOT NULL,
+    its_active TINYINT(1) NOT NULL DEFAULT 1,
+    PRIMARY KEY (ID)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- verify_auth: last_name = ? AND first_name = ?; filter_users 'asc'/'desc': ORDER BY last_name, first_name, ID
+CREATE INDEX idx_users_name ON Magnum_OPUS.users (last_name, first_name);
+
+-- filter_users 'date_asc'/'date_desc': ORDER BY employment_date, ID
+CREATE INDEX idx_users_employment_date ON Magnum_OPUS.users (employment_date);
+
+-- filter_users with a role filter, sorted by name or by date
+CREATE INDEX idx_users_role_name ON Magnum_OPUS.users (role, last_name, first_name);
+CREATE INDEX idx_users_role_date ON Magnum_OPUS.users (role, employment_date);
+
+-- filter_users with a department filter, sorted by name or by date
+CREATE INDEX idx_users_department_name ON Magnum_OPUS.users (department, last_name, first_name);
+CREATE INDEX idx_users_department_date ON Magnum_OPUS.users (department, employment_date);
+
+-- filter_users with both filters; covers get_employees_summary (GROUP BY role, department) and DISTINCT role
+CREATE INDEX idx_users_role_department ON Magnum_OPUS.users (role, department);
+
+-- Shared version counters used by services/cache_services.py for cross-process cache invalidation
+CREATE TABLE IF NOT EXISTS Magnum_OPUS.cache_versions (
+    name VARCHAR(50) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name)
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO Magnum_OPUS.cache_versions (name, version) VALUES ('users', 0);
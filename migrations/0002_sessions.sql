@@ -0,0 +1,12 @@
+-- Server-side sessions used by services/session_services.py when SESSION_BACKEND=mysql.
+
+CREATE TABLE IF NOT EXISTS Magnum_OPUS.sessions (
+    sid VARCHAR(64) NOT NULL,
+    user_id INT NULL,
+    data TEXT NOT NULL,
+    created_at DOUBLE NOT NULL,
+    last_seen DOUBLE NOT NULL,
+    PRIMARY KEY (sid),
+    KEY idx_sessions_user_id (user_id),
+    KEY idx_sessions_last_seen (last_seen)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,13 @@
+-- Change log of the users table read by services/change_services.py (live updates of the employees page).
+
+CREATE TABLE IF NOT EXISTS Magnum_OPUS.employee_changes (
+    version BIGINT NOT NULL,
+    employee_id INT NULL,
+    operation VARCHAR(10) NOT NULL,
+    data TEXT NULL,
+    changed_at DOUBLE NOT NULL,
+    PRIMARY KEY (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Counter of the change versions; its row lock orders the versions like the commits
+INSERT IGNORE INTO Magnum_OPUS.cache_versions (name, version) VALUES ('employee_changes', 0);
@@ -0,0 +1,6 @@
+-- Recount of services/counter_services.py (GROUP BY role, department, county, its_active, employment month):
+-- read from this index instead of the rows. Its (role, department) prefix serves filter_users with both
+-- filters and DISTINCT role, so it replaces idx_users_role_department.
+CREATE INDEX idx_users_headcounts ON Magnum_OPUS.users (role, department, county, its_active, employment_date);
+
+DROP INDEX idx_users_role_department ON Magnum_OPUS.users;
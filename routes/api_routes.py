@@ -0,0 +1,158 @@
+import json
+import logging
+
+from flask import Blueprint, request, jsonify, current_app
+from services.core_services import require_role
+from services.cache_services import users_version
+from services.employees_services import filter_users, encode_columnar, LIST_COLUMNS
+from services.change_services import change_feed, stream_changes, ChangesExpiredError, CHANGES_PAGE_SIZE
+from services.counter_services import headcounts
+
+
+logger = logging.getLogger(__name__)
+
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Fields sent when the request does not choose them: what the employee cards display
+DEFAULT_EMPLOYEE_FIELDS = ('ID', 'last_name', 'first_name', 'department', 'role', 'employment_date', 'phone_number',
+                           'its_active')
+
+
+@api_bp.route('/employees')
+@require_role('Admin')
+def employees():
+    """
+    Returns one page of employees in the columnar format of encode_columnar().
+
+    Query parameters: filterBy, filterRole, filterDepartment, searchBar, pageSize and cursor, as taken by
+    employees_services.filter_users(), and fields, a comma-separated subset of LIST_COLUMNS.
+
+    The payload also holds version, the version of the change log read before the employees: the changes
+    after it (see /employees/events) may not be included in the page yet.
+
+    The ETag is the users version (cache_services.users_version()), which changes on every write:
+    a request with a matching If-None-Match gets a 304 Not Modified without reading the employees.
+    """
+    etag = users_version()
+
+    if request.if_none_match.contains(etag):
+        return _revalidate(current_app.response_class(status=304), etag)
+
+    fields = tuple(request.args['fields'].split(',')) if request.args.get('fields') else DEFAULT_EMPLOYEE_FIELDS
+
+    if not set(fields) <= set(LIST_COLUMNS):
+        return jsonify({'message': 'Campuri necunoscute.', 'category': 'Error'}), 400
+
+    version = change_feed.latest_version()
+
+    result = filter_users(request.args.get('filterBy') or None,
+                          request.args.get('filterRole') or None,
+                          request.args.get('filterDepartment') or None,
+                          request.args.get('searchBar') or None,
+                          request.args.get('pageSize'),
+                          request.args.get('cursor') or None)
+
+    if not isinstance(result, tuple):  # The filter failed and returned an error response
+        return result, 400
+
+    employees_list, next_cursor = result
+
+    payload = {'count': len(employees_list), 'next_cursor': next_cursor, 'version': version,
+               **encode_columnar(employees_list, fields)}
+
+    return _revalidate(current_app.response_class(json.dumps(payload, separators=(',', ':'), ensure_ascii=False),
+                                                  mimetype='application/json'), etag)
+
+
+def _revalidate(response, etag: str):
+    # The browser keeps the page but asks again on every use, sending the ETag in If-None-Match
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+    return response
+
+
+def _read_version(value):
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@api_bp.route('/employees/changes')
+@require_role('Admin')
+def employee_changes():
+    """
+    Returns the changes of the employees after a version, for a client catching up after a reconnection.
+
+    Query parameter: since, the last version the client has seen. At most CHANGES_PAGE_SIZE changes are
+    returned; has_more tells the client to ask again from the last one. If the changes are no longer
+    in the log, the response is 410 Gone with the latest version: the client reloads its list from there.
+    """
+    since = _read_version(request.args.get('since'))
+
+    if since is None:
+        return jsonify({'message': 'Versiune invalida.', 'category': 'Error'}), 400
+
+    try:
+        changes = change_feed.changes_since(since)
+
+    except ChangesExpiredError as expired:
+        return jsonify({'message': 'Modificarile cerute nu mai sunt disponibile.', 'category': 'Error',
+                        'version': expired.latest}), 410
+
+    except Exception as e:
+        logger.exception('Employee changes Error: %s', e)
+
+        return jsonify({'message': 'Modificarile nu au putut fi citite.', 'category': 'Error'}), 500
+
+    return jsonify({'version': changes[-1]['version'] if changes else since,
+                    'changes': changes,
+                    'has_more': len(changes) == CHANGES_PAGE_SIZE})
+
+
+@api_bp.route('/employees/events')
+@require_role('Admin')
+def employee_events():
+    """
+    Streams the changes of the employees as Server-Sent Events (see change_services.stream_changes()).
+
+    The stream starts after the Last-Event-ID header sent by a reconnecting browser, or else after the
+    since query parameter (the version of the page the client displays), or else after the latest version.
+    """
+    since = _read_version(request.headers.get('Last-Event-ID') or request.args.get('since'))
+
+    if since is None:
+        since = change_feed.latest_version() or 0
+
+    # Not streamed with the request context: the stream must not keep the request database connection
+    response = current_app.response_class(stream_changes(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sent as they come through an nginx proxy
+
+    return response
+
+
+@api_bp.route('/employees/counters/check')
+@require_role('Admin')
+def check_employee_counters():
+    """
+    Compares the employee counters of this process (see counter_services.Headcounts) with a count of the table.
+
+    Returns consistent and drift, the list of {'dimension', 'value', 'difference'} for the counters that differ
+    from the table (difference = counted - kept). The counters are not corrected: the background recount does it.
+    """
+    try:
+        drift = headcounts.check()
+
+    except Exception as e:
+        logger.exception('Check employee counters Error: %s', e)
+
+        return jsonify({'message': 'Contoarele nu au putut fi verificate.', 'category': 'Error'}), 500
+
+    return jsonify({'consistent': not drift,
+                    'recounted_at': headcounts.recounted_at,
+                    'drift': [{'dimension': dimension, 'value': value, 'difference': difference}
+                              for (dimension, value), difference in sorted(
+                                  drift.items(), key=lambda item: (item[0][0], str(item[0][1])))]})
@@ -1,5 +1,9 @@
-from flask import Blueprint, request, render_template, session, redirect, url_for, jsonify
+import math
+
+from flask import Blueprint, request, render_template, session, redirect, url_for, jsonify, current_app
 from services.auth_services import verify_auth
+from services.login_services import admit_login, login_succeeded, LoginThrottledError
+from services.session_services import make_principal
 
 
 auth_bp = Blueprint('auth', __name__)
@@ -18,7 +22,7 @@ def auth():
     :raises: None
     """
     if 'user' in session:
-        if session['user'][5] == 'Admin':
+        if session['user']['role'] == 'Admin':
                 return redirect(url_for('dashboard.dashboard_admin'))  # Redirects to the admin dashboard
 
         else:
@@ -32,24 +36,35 @@ def verify():
     """
      Checks the user's credentials and redirects or returns an error message.
 
+     The login gate (services.login_services) runs first: an attempt over the limit of its IP address or
+     of its username, or for a username no employee has, fails without querying the credentials.
+     LOGIN_GATE = False in the app config turns it off.
+
      :return: Redirect to the dashboard according to the user's role.
-     If the credentials are incorrect, it returns a JSON response with an error message and 401 status code.
+     If the credentials are incorrect, it returns a JSON response with an error message and 401 status code;
+     if there were too many attempts, with 429 status code and a Retry-After header.
      """
 
     try:
         username = request.json.get('username')
         password = request.json.get('password')
 
+        if current_app.config.get('LOGIN_GATE', True) and not admit_login(username, request.remote_addr):
+            raise ValueError('Nume de utilizator sau parola incorecta')
+
         user_data = verify_auth(username, password)
 
         if user_data:
             if user_data == 'not active':
                 raise ValueError('Acest cont nu este activ.')
 
-            session['user'] = user_data
+            login_succeeded(username, request.remote_addr)
+
+            session['user'] = make_principal(user_data)
+            session.regenerate()  # New session ID after login
 
             # Check the user's role
-            if user_data[5] == 'Admin':
+            if session['user']['role'] == 'Admin':
                 return redirect(url_for('dashboard.dashboard_admin'))  # Redirects to the admin dashboard
 
             else:
@@ -58,6 +73,12 @@ def verify():
         # If the data is incorrect, it sends an error message
         raise ValueError('Nume de utilizator sau parola incorecta')
 
+    except LoginThrottledError as throttled:
+        response = jsonify({'error_message': str(throttled)})
+        response.headers['Retry-After'] = str(math.ceil(throttled.retry_after))
+
+        return response, 429
+
     except ValueError as ve:
         return jsonify({'error_message': str(ve)}), 401
 
@@ -1,9 +1,12 @@
-from flask import Blueprint, session, render_template, redirect, url_for
-from services.core_services import handle_dashboard_access
+from datetime import date
+from flask import Blueprint, session, render_template
+from services.core_services import require_role
+from services.counter_services import headcounts
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/dashboard')
+@require_role('Admin')
 def dashboard_admin():
     """
     Renders the admin dashboard if the user is authenticated and has the 'Admin' role.
@@ -12,19 +15,19 @@ def dashboard_admin():
     or redirects to the authentication page if the user is not authenticated.
     """
 
-    if 'user' in session:  # Check if user is in session
+    user = session['user']  # Save user
 
-        user = session['user']  # Save user
+    counts = headcounts.snapshot()  # Kept up to date by the write services, no query per view
 
-        return handle_dashboard_access(user[5],
-                                       render_template('dashboard.html',
-                                                       user=user,
-                                                       employees_page='employees.employees_admin',
-                                                       locations_page='in_progress.in_progress',
-                                                       warehouses_page='in_progress.in_progress',
-                                                       tickets_page='in_progress.in_progress',
-                                                       openings_page='in_progress.in_progress')
-                                       )
-
-    else:
-        return redirect(url_for('auth.auth'))  # If user does not exist return auth page
+    return render_template('dashboard.html',
+                           user=user,
+                           total_employees=counts['total'],
+                           active_employees=counts['active'].get(1, 0),
+                           informative_employees=counts['active'].get(0, 0),
+                           hires_this_month=counts['hires'].get(date.today().strftime('%Y-%m'), 0),
+                           departments=sorted(counts['department'].items()),
+                           employees_page='employees.employees_admin',
+                           locations_page='in_progress.in_progress',
+                           warehouses_page='in_progress.in_progress',
+                           tickets_page='in_progress.in_progress',
+                           openings_page='in_progress.in_progress')
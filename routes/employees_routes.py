@@ -1,34 +1,37 @@
-from flask import Blueprint, session, redirect, url_for, render_template, request
-from services.core_services import handle_dashboard_access
-from services.employees_services import get_all_employees_by_role, create_password, add_new_employee, filter_users, \
-    delete_user, edit_user, get_all_values_from_a_column
+from flask import Blueprint, session, render_template, request, stream_with_context, current_app, jsonify
+from services.core_services import require_role
+from services.employees_services import create_password, add_new_employee, delete_user, edit_user
+from services.counter_services import get_headcount_summary
+from services.asset_services import compressed
+from services.bulk_services import import_employees, export_employees, guess_format, ImportFormatError, \
+    bulk_delete_users, bulk_edit_users
 
 employees_bp = Blueprint('employees', __name__)
 
 
 @employees_bp.route('/employees')
+@require_role('Admin')
+@compressed
 def employees_admin():
-    if 'user' in session:
-
-        user = session['user']
-
-        number_of_employees_grouped_by_role = [len(get_all_employees_by_role('Admin')),
-                                               len(get_all_employees_by_role('Suport')),
-                                               len(get_all_employees_by_role('Tehnic')),
-                                               len([employee for employee in get_all_employees_by_role() if employee[4] != 'IT'])]
-
-        return handle_dashboard_access(user[5], render_template('employees.html',
-                                                                active_page='employees',
-                                                                user=user,
-                                                                number_of_employees_grouped_by_role = number_of_employees_grouped_by_role,
-                                                                departments=get_all_values_from_a_column('department'),
-                                                                roles=get_all_values_from_a_column('role')
-                                                                ))
-    else:
-        return redirect(url_for('auth.auth'))
+    user = session['user']
+
+    summary = get_headcount_summary()
+
+    number_of_employees_grouped_by_role = [summary['roles_count'].get('Admin', 0),
+                                           summary['roles_count'].get('Suport', 0),
+                                           summary['roles_count'].get('Tehnic', 0),
+                                           summary['non_it_count']]
+
+    return render_template('employees.html',
+                           active_page='employees',
+                           user=user,
+                           number_of_employees_grouped_by_role = number_of_employees_grouped_by_role,
+                           departments=summary['departments'],
+                           roles=summary['roles'])
 
 
 @employees_bp.route('/employees/add', methods=['POST'])
+@require_role('Admin')
 def add_employee():
     new_employee_data = {'last_name': request.json.get('lastName'),
                          'first_name': request.json.get('firstName'),
@@ -43,19 +46,8 @@ def add_employee():
     return add_new_employee(new_employee_data)
 
 
-@employees_bp.route('/employees/filter', methods=['POST'])
-def filter_employees():
-    filter_by = request.json.get('filterBy')
-    filter_role = request.json.get('filterRole')
-    filter_department = request.json.get('filterDepartment')
-    search_bar = request.json.get('searchBar')
-
-    employees_list = filter_users(filter_by, filter_role, filter_department, search_bar)
-
-    return render_template('partials/employees_list.html', employees=employees_list)
-
-
 @employees_bp.route('/employees/delete', methods=['DELETE'])
+@require_role('Admin')
 def delete_employee():
     user_id = request.json.get('userID')
 
@@ -63,6 +55,7 @@ def delete_employee():
 
 
 @employees_bp.route('/employees/edit', methods=['PUT'])
+@require_role('Admin')
 def edit_employee():
     new_data_user = {
         'ID': request.json.get('ID'),
@@ -72,9 +65,82 @@ def edit_employee():
         'role': request.json.get('role'),
         'date': request.json.get('date'),
         'county': request.json.get('county'),
-        'phone': request.json.get('phone')
+        'phone': request.json.get('phone'),
+        'its_active': request.json.get('itsActive')
     }
 
-    print(new_data_user)
+    return edit_user(new_data_user)
+
+
+@employees_bp.route('/employees/delete/bulk', methods=['DELETE'])
+@require_role('Admin')
+def bulk_delete_employees():
+    """
+    Deletes the users listed in userIDs or, without it, the users matching filter
+    ({filterRole, filterDepartment, searchBar}).
+    """
+    return bulk_delete_users(request.json.get('userIDs'), request.json.get('filter'))
+
+
+@employees_bp.route('/employees/edit/bulk', methods=['PUT'])
+@require_role('Admin')
+def bulk_edit_employees():
+    """
+    Applies the same department, role, date, county or itsActive to the users listed in userIDs
+    or, without it, to the users matching filter.
+    """
+    patch = {'department': request.json.get('department'),
+             'role': request.json.get('role'),
+             'employment_date': request.json.get('date'),
+             'county': request.json.get('county'),
+             'its_active': request.json.get('itsActive')}
+
+    return bulk_edit_users(patch, request.json.get('userIDs'), request.json.get('filter'))
+
+
+@employees_bp.route('/employees/import', methods=['POST'])
+@require_role('Admin')
+def import_employees_file():
+    """
+    Imports the employees of a CSV or NDJSON file, sent as the 'file' field of a form or as the raw body.
+    The format is given by the 'format' query parameter, or guessed from the file name and content type.
+    """
+    upload = request.files.get('file')
+
+    if upload is not None:
+        stream = upload.stream
+        file_format = request.args.get('format') or guess_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        file_format = request.args.get('format') or guess_format(mimetype=request.mimetype)
+
+    try:
+        report = import_employees(stream, file_format)
+
+    except ImportFormatError as e:
+        return jsonify({'message': str(e), 'category': 'Error'}), 400
+
+    return jsonify({'message': f'{report["imported"]} angajati importati, {report["rejected"]} randuri respinse.',
+                    'category': 'Success' if not report['rejected'] else 'Info',
+                    **report}), 200
+
+
+@employees_bp.route('/employees/export')
+@require_role('Admin')
+def export_employees_file():
+    """
+    Downloads every employee as CSV (default) or NDJSON (?format=ndjson), streamed from the database.
+    """
+    file_format = request.args.get('format', 'csv')
+
+    try:
+        chunks = export_employees(file_format)
+
+    except ImportFormatError as e:
+        return jsonify({'message': str(e), 'category': 'Error'}), 400
+
+    response = current_app.response_class(stream_with_context(chunks),
+                                          mimetype='text/csv' if file_format == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename=angajati.{file_format}'
 
-    return edit_user(new_data_user)
\ No newline at end of file
+    return response
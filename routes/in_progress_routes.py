@@ -1,8 +1,10 @@
-from flask import Blueprint, session, redirect, url_for, render_template
+from flask import Blueprint, session, render_template
+from services.core_services import require_role
 
 in_progress_bp = Blueprint('in_progress', __name__)
 
 @in_progress_bp.route('/in_progress')
+@require_role()
 def in_progress():
     """
     Renders a page indicating that the section is currently under development.
@@ -11,9 +13,6 @@ def in_progress():
     or redirects to the authentication page if the user is not authenticated.
         """
 
-    if 'user' in session:
-        user = session['user']
+    user = session['user']
 
-        return render_template('in_progress.html', user=user[1])
-
-    return redirect(url_for('auth.auth'))
\ No newline at end of file
+    return render_template('in_progress.html', user=user['last_name'])
\ No newline at end of file
@@ -0,0 +1,30 @@
+import os
+import hmac
+
+from flask import Blueprint, request, Response, jsonify, abort
+from services.metrics_services import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Exposes the request, database and template metrics in the Prometheus text format.
+
+    The route is meant for the Prometheus scraper, which has no session: it is enabled by the METRICS_TOKEN
+    environment variable and the request must carry the token as 'Authorization: Bearer <token>'.
+    Without METRICS_TOKEN the route does not exist, since the metrics show every SQL statement and route.
+
+    :return: The metrics as text/plain, a JSON error with status code 401 if the token is wrong,
+             or status code 404 if no token is configured.
+    """
+    token = os.getenv('METRICS_TOKEN')
+
+    if not token:
+        abort(404)
+
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'message': 'Token invalid.', 'category': 'Error'}), 401
+
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
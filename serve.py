@@ -0,0 +1,133 @@
+"""
+Production launcher: serves the application with gunicorn worker processes forked from a preloaded master.
+
+Usage: python serve.py [--bind HOST:PORT] [--workers N] [--threads N] [--timeout S]
+
+The defaults come from WEB_BIND (0.0.0.0:8000), WEB_WORKERS (2 x CPU count + 1), WEB_THREADS (4) and
+WEB_TIMEOUT (30 seconds). Every worker serves WEB_THREADS requests at a time, so that the open streams
+of employee changes do not block it.
+
+The master imports the application, compiles its templates and freezes the garbage collector before
+forking, so the workers share that memory copy-on-write. It opens no database connection: every worker
+opens its own connection pool after the fork, then fills it before it accepts its first request.
+
+The workers share nothing in memory, so when there is more than one worker the sessions and the employees
+must live outside of the processes (SESSION_BACKEND=sqlite, DB_BACKEND=mysql), and every worker must see
+the writes of the others through the cache version row (CACHE_VERSION_ROW=1): without it a worker keeps
+its name index, counters, cached lists and login lookups as they were before the writes of the others.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()  # Before the services are imported: they read their settings from the environment
+
+import argparse
+import gc
+import logging
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from app import create_app, warm_templates
+from services.core_services import get_pool, get_replica_set
+from services.log_services import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers():
+    """
+    :return: The number of worker processes: WEB_WORKERS, or 2 x the number of CPUs + 1.
+    """
+    return int(os.getenv('WEB_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+
+
+def warm_worker(worker):
+    """
+    gunicorn post_worker_init hook: fills the connection pools (primary and healthy replicas) of a new worker
+    before it accepts requests.
+    """
+    try:
+        opened = get_pool().prefill()
+        replicas = get_replica_set()
+
+        if replicas is not None:
+            replicas.choose()  # Measures the lag of the replicas and starts their checks
+
+            for replica in replicas.replicas:
+                if replica.healthy:
+                    opened += replica.pool.prefill()
+
+        worker.log.info(f'Worker {worker.pid}: {opened} database connections opened')
+
+    except Exception as e:
+        # The worker still starts: its requests open the connections they need, or report the error
+        worker.log.warning(f'Worker {worker.pid}: the connection pool could not be filled: {e}')
+
+
+class Launcher(BaseApplication):
+    """
+    Runs the application with gunicorn, configured from the command line instead of a configuration file.
+
+    :param options: gunicorn settings, e.g. {'bind': '0.0.0.0:8000', 'workers': 4}.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once, in the master, before the workers are forked
+        app = create_app()
+        templates = warm_templates(app)
+
+        gc.collect()
+        gc.freeze()  # The collector no longer touches the objects of the master, so their pages stay shared
+
+        logger.info('Application preloaded, %s templates compiled', templates)
+
+        return app
+
+
+def main(arguments):
+    configure_logging()
+
+    if arguments.workers > 1 and (os.getenv('SESSION_BACKEND', 'memory') == 'memory'
+                                  or os.getenv('DB_BACKEND', 'mysql') == 'memory'):
+        logger.error('Several workers need SESSION_BACKEND and DB_BACKEND outside of memory, '
+                     'every worker would have its own sessions and employees.')
+        return 1
+
+    if arguments.workers > 1 and (os.getenv('DB_BACKEND', 'mysql') != 'mysql'
+                                  or os.getenv('CACHE_VERSION_ROW', '0') != '1'):
+        # Only the MySQL backend increments the version row, which the workers check to see each other's writes
+        logger.error('Several workers need DB_BACKEND=mysql and CACHE_VERSION_ROW=1, otherwise a worker keeps '
+                     'serving its search index, counters and caches without the writes of the other workers.')
+        return 1
+
+    Launcher({'bind': arguments.bind,
+              'workers': arguments.workers,
+              'worker_class': 'gthread',
+              'threads': arguments.threads,
+              'timeout': arguments.timeout,
+              'preload_app': True,
+              'post_worker_init': warm_worker,
+              'accesslog': '-'}).run()
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bind', default=os.getenv('WEB_BIND', '0.0.0.0:8000'), help='Address to listen on.')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Worker processes.')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 4)),
+                        help='Requests served at a time by a worker.')
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('WEB_TIMEOUT', 30)),
+                        help='Seconds after which a silent worker is restarted.')
+    sys.exit(main(parser.parse_args()))
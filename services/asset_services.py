@@ -0,0 +1,377 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import zlib
+from functools import wraps
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only the gzip variants are built and served
+    brotli = None
+
+
+BUILD_DIRECTORY = 'dist'  # Built assets, under the static folder
+MANIFEST_NAME = 'manifest.json'
+
+HASH_LENGTH = 10
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # A built file never changes: its name changes with its content
+
+# Files worth compressing; PNG images are already compressed
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.html', '.svg', '.json', '.ico', '.txt')
+COMPRESSION_MIN_SIZE = 512  # Smaller bodies fit in one packet anyway
+
+# Encodings in order of preference, with the suffix of their prebuilt variant
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# On-the-fly compression of HTML: fast levels, and a streamed response is flushed every STREAM_FLUSH_SIZE
+# bytes so that the browser receives its beginning before the response is complete
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STREAM_FLUSH_SIZE = 8192
+
+# Relative specifiers of ES modules: import ... from "./x.js", import "./x.js" and import("./x.js")
+_IMPORT_PATTERN = re.compile(r'''(\bfrom\s*|\bimport\s*\(?\s*)(["'])(\.{1,2}/[^"']+)\2''')
+_CSS_URL_PATTERN = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Chunks that change how the image looks are kept; text, time and physical size chunks are dropped
+_PNG_KEPT_CHUNKS = {b'IHDR', b'PLTE', b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT', b'IEND'}
+_PNG_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+
+def optimize_png(data: bytes):
+    """
+    Recompresses a PNG image losslessly: its pixel data with the best zlib settings, in a single IDAT
+    chunk, and without the metadata chunks that do not change the image.
+
+    :param data: The content of the PNG file.
+    :return: The smaller of the recompressed and the original content; the original for what is not a PNG
+             image or an animated one.
+    """
+    if not data.startswith(_PNG_SIGNATURE):
+        return data
+
+    chunks = []
+    position = len(_PNG_SIGNATURE)
+
+    while position + 8 <= len(data):
+        length, chunk_type = int.from_bytes(data[position:position + 4], 'big'), data[position + 4:position + 8]
+        chunks.append((chunk_type, data[position + 8:position + 8 + length]))
+        position += 12 + length
+
+    chunk_types = [chunk_type for chunk_type, _ in chunks]
+
+    if b'IDAT' not in chunk_types or b'acTL' in chunk_types or chunk_types[-1] != b'IEND':
+        return data
+
+    try:
+        pixels = zlib.decompress(b''.join(chunk_data for chunk_type, chunk_data in chunks if chunk_type == b'IDAT'))
+    except zlib.error:
+        return data
+
+    compressed = []
+
+    for strategy in _PNG_STRATEGIES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        compressed.append(compressor.compress(pixels) + compressor.flush())
+
+    idat = min(compressed, key=len)
+    optimized = [_PNG_SIGNATURE]
+
+    for index, (chunk_type, chunk_data) in enumerate(chunks):
+        if chunk_type == b'IDAT':
+            if chunk_types.index(b'IDAT') == index:
+                optimized.append(_png_chunk(b'IDAT', idat))
+
+        elif chunk_type in _PNG_KEPT_CHUNKS:
+            optimized.append(_png_chunk(chunk_type, chunk_data))
+
+    optimized = b''.join(optimized)
+
+    return optimized if len(optimized) < len(data) else data
+
+
+def _png_chunk(chunk_type: bytes, chunk_data: bytes):
+    return (len(chunk_data).to_bytes(4, 'big') + chunk_type + chunk_data +
+            zlib.crc32(chunk_type + chunk_data).to_bytes(4, 'big'))
+
+
+def _is_local(reference: str):
+    return not re.match(r'^([a-z][a-z0-9+.-]*:|//|/|#)', reference, re.IGNORECASE)
+
+
+def build_assets(static_folder: str):
+    """
+    Builds the static assets for production under static_folder/BUILD_DIRECTORY.
+
+    Every file gets its content hash in its name (css/employees.css -> dist/css/employees.1a2b3c4d5e.css).
+    The relative imports of the ES modules and the url() of the stylesheets are rewritten to the hashed
+    names first, so a module changes name when one of its imports does. PNG images are recompressed
+    (see optimize_png()), and the text files get a gzip variant and, with the brotli package, a brotli one.
+    The manifest maps the original names to the built ones; see init_assets().
+
+    The files of previous builds are kept, so that the pages rendered before a deploy still find theirs.
+
+    :param static_folder: The static folder of the application.
+    :return: The list of the built files {'source', 'built', 'size', 'built_size', 'gzip_size', 'brotli_size'},
+             the compressed sizes None for the files without that variant.
+    :raises ValueError: If the ES modules import each other in a cycle.
+    """
+    output = os.path.join(static_folder, BUILD_DIRECTORY)
+    sources = {}
+
+    for directory, subdirectories, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(static_folder):
+            subdirectories[:] = [subdirectory for subdirectory in subdirectories if subdirectory != BUILD_DIRECTORY]
+
+        for name in files:
+            path = os.path.join(directory, name)
+            sources[os.path.relpath(path, static_folder).replace(os.sep, '/')] = path
+
+    manifest = {}
+    variants = {}
+    built = []
+
+    def reference(source: str, target: str, importers: tuple):
+        # The built name of target, relative to the built source (both keep the directories of the originals)
+        resolved = os.path.normpath(os.path.join(os.path.dirname(source), target)).replace(os.sep, '/')
+
+        if not _is_local(target) or resolved not in sources:
+            return target
+
+        relative = os.path.relpath(build(resolved, importers + (source,))[len(BUILD_DIRECTORY) + 1:],
+                                   os.path.dirname(source) or '.').replace(os.sep, '/')
+
+        return f'./{relative}' if target.startswith('./') and not relative.startswith('.') else relative
+
+    def build(source: str, importers: tuple = ()):
+        if source in manifest:
+            return manifest[source]
+
+        if source in importers:
+            raise ValueError(f'Circular import: {" -> ".join(importers + (source,))}')
+
+        with open(sources[source], 'rb') as source_file:
+            content = source_file.read()
+
+        size = len(content)
+        extension = os.path.splitext(source)[1].lower()
+
+        if extension == '.js':
+            content = _IMPORT_PATTERN.sub(lambda match: '{0}{1}{2}{1}'.format(
+                match.group(1), match.group(2), reference(source, match.group(3), importers)),
+                content.decode('utf-8')).encode('utf-8')
+
+        elif extension == '.css':
+            content = _CSS_URL_PATTERN.sub(lambda match: 'url({0}{1}{0})'.format(
+                match.group(1), reference(source, match.group(2), importers)),
+                content.decode('utf-8')).encode('utf-8')
+
+        elif extension == '.png':
+            content = optimize_png(content)
+
+        stem, _ = os.path.splitext(source)
+        hashed = f'{BUILD_DIRECTORY}/{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}'
+        target = os.path.join(static_folder, *hashed.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        _write(target, content)
+
+        gzip_size = brotli_size = None
+
+        if extension in COMPRESSED_EXTENSIONS and len(content) >= COMPRESSION_MIN_SIZE:
+            compressed = gzip.compress(content, 9, mtime=0)  # No timestamp: the same input builds the same file
+
+            if len(compressed) < len(content):
+                _write(target + '.gz', compressed)
+                variants.setdefault(hashed, []).append('gzip')
+                gzip_size = len(compressed)
+
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+
+                if len(compressed) < len(content):
+                    _write(target + '.br', compressed)
+                    variants.setdefault(hashed, []).append('br')
+                    brotli_size = len(compressed)
+
+        manifest[source] = hashed
+        built.append({'source': source, 'built': hashed, 'size': size, 'built_size': len(content),
+                      'gzip_size': gzip_size, 'brotli_size': brotli_size})
+
+        return hashed
+
+    for source in sorted(sources):
+        build(source)
+
+    os.makedirs(output, exist_ok=True)
+    _write(os.path.join(output, MANIFEST_NAME),
+           json.dumps({'files': manifest, 'variants': variants}, indent=2, sort_keys=True).encode('utf-8'))
+
+    return built
+
+
+def _write(path: str, content: bytes):
+    # Written next to the target then renamed, so a running server never reads a partial file
+    temporary = f'{path}.tmp'
+
+    with open(temporary, 'wb') as output_file:
+        output_file.write(content)
+
+    os.replace(temporary, path)
+
+
+def load_manifest(static_folder: str):
+    """
+    :param static_folder: The static folder of the application.
+    :return: The manifest written by build_assets(), {'files': {original: built}, 'variants': {built: [encodings]}},
+             or None if the assets were not built.
+    """
+    try:
+        with open(os.path.join(static_folder, BUILD_DIRECTORY, MANIFEST_NAME), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+
+    except FileNotFoundError:
+        return None
+
+
+def accepted_encoding(available):
+    """
+    :param available: The encodings that can be sent, among those of ENCODINGS.
+    :return: The preferred encoding of ENCODINGS accepted by the client of the current request, or None.
+    """
+    for encoding, _ in ENCODINGS:
+        if encoding in available and request.accept_encodings[encoding] > 0:
+            return encoding
+
+    return None
+
+
+def init_assets(app):
+    """
+    Serves the built assets, if build_assets() was run (`python manage.py assets build`).
+
+    url_for('static', filename=...) then returns the hashed URL of the file, served with an immutable
+    Cache-Control of a year and, when the client accepts it, as its prebuilt brotli or gzip variant.
+    Without a build the static files are served as they are, as Flask does by default.
+
+    :param app: The Flask application.
+    """
+    manifest = load_manifest(app.static_folder)
+
+    if manifest is None:
+        return
+
+    files = manifest['files']
+    variants = manifest['variants']
+    suffixes = dict(ENCODINGS)
+    serve_original = app.view_functions['static']
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in files:
+            values['filename'] = files[values['filename']]
+
+    def send_static_asset(filename):
+        if not filename.startswith(f'{BUILD_DIRECTORY}/'):
+            return serve_original(filename=filename)
+
+        encoding = accepted_encoding(variants.get(filename, ()))
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if encoding is None:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+        else:
+            response = send_from_directory(app.static_folder, filename + suffixes[encoding], mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+            response.content_encoding = encoding
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+
+        return response
+
+    app.view_functions['static'] = send_static_asset
+
+
+def _compressor(encoding: str):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, encoding: str):
+    process, flush, finish = _compressor(encoding)
+    pending = 0
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+
+            data = process(chunk)
+            pending += len(chunk)
+
+            if pending >= STREAM_FLUSH_SIZE:
+                data += flush()
+                pending = 0
+
+            if data:
+                yield data
+
+        yield finish()
+
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    Compresses an HTML response with the preferred encoding the client accepts (brotli, else gzip).
+    A streamed response stays streamed: its chunks are compressed as they are produced.
+
+    :param response: The response of a view.
+    :return: The same response, compressed if it was worth it.
+    """
+    if (response.status_code != 200 or response.mimetype != 'text/html' or 'Content-Encoding' in response.headers
+            or (not response.is_streamed and response.calculate_content_length() < COMPRESSION_MIN_SIZE)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding([encoding for encoding, _ in ENCODINGS if encoding != 'br' or brotli is not None])
+
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        process, _, finish = _compressor(encoding)
+        response.set_data(process(response.get_data()) + finish())
+
+    response.content_encoding = encoding
+
+    return response
+
+
+def compressed(view):
+    """
+    Decorator compressing the HTML responses of a view, see compress_response().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return compress_response(current_app.make_response(view(*args, **kwargs)))
+
+    return wrapper
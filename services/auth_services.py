@@ -1,4 +1,35 @@
-from services.core_services import create_connection
+import logging
+
+from services.repository_services import repository
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of the logged-in user kept in the session; the password hash is only compared by the repository
+AUTH_COLUMNS = ('ID', 'last_name', 'first_name', 'role', 'its_active')
+
+# Longest username accepted; a longer one cannot be a 'LastName FirstName' of the users table
+MAX_USERNAME_LENGTH = 200
+
+
+def split_username(username):
+    """
+    Splits a username typed on the login page into the names it is checked against.
+
+    :param username: The user's full name, expected as 'LastName FirstName'.
+    :return: A tuple (last name, first name) in lower case, the first name being every word after the
+             first one, separated by single spaces; None if the username cannot be the name of an employee.
+    """
+    if not isinstance(username, str) or len(username) > MAX_USERNAME_LENGTH:
+        return None
+
+    words = username.lower().split()
+
+    if len(words) < 2:
+        return None
+
+    return words[0], ' '.join(words[1:])
 
 
 def verify_auth(username: str, password: str):
@@ -8,26 +39,21 @@ def verify_auth(username: str, password: str):
     :param username: The user's full name, expected as 'LastName FirstName'.
     :param password: The user's password.
 
-    :return: Returns the user record found in the database as a tuple if the credentials are valid,
+    :return: Returns the EmployeeRecord (columns of AUTH_COLUMNS) found in the database if the credentials
+    are valid and the account is active, 'not active' if the account is inactive,
     or None if the credentials are invalid or an error occurs.
     """
-    connection = None
-    cursor = None
+    names = split_username(username)
 
-    try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        username = username.lower().split()
-
-        sql_query = "SELECT * FROM Magnum_OPUS.users WHERE last_name = %s AND first_name = %s AND password = %s"
-        cursor.execute(sql_query, (username[0], username[1], password))
+    if names is None:
+        return None
 
-        result = cursor.fetchone()
+    try:
+        result = repository.authenticate(*names, password, AUTH_COLUMNS)
 
 
         if result:
-            if result[9] == 1:
+            if result.its_active == 1:
                 return result
             else:
                 return 'not active'
@@ -36,9 +62,4 @@ def verify_auth(username: str, password: str):
             return None
 
     except Exception as e:
-        print(f'Verify Auth ERROR: {e}')
-
-    finally:
-        if cursor is not None and connection is not None:
-            cursor.close()
-            connection.close()
\ No newline at end of file
+        logger.exception('Verify Auth ERROR: %s', e)
\ No newline at end of file
@@ -0,0 +1,474 @@
+import codecs
+import csv
+import io
+import json
+import logging
+import re
+from datetime import datetime
+from functools import partial
+
+from flask import jsonify
+
+from services.core_services import transaction, on_commit
+from services.cache_services import invalidate_employees
+from services.search_services import name_index
+from services.session_services import revoke_user_sessions
+from services.employees_services import create_password, build_filters, parse_user_id
+from services.record_services import EMPLOYEE_COLUMNS
+from services.repository_services import repository, ORDER_BY_ID, INSERT_COLUMNS
+from services.change_services import publish_upserts, publish_deletes, publish_reload
+from services.counter_services import COUNTER_COLUMNS, count_added, count_removed, count_edited
+from services.login_services import invalidate_logins
+
+
+logger = logging.getLogger(__name__)
+
+
+# Roles accepted for each department, as offered by the employee forms
+DEPARTMENT_ROLES = {'IT': ('Admin', 'Manager IT', 'Suport', 'Tehnic'),
+                    'Operational': ('Director Operational', 'Manager Regional', 'Manager Zonal', 'Manager Local',
+                                    'Operator')}
+
+# Required columns of an import file; the optional its_active column defaults to 1
+IMPORT_COLUMNS = ('last_name', 'first_name', 'department', 'role', 'employment_date', 'county', 'phone_number')
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+IMPORT_BATCH_SIZE = 500  # Rows sent by one repository.insert_employees() (a single multi-row INSERT)
+IMPORT_TRANSACTION_SIZE = 5000  # Rows committed together
+MAX_REPORTED_ERRORS = 1000  # Rejected rows listed in the report; the others are only counted
+
+EXPORT_FETCH_SIZE = 1000
+
+BULK_MAX_USERS = 5000  # Users a single bulk edit or delete may change
+
+# Fields a bulk edit may change; names and phone numbers are personal and are edited one user at a time
+BULK_EDIT_FIELDS = ('department', 'role', 'employment_date', 'county', 'its_active')
+
+_phone_pattern = re.compile(r'^[0-9]{10}$')
+
+
+class ImportFormatError(ValueError):
+    """
+    Raised when an import file cannot be read at all (unknown format, missing columns).
+    """
+
+
+class BulkRequestError(ValueError):
+    """
+    Raised when a bulk edit or delete is malformed or too large; its message is shown to the user.
+    """
+
+
+def guess_format(filename: str = None, mimetype: str = None):
+    """
+    Finds the format of an import file from its name or its content type.
+
+    :param filename: The name of the uploaded file, if any.
+    :param mimetype: The content type of the upload, if any.
+    :return: 'ndjson' for .ndjson/.jsonl files or an NDJSON content type, 'csv' otherwise.
+    """
+    if (filename or '').lower().endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson',
+                                                                                 'application/jsonl'):
+        return 'ndjson'
+
+    return 'csv'
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(codecs.getreader('utf-8-sig')(stream))
+
+    missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or ())]
+
+    if missing:
+        raise ImportFormatError(f'Coloane lipsa: {", ".join(missing)}')
+
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_ndjson(stream):
+    for line_number, line in enumerate(codecs.getreader('utf-8-sig')(stream), start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def validate_import_row(row: dict):
+    """
+    Checks one row of an import file and converts it to the values of INSERT_COLUMNS.
+
+    :param row: The row, a dictionary of column name -> value (strings for CSV).
+    :return: A tuple (values, errors). values is None when errors is not empty.
+    """
+    if row is None:
+        return None, ['Rand invalid (nu este un obiect JSON).']
+
+    values = {column: str(row.get(column) or '').strip() for column in IMPORT_COLUMNS}
+    errors = [f'Campul {column} lipseste.' for column in IMPORT_COLUMNS if not values[column]]
+
+    if errors:
+        return None, errors
+
+    for column in ('last_name', 'first_name'):
+        if len(values[column]) > 100:
+            errors.append(f'Campul {column} depaseste 100 de caractere.')
+
+    if len(values['county']) > 50:
+        errors.append('Campul county depaseste 50 de caractere.')
+
+    if values['department'] not in DEPARTMENT_ROLES:
+        errors.append(f'Departament necunoscut: {values["department"]}.')
+
+    elif values['role'] not in DEPARTMENT_ROLES[values['department']]:
+        errors.append(f'Rolul {values["role"]} nu exista in departamentul {values["department"]}.')
+
+    try:
+        datetime.strptime(values['employment_date'], '%Y-%m-%d')
+    except ValueError:
+        errors.append('Data angajarii trebuie sa fie in formatul aaaa-mm-dd.')
+
+    if not _phone_pattern.match(values['phone_number']):
+        errors.append('Numarul de telefon trebuie sa aiba 10 cifre.')
+
+    its_active = str(row.get('its_active', 1)).strip().lower()
+
+    if its_active not in ('1', '0', 'true', 'false', ''):
+        errors.append('Campul its_active trebuie sa fie 0 sau 1.')
+
+    if errors:
+        return None, errors
+
+    # Same password as an employee added through the form (the route passes the last name first)
+    password = create_password(values['last_name'], values['first_name'], values['employment_date'], values['role'])
+
+    return (values['last_name'], values['first_name'], password, values['department'], values['role'],
+            values['employment_date'], values['county'], values['phone_number'],
+            0 if its_active in ('0', 'false') else 1), []
+
+
+def _insert_chunk(rows: list, batch_size: int):
+    with transaction():
+        for start in range(0, len(rows), batch_size):
+            repository.insert_employees([values for _, values in rows[start:start + batch_size]])
+
+        publish_reload()
+        count_added([dict(zip(INSERT_COLUMNS, values)) for _, values in rows])
+
+        on_commit(invalidate_employees)
+        on_commit(invalidate_logins)
+        on_commit(name_index.invalidate)  # Multi-row inserts do not return every ID: rebuild the index
+
+
+def import_employees(stream, file_format: str = 'csv', batch_size: int = IMPORT_BATCH_SIZE,
+                     transaction_size: int = IMPORT_TRANSACTION_SIZE):
+    """
+    Adds the employees of a CSV or NDJSON file, reading it row by row.
+
+    Every row is validated and gets its password from create_password(). The valid rows are inserted by
+    repository.insert_employees() in batches of `batch_size` rows, and committed every `transaction_size` rows: a database
+    error only rejects the rows of its own transaction, the previous ones stay imported.
+
+    CSV files need a header with the columns of IMPORT_COLUMNS (its_active is optional);
+    NDJSON files have one JSON object per line with the same keys.
+
+    :param stream: A binary file-like object with the content of the file.
+    :param file_format: 'csv' or 'ndjson'.
+    :param batch_size: Rows inserted by one repository.insert_employees() call.
+    :param transaction_size: Rows committed by one transaction.
+    :return: A dictionary with the keys imported (int), rejected (int) and errors
+             (a list of {'line', 'errors'} for the first MAX_REPORTED_ERRORS rejected rows).
+    :raises ImportFormatError: If the format is unknown or the CSV header lacks required columns.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ImportFormatError(f'Format necunoscut: {file_format}')
+
+    rows = _read_csv(stream) if file_format == 'csv' else _read_ndjson(stream)
+    report = {'imported': 0, 'rejected': 0, 'errors': []}
+    pending = []  # (line number, values) of the current transaction
+
+    def reject(line_number, errors):
+        report['rejected'] += 1
+
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_number, 'errors': errors})
+
+    def flush():
+        try:
+            _insert_chunk(pending, batch_size)
+            report['imported'] += len(pending)
+
+        except Exception as e:
+            logger.exception('Import employees Error: %s', e)
+
+            for line_number, _ in pending:
+                reject(line_number, [f'Eroare la salvarea in baza de date: {e}'])
+
+        pending.clear()
+
+    for line_number, row in rows:
+        values, errors = validate_import_row(row)
+
+        if errors:
+            reject(line_number, errors)
+            continue
+
+        pending.append((line_number, values))
+
+        if len(pending) >= transaction_size:
+            flush()
+
+    if pending:
+        flush()
+
+    return report
+
+
+def export_employees(file_format: str = 'csv'):
+    """
+    Streams every employee (without the password) as CSV or NDJSON, ordered by ID.
+
+    The rows are read with repository.iter_rows(), EXPORT_FETCH_SIZE rows at a time, so the table is never
+    held in memory and the request connection stays free.
+
+    :param file_format: 'csv' or 'ndjson'.
+    :return: A generator of text chunks.
+    :raises ImportFormatError: If the format is unknown.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ImportFormatError(f'Format necunoscut: {file_format}')
+
+    def generate():
+        batches = repository.iter_rows(EMPLOYEE_COLUMNS, EXPORT_FETCH_SIZE)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        try:
+            if file_format == 'csv':
+                writer.writerow(EMPLOYEE_COLUMNS)
+
+            for rows in batches:
+                if file_format == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(EMPLOYEE_COLUMNS, row)), default=str, ensure_ascii=False))
+                        buffer.write('\n')
+
+                yield buffer.getvalue()
+
+                buffer.seek(0)
+                buffer.truncate()
+
+        finally:
+            batches.close()  # Stopped early (client gone): releases the connection of the export
+
+    return generate()
+
+
+def _parse_user_ids(user_ids):
+    """
+    :param user_ids: The userIDs of the request body.
+    :return: The distinct IDs as ints, in ascending order.
+    :raises BulkRequestError: If user_ids is not a list of ints or of strings of digits.
+    """
+    if not isinstance(user_ids, list):
+        raise BulkRequestError('Nu a fost selectat niciun utilizator.')
+
+    requested = set()
+
+    for user_id in user_ids:
+        user_id = parse_user_id(user_id)
+
+        if user_id is None:
+            raise BulkRequestError('Nu a fost selectat niciun utilizator.')
+
+        requested.add(user_id)
+
+    return sorted(requested)
+
+
+def _lock_target_ids(user_ids: list = None, filters: dict = None):
+    """
+    Locks the rows targeted by a bulk operation, in ID order. Must run inside the operation's transaction.
+
+    :param user_ids: The selected IDs; takes precedence over the filters.
+    :param filters: The filters of the employees page (filterRole, filterDepartment, searchBar).
+    :return: A tuple (requested IDs, dictionary ID -> EmployeeRecord with the COUNTER_COLUMNS of the users that exist).
+    :raises BulkRequestError: If nothing is targeted, the IDs or the filter are malformed, the filter is empty
+                              or more than BULK_MAX_USERS users are targeted.
+    """
+    if user_ids is not None:
+        requested = _parse_user_ids(user_ids)
+
+        if not requested:
+            raise BulkRequestError('Nu a fost selectat niciun utilizator.')
+
+        if len(requested) > BULK_MAX_USERS:
+            raise BulkRequestError(f'Se pot modifica cel mult {BULK_MAX_USERS} utilizatori odata.')
+
+        found = repository.find_employees(('ID', *COUNTER_COLUMNS), ids=requested, order=ORDER_BY_ID, lock=True)
+
+        return requested, {user.ID: user for user in found}
+
+    filters = filters or {}
+
+    if not isinstance(filters, dict):
+        raise BulkRequestError('Filtrul trebuie sa contina cel putin un criteriu.')
+
+    criteria, ranking = build_filters(filters.get('filterRole'), filters.get('filterDepartment'),
+                                     filters.get('searchBar'), search_limit=BULK_MAX_USERS + 1)
+
+    if ranking == []:
+        return [], {}
+
+    if not criteria:
+        raise BulkRequestError('Filtrul trebuie sa contina cel putin un criteriu.')  # Never change every user by mistake
+
+    found = {user.ID: user for user in repository.find_employees(('ID', *COUNTER_COLUMNS), **criteria,
+                                                                 order=ORDER_BY_ID, limit=BULK_MAX_USERS + 1,
+                                                                 lock=True)}
+
+    if len(found) > BULK_MAX_USERS or (ranking is not None and len(ranking) > BULK_MAX_USERS):
+        raise BulkRequestError(f'Se pot modifica cel mult {BULK_MAX_USERS} utilizatori odata.')
+
+    return list(found), found
+
+
+def _remove_from_index(user_ids: list):
+    for user_id in user_ids:
+        name_index.remove(user_id)
+
+
+def _revoke_sessions(user_ids: list):
+    for user_id in user_ids:
+        revoke_user_sessions(user_id)
+
+
+def bulk_delete_users(user_ids: list = None, filters: dict = None):
+    """
+    Deletes many users with a single repository.delete_employees() call, in one transaction, and ends their sessions.
+
+    :param user_ids: The IDs of the users to delete.
+    :param filters: Used when user_ids is None: deletes the users matching the filters of the employees page,
+                    a dictionary with the keys filterRole, filterDepartment and searchBar.
+    :return: A JSON response with a message and results, the list of {'id', 'status'} with the status
+             'deleted' or 'not_found' for every targeted ID, along with an HTTP status code.
+    """
+    try:
+        with transaction():
+            requested, found = _lock_target_ids(user_ids, filters)
+            deleted = sorted(found)
+
+            if deleted:
+                repository.delete_employees(deleted)
+                publish_deletes(deleted)
+                count_removed([found[user_id].to_dict() for user_id in deleted])
+
+                on_commit(partial(invalidate_employees, *deleted))
+                on_commit(invalidate_logins)
+                on_commit(partial(_remove_from_index, deleted))
+                on_commit(partial(_revoke_sessions, deleted))
+
+        return jsonify({'message': f'{len(deleted)} utilizatori au fost stersi.',
+                        'category': 'Success' if deleted else 'Info',
+                        'results': [{'id': user_id, 'status': 'deleted' if user_id in found else 'not_found'}
+                                    for user_id in requested]}), 200
+
+    except BulkRequestError as ve:
+        return jsonify({'message': f'{ve}',
+                        'category': 'Error'}), 400
+
+    except Exception as e:
+        logger.exception('Bulk delete users Error: %s', e)
+
+        return jsonify({'message': 'Stergerea nu a putut fi efectuata.',
+                        'category': 'Error'}), 500
+
+
+def _validate_patch(patch: dict):
+    updates = {field: patch[field] for field in BULK_EDIT_FIELDS if patch.get(field) not in (None, '')}
+
+    if not updates:
+        raise BulkRequestError('Nu a fost gasit nici un camp pentru a fii editat.')
+
+    if 'role' in updates:
+        departments = [department for department, roles in DEPARTMENT_ROLES.items() if updates['role'] in roles]
+
+        if not departments:
+            raise BulkRequestError(f'Rol necunoscut: {updates["role"]}.')
+
+        if updates.setdefault('department', departments[0]) != departments[0]:
+            raise BulkRequestError(f'Rolul {updates["role"]} nu exista in departamentul {updates["department"]}.')
+
+    elif 'department' in updates:
+        raise BulkRequestError('Schimbarea departamentului necesita si un rol.')
+
+    if 'employment_date' in updates:
+        try:
+            datetime.strptime(updates['employment_date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise BulkRequestError('Data angajarii trebuie sa fie in formatul aaaa-mm-dd.')
+
+    if 'its_active' in updates:
+        if str(updates['its_active']) not in ('0', '1'):
+            raise BulkRequestError('Campul its_active trebuie sa fie 0 sau 1.')
+
+        updates['its_active'] = int(updates['its_active'])
+
+    return updates
+
+
+def bulk_edit_users(patch: dict, user_ids: list = None, filters: dict = None):
+    """
+    Applies the same changes to many users with a single repository.update_employees() call, in one transaction.
+
+    A role implies its department, so the department may be left out of the patch when the role changes.
+    Deactivating users (its_active = 0) ends their sessions.
+
+    :param patch: The new values, a dictionary whose keys are among BULK_EDIT_FIELDS; empty values are ignored.
+    :param user_ids: The IDs of the users to edit.
+    :param filters: Used when user_ids is None: edits the users matching the filters of the employees page,
+                    a dictionary with the keys filterRole, filterDepartment and searchBar.
+    :return: A JSON response with a message and results, the list of {'id', 'status'} with the status
+             'updated' or 'not_found' for every targeted ID, along with an HTTP status code.
+    """
+    try:
+        updates = _validate_patch(patch)
+
+        with transaction():
+            requested, found = _lock_target_ids(user_ids, filters)
+            updated = sorted(found)
+
+            if updated:
+                repository.update_employees(updated, updates)
+                publish_upserts(updated)
+                count_edited([found[user_id].to_dict() for user_id in updated], updates)
+
+                on_commit(partial(invalidate_employees, *updated))
+                on_commit(invalidate_logins)
+
+                if updates.get('its_active') == 0:
+                    on_commit(partial(_revoke_sessions, updated))
+
+        return jsonify({'message': f'{len(updated)} utilizatori au fost editati.',
+                        'category': 'Success' if updated else 'Info',
+                        'results': [{'id': user_id, 'status': 'updated' if user_id in found else 'not_found'}
+                                    for user_id in requested]}), 200
+
+    except BulkRequestError as ve:
+        return jsonify({'message': f'{ve}',
+                        'category': 'Error'}), 400
+
+    except Exception as e:
+        logger.exception('Bulk edit users Error: %s', e)
+
+        return jsonify({'message': 'Editarea nu a putut fi efectuata.',
+                        'category': 'Error'}), 500
@@ -0,0 +1,395 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from services.core_services import create_connection, replica_staleness, reads_pinned_to_primary
+from services.metrics_services import register_gauges
+from services.record_services import EmployeeRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+# Namespaces that hold lists or aggregates built from many rows; any write can change them.
+LIST_NAMESPACES = ('filter_users', 'get_all_employees_by_role', 'get_all_values_from_a_column')
+
+# Namespace that holds single employees keyed by ID.
+EMPLOYEE_NAMESPACE = 'get_employee_by_id'
+
+
+class TTLCache:
+    """
+    A thread-safe, bounded cache with LRU eviction and a time to live for each entry.
+
+    Keys are tuples whose first element is a namespace, so a whole namespace can be invalidated at once.
+
+    :param max_size: The maximum number of entries kept; the least recently used entry is evicted first.
+    :param ttl: The number of seconds an entry stays valid.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Looks up a key in the cache.
+
+        :param key: The key to look up.
+        :return: A tuple (found, value). `found` is False if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        """
+        Stores a value in the cache, evicting the least recently used entry if the cache is full.
+
+        :param key: The key of the entry.
+        :param value: The value to store.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Removes a single entry from the cache.
+
+        :param key: The key of the entry to remove.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_namespaces(self, *namespaces):
+        """
+        Removes every entry whose key starts with one of the given namespaces.
+
+        :param namespaces: The namespaces to remove.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in namespaces]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        :return: A dictionary with the keys size, max_size, ttl, hits, misses and evictions.
+        """
+        with self._lock:
+            return {'size': len(self._entries),
+                    'max_size': self.max_size,
+                    'ttl': self.ttl,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+employees_cache = TTLCache(max_size=int(os.getenv('CACHE_MAX_SIZE', 1024)),
+                           ttl=float(os.getenv('CACHE_TTL', 30)))
+
+# Cross-process invalidation through the Magnum_OPUS.cache_versions row named 'users'.
+# Every write increments the row; each process compares it with the last version it has seen
+# at most once every CACHE_VERSION_CHECK_INTERVAL seconds and clears its cache when it changed.
+_version_row_enabled = os.getenv('CACHE_VERSION_ROW', '0') == '1'
+_version_check_interval = float(os.getenv('CACHE_VERSION_CHECK_INTERVAL', 1))
+_version_state = {'version': None, 'checked_at': 0.0}
+_version_lock = threading.Lock()
+
+# Callbacks run when another process changed the users table (see on_remote_change)
+_remote_change_listeners = []
+
+# Local users version: incremented whenever the cached employee data is dropped, i.e. after every write
+# of this process and every change seen in the version row. It keys the in-flight computations of
+# cached() and, with the process ID, makes the ETag of users_version().
+_process_id = uuid.uuid4().hex[:12]
+_generation = {'value': 0, 'changed_at': 0.0}
+
+# Computations of cached() in progress: (generation, key) -> _Flight
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_flight_stats = {'coalesced': 0}  # Calls that waited for the computation of another caller
+
+
+class _Flight:
+    """
+    A computation of a cached service shared by the concurrent callers with the same arguments.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.shared = False  # Whether the value may be returned to the waiting callers
+
+
+def _advance_generation():
+    with _version_lock:
+        _generation['value'] += 1
+        _generation['changed_at'] = time.monotonic()
+
+
+def _settling():
+    # With read replicas, the reads made right after a write may not see it yet
+    return time.monotonic() - _generation['changed_at'] < replica_staleness()
+
+
+def _drop_cached(drop):
+    """
+    Runs a function removing cache entries between two increments of the local users version.
+    The first one stops the computations in flight from caching their (possibly stale) result; the second
+    one invalidates the ETags given out while the entries were being removed.
+
+    :param drop: A function without arguments.
+    """
+    _advance_generation()
+    drop()
+    _advance_generation()
+
+
+def users_version():
+    """
+    Returns a token that changes whenever the employee data served by this process may have changed,
+    used as the ETag of the employee lists.
+
+    The token is made of the process ID and the local users version, so it never matches across
+    processes. Without the version row, writes of other processes are not seen: the token then also
+    changes every CACHE_TTL seconds, so a client is never served stale data longer than by the cache.
+    With read replicas, the token given out while the replicas may still miss the last write changes
+    once they caught up, so a list read from a lagging replica is not revalidated forever.
+
+    :return: A string.
+    """
+    check_remote_changes()
+
+    with _version_lock:
+        generation = _generation['value']
+        settling = '.settling' if _settling() else ''
+
+    if _version_row_enabled:
+        return f'{_process_id}.{generation}{settling}'
+
+    return f'{_process_id}.{generation}.{int(time.monotonic() // employees_cache.ttl)}{settling}'
+
+
+def on_remote_change(callback):
+    """
+    Registers a callback that is run when the version row shows that another process wrote to the users table.
+    Used by the in-memory structures that, like the cache, must be rebuilt after such a write.
+
+    :param callback: A function without arguments.
+    :return: The callback, so the function can be used as a decorator.
+    """
+    _remote_change_listeners.append(callback)
+    return callback
+
+
+def _sync_version():
+    """
+    Clears the local cache if another process changed the users table since the last check.
+    """
+    now = time.monotonic()
+
+    with _version_lock:
+        if now - _version_state['checked_at'] < _version_check_interval:
+            return
+
+        _version_state['checked_at'] = now
+
+    connection = None
+    cursor = None
+
+    try:
+        connection = create_connection()
+        cursor = connection.cursor()
+
+        cursor.execute("SELECT version FROM Magnum_OPUS.cache_versions WHERE name = 'users'")
+        row = cursor.fetchone()
+        version = row[0] if row else None
+
+        with _version_lock:
+            changed = version != _version_state['version']
+            _version_state['version'] = version
+
+        if changed:
+            _drop_cached(employees_cache.clear)
+
+            for callback in _remote_change_listeners:
+                callback()
+
+    except Exception as e:
+        _drop_cached(employees_cache.clear)  # Without the version we cannot tell whether the cache is stale
+        logger.error('Cache version check Error: %s', e)
+
+    finally:
+        if connection is not None and cursor is not None:
+            cursor.close()
+            connection.close()
+
+
+def cached(function):
+    """
+    Caches the result of a read service in the employees cache.
+
+    The cache key is the function name followed by its arguments. Only lists, tuples, dictionaries and
+    records are cached, so error results (None or a JSON response) are always recomputed.
+
+    Concurrent misses on the same key are coalesced (single flight): the first caller runs the function
+    and the others wait for its result instead of sending the same query. A caller arriving after a write
+    does not join a computation started before it, and that computation is not cached.
+
+    With read replicas, the results computed while the replicas may still miss the last write are not
+    cached, and a session in its read-your-writes window bypasses the cache (its reads go to the primary).
+
+    :param function: The service function to cache.
+    :return: The wrapped function.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        check_remote_changes()
+
+        if replica_staleness() and reads_pinned_to_primary():
+            return function(*args, **kwargs)
+
+        key = (function.__name__, *args, *sorted(kwargs.items()))
+        found, value = employees_cache.get(key)
+
+        if found:
+            return value
+
+        with _version_lock:
+            generation = _generation['value']
+
+        flight_key = (generation, key)
+
+        with _in_flight_lock:
+            flight = _in_flight.get(flight_key)
+            leader = flight is None
+
+            if leader:
+                flight = _in_flight[flight_key] = _Flight()
+            else:
+                _flight_stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+
+            if flight.shared:
+                return flight.value
+
+            return function(*args, **kwargs)  # The first caller failed: no shared error response
+
+        try:
+            value = function(*args, **kwargs)
+
+            if isinstance(value, (list, tuple, dict, EmployeeRecord)):
+                flight.value, flight.shared = value, True
+
+                with _version_lock:
+                    if generation == _generation['value'] and not _settling():
+                        employees_cache.set(key, value)
+
+            return value
+
+        finally:
+            with _in_flight_lock:
+                del _in_flight[flight_key]
+
+            flight.done.set()
+
+    return wrapper
+
+
+def check_remote_changes():
+    """
+    Checks the version row (if enabled) so that writes made by other processes become visible.
+    The check runs at most once every CACHE_VERSION_CHECK_INTERVAL seconds.
+    """
+    if _version_row_enabled:
+        _sync_version()
+
+
+def bump_version(cursor):
+    """
+    Increments the shared users version so that the caches of the other processes are cleared.
+    Must be called on the cursor of the write, before the commit, so that both happen atomically.
+
+    :param cursor: The cursor used by the write operation.
+    """
+    if _version_row_enabled:
+        cursor.execute("UPDATE Magnum_OPUS.cache_versions SET version = version + 1 WHERE name = 'users'")
+
+
+def invalidate_employees(*employee_ids: int):
+    """
+    Removes the cached entries affected by a write to the users table.
+
+    Every list and aggregate is dropped; of the single-employee entries only the ones of the
+    written employees are dropped. The local users version is advanced, which changes the ETags.
+
+    :param employee_ids: The IDs of the employees that were edited or deleted; none for an insert.
+    """
+    def drop():
+        employees_cache.invalidate_namespaces(*LIST_NAMESPACES)
+
+        for employee_id in employee_ids:
+            # The ID may have been cached as a string (from a JSON body) or as an int
+            employees_cache.invalidate((EMPLOYEE_NAMESPACE, str(employee_id)))
+
+            if str(employee_id).isdigit():
+                employees_cache.invalidate((EMPLOYEE_NAMESPACE, int(employee_id)))
+
+    _drop_cached(drop)
+
+
+def get_cache_stats():
+    """
+    Returns the statistics of the employees cache.
+
+    :return: A dictionary with the cache counters (hits, misses, evictions, size, ...) and coalesced,
+             the number of calls that waited for the same computation of another caller.
+    """
+    with _in_flight_lock:
+        coalesced = _flight_stats['coalesced']
+
+    return {**employees_cache.stats(), 'coalesced': coalesced}
+
+
+@register_gauges
+def _cache_gauges():
+    return [(f'employees_cache_{name}', f'Employees cache statistic: {name}.', value)
+            for name, value in get_cache_stats().items()]
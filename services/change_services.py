@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from services.core_services import on_commit
+from services.metrics_services import register_gauges
+from services.repository_services import repository
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns sent with every changed employee: what the employee cards display
+CHANGE_COLUMNS = ('ID', 'last_name', 'first_name', 'department', 'role', 'employment_date', 'county', 'phone_number',
+                  'its_active')
+
+# Operations of the change log
+UPSERT = 'upsert'  # The employee was added or edited; the change holds its new row
+DELETE = 'delete'
+RELOAD = 'reload'  # Rows were changed without their IDs (import): the clients reload their list
+
+CHANGES_PAGE_SIZE = 500  # Changes returned by one catch-up request
+
+# Recent changes kept in memory, so that the subscribers of this process do not query the log
+_buffer_size = int(os.getenv('CHANGE_BUFFER_SIZE', 1000))
+# Seconds between two reads of the log; the changes of this process are read right after their commit
+_poll_interval = float(os.getenv('CHANGE_POLL_INTERVAL', 1))
+# Number of changes kept in the log; a client further behind reloads its list
+_retention = int(os.getenv('CHANGE_RETENTION', 100_000))
+_prune_interval = float(os.getenv('CHANGE_PRUNE_INTERVAL', 600))
+
+# Server-Sent Events: a comment is sent after this many idle seconds so that proxies keep the connection, and the
+# stream is closed after SSE_MAX_DURATION seconds: the browser reconnects, which checks the session again
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', 300))
+SSE_RETRY_MILLISECONDS = 3000
+
+
+class ChangesExpiredError(ValueError):
+    """
+    Raised when the changes after a version are no longer in the log (pruned, or the log was reset).
+
+    :param latest: The latest version of the log, from which the client can start again after reloading.
+    """
+
+    def __init__(self, latest: int):
+        super().__init__(f'Changes expired, latest version is {latest}')
+        self.latest = latest
+
+
+def _decode(version: int, employee_id: int, operation: str, data: str):
+    return {'version': version, 'op': operation, 'id': employee_id, 'row': json.loads(data) if data else None}
+
+
+class ChangeFeed:
+    """
+    Reads the change log for the subscribers of this process.
+
+    One thread at a time reads the new changes, at most once every poll interval (or right after a local
+    commit, see notify()), and keeps the latest ones in a buffer: the subscribers are served from memory
+    and wait on a condition instead of querying the log each.
+
+    :param buffer_size: The number of recent changes kept in memory.
+    :param poll_interval: The seconds between two reads of the log.
+    """
+
+    def __init__(self, buffer_size: int = 1000, poll_interval: float = 1):
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+
+        self._condition = threading.Condition()
+        self._buffer = deque()  # Decoded changes, in version order
+        self._complete_after = None  # The buffer holds every change after this version
+        self._version = None  # Latest version read, None until the first read
+        self._checked_at = 0.0
+        self._pruned_at = time.monotonic()
+        self._dirty = False  # A local change was committed since the last read
+        self._refreshing = False
+
+        self.subscribers = 0
+
+    def subscribe(self):
+        """
+        Counts an open stream.
+        """
+        with self._condition:
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        """
+        Counts a closed stream.
+        """
+        with self._condition:
+            self.subscribers -= 1
+
+    def notify(self):
+        """
+        Wakes the subscribers up after the commit of a local change, without waiting for the next poll.
+        """
+        with self._condition:
+            self._dirty = True
+            self._condition.notify_all()
+
+    def _refresh(self):
+        with self._condition:
+            if self._refreshing or (not self._dirty and time.monotonic() - self._checked_at < self.poll_interval):
+                return
+
+            self._refreshing = True
+            self._dirty = False
+            version = self._version
+
+        changes = []
+
+        try:
+            if version is None:
+                version = repository.change_bounds()[1]
+            else:
+                changes = [_decode(*row) for row in repository.changes_since(version, self.buffer_size)]
+
+            self._prune(changes[-1]['version'] if changes else version)
+
+        except Exception as e:
+            logger.exception('Change feed Error: %s', e)
+
+        finally:
+            with self._condition:
+                if self._version is None:
+                    self._version = self._complete_after = version
+
+                self._buffer.extend(changes)
+
+                while len(self._buffer) > self.buffer_size:
+                    self._complete_after = self._buffer.popleft()['version']
+
+                if changes:
+                    self._version = changes[-1]['version']
+                    # A notify() during the read is kept; a full read means there may be more to read
+                    self._dirty = self._dirty or len(changes) == self.buffer_size
+
+                self._refreshing = False
+                self._checked_at = time.monotonic()
+                self._condition.notify_all()
+
+    def _prune(self, latest: int):
+        if time.monotonic() - self._pruned_at < _prune_interval or latest is None or latest <= _retention:
+            return
+
+        self._pruned_at = time.monotonic()
+        repository.prune_changes(latest - _retention + 1)
+
+    def latest_version(self):
+        """
+        :return: The latest version read from the log (a few moments old at most), or None if it could not be read.
+        """
+        self._refresh()
+
+        with self._condition:
+            return self._version
+
+    def changes_since(self, version: int, limit: int = CHANGES_PAGE_SIZE):
+        """
+        Returns the changes after a version.
+
+        :param version: The last version the client has seen.
+        :param limit: The maximum number of changes returned.
+        :return: A list of changes {'version', 'op', 'id', 'row'}, in version order.
+        :raises ChangesExpiredError: If some of the changes are no longer in the log.
+        """
+        self._refresh()
+
+        with self._condition:
+            if self._complete_after is not None and self._complete_after <= version <= self._version:
+                return [change for change in self._buffer if change['version'] > version][:limit]
+
+        # Older than the buffer, or newer than the last read (written by another process meanwhile)
+        oldest, latest = repository.change_bounds()
+
+        if version > latest or (version < latest and (oldest is None or version < oldest - 1)):
+            raise ChangesExpiredError(latest)
+
+        return [_decode(*row) for row in repository.changes_since(version, limit)]
+
+    def wait(self, version: int, timeout: float):
+        """
+        Blocks until there are changes after a version or the timeout expires.
+
+        :param version: The last version the client has seen.
+        :param timeout: The maximum number of seconds to wait.
+        :return: The changes after the version, an empty list if there was none.
+        :raises ChangesExpiredError: If some of the changes are no longer in the log.
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            changes = self.changes_since(version)
+            remaining = deadline - time.monotonic()
+
+            if changes or remaining <= 0:
+                return changes
+
+            with self._condition:
+                if not self._dirty:
+                    self._condition.wait(min(remaining, self.poll_interval))
+
+
+change_feed = ChangeFeed(_buffer_size, _poll_interval)
+
+
+def _record(changes: list):
+    if changes:
+        repository.record_changes(changes)
+        on_commit(change_feed.notify)
+
+
+def publish_upserts(employee_ids):
+    """
+    Records the new rows of added or edited employees in the change log.
+    Must be called inside the transaction of the write, after it: the change is committed with the write.
+
+    :param employee_ids: The IDs of the employees.
+    """
+    employees = repository.find_employees(CHANGE_COLUMNS, ids=list(employee_ids), lock=True)
+
+    _record([(employee.ID, UPSERT, json.dumps(employee.to_dict(), default=str, ensure_ascii=False))
+             for employee in employees])
+
+
+def publish_deletes(employee_ids):
+    """
+    Records deleted employees in the change log. Must be called inside the transaction of the delete.
+
+    :param employee_ids: The IDs of the employees.
+    """
+    _record([(int(employee_id), DELETE, None) for employee_id in employee_ids])
+
+
+def publish_reload():
+    """
+    Records that employees were changed without their IDs, e.g. by an import: the clients reload their list.
+    Must be called inside the transaction of the write.
+    """
+    _record([(None, RELOAD, None)])
+
+
+def _event(name: str, version: int, data: dict):
+    return f'id: {version}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii=False, separators=(",", ":"))}\n\n'
+
+
+def stream_changes(version: int, heartbeat: float = SSE_HEARTBEAT, max_duration: float = SSE_MAX_DURATION):
+    """
+    Streams the changes after a version as Server-Sent Events.
+
+    Every change is a 'change' event whose ID is its version, so the browser resumes after the last one it
+    received when it reconnects (Last-Event-ID). If the changes are no longer in the log, a 'reset' event
+    tells the client to reload its list and the stream continues from the latest version.
+
+    :param version: The last version the client has seen.
+    :param heartbeat: The seconds after which an idle stream sends a comment.
+    :param max_duration: The seconds after which the stream ends.
+    :return: A generator of text chunks.
+    """
+    change_feed.subscribe()
+
+    try:
+        yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+
+        deadline = time.monotonic() + max_duration
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                changes = change_feed.wait(version, min(heartbeat, remaining))
+
+            except ChangesExpiredError as expired:
+                version = expired.latest
+                yield _event('reset', version, {'version': version})
+                continue
+
+            for change in changes:
+                version = change['version']
+                yield _event('change', version, change)
+
+            if not changes:
+                yield ': keep-alive\n\n'
+
+    except Exception as e:
+        logger.warning('Change stream Error: %s', e)  # The browser reconnects and resumes after the last event
+
+    finally:
+        change_feed.unsubscribe()
+
+
+@register_gauges
+def _change_gauges():
+    return [('employee_change_subscribers', 'Open streams of employee changes.', change_feed.subscribers)]
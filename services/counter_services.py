@@ -0,0 +1,315 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from services.core_services import on_commit, read_from_primary
+from services.cache_services import on_remote_change
+from services.metrics_services import register_gauges
+from services.repository_services import repository
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of an employee the counters depend on; the write services read them before changing a row
+COUNTER_COLUMNS = ('department', 'role', 'employment_date', 'county', 'its_active')
+
+# Dimensions of the counters: role, department, county, active (1) or informational (0) account,
+# and hires per employment month ('aaaa-mm')
+DIMENSIONS = ('role', 'department', 'county', 'active', 'hires')
+
+# Seconds between two background recounts (0 disables them; the counters are then only counted once)
+_recount_interval = float(os.getenv('COUNTERS_RECOUNT_INTERVAL', 300))
+
+
+def _keys(role, department, county, its_active, month):
+    return (('role', role), ('department', department), ('county', county), ('active', int(its_active)),
+            ('hires', month))
+
+
+def _employee_keys(employee: dict):
+    return _keys(employee['role'], employee['department'], employee['county'], employee['its_active'],
+                 str(employee['employment_date'])[:7])
+
+
+class Headcounts:
+    """
+    Employee totals per role, department, county, account state and employment month, kept in memory.
+
+    The totals are counted once from the table, then updated by the write services with the difference
+    each write makes (see count_added(), count_removed() and count_edited()), applied when the write
+    commits. A background thread counts the table again every COUNTERS_RECOUNT_INTERVAL seconds, or as soon
+    as another process is seen writing (cache version row), and reports how far the totals had drifted.
+
+    Reads return an immutable snapshot rebuilt after every change, so they cost the same whatever
+    the size of the table.
+    """
+
+    def __init__(self, recount_interval: float = 300):
+        self.recount_interval = recount_interval
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._counts = None  # Counter of (dimension, value) -> employees, None until the first count
+        self._snapshot = None
+        self._pending = None  # Differences committed while a recount runs, applied again to its result
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.recounted_at = None  # time.time() of the last recount
+        self.last_drift = {}  # Differences found by the last recount, see recount()
+
+    def snapshot(self):
+        """
+        Returns the current totals, counting the table on the first call.
+
+        :return: A dictionary with the key total (int) and, for every dimension of DIMENSIONS, a dictionary
+                 value -> number of employees; a value without employees is left out.
+                 All zeros if the table could not be counted (the next call tries again).
+        """
+        snapshot = self._snapshot
+
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    try:
+                        self.recount()
+                    except Exception as e:
+                        logger.exception('Employee counters Error: %s', e)
+                        return _build_snapshot(Counter())
+
+                    self._start()
+
+            snapshot = self._snapshot
+
+        return snapshot
+
+    def apply(self, delta: Counter):
+        """
+        Adds the difference made by a committed write.
+
+        :param delta: A Counter of (dimension, value) -> change of the number of employees.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(delta)
+
+            if self._counts is not None:
+                self._counts.update(delta)
+                self._snapshot = _build_snapshot(self._counts)
+
+    def reset(self):
+        """
+        Sets every total to zero, after the table was emptied.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.clear()
+
+            if self._counts is not None:
+                self._counts = Counter()
+                self._snapshot = _build_snapshot(self._counts)
+
+    def count_table(self):
+        """
+        Counts the employees of the table with a single grouped query.
+
+        :return: A Counter of (dimension, value) -> number of employees.
+        """
+        counted = Counter()
+
+        with read_from_primary():  # A lagging replica would show up as drift
+            groups = repository.count_headcounts()
+
+        for role, department, county, its_active, month, count in groups:
+            for key in _keys(role, department, county, its_active, month):
+                counted[key] += count
+
+        return counted
+
+    def recount(self):
+        """
+        Replaces the totals with a count of the table.
+
+        The writes committed during the count are applied again to its result; one committed just before
+        the query reads the table may be counted twice, until the next recount.
+
+        :return: The drift of the replaced totals, {(dimension, value): counted - kept} for the totals that
+                 differed; empty on the first count.
+        """
+        with self._lock:
+            self._pending = []
+
+        try:
+            counted = self.count_table()
+
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            for delta in self._pending:
+                counted.update(delta)
+
+            drift = _difference(counted, self._counts) if self._counts is not None else {}
+
+            self._pending = None
+            self._counts = counted
+            self._snapshot = _build_snapshot(counted)
+
+            self.recounted_at = time.time()
+            self.last_drift = drift
+
+        return drift
+
+    def check(self):
+        """
+        Compares the totals with a count of the table, without changing them.
+        A write committed during the count may show up as a drift of one.
+
+        :return: {(dimension, value): counted - kept} for the totals that differ.
+        """
+        self.snapshot()
+        counted = self.count_table()
+
+        with self._lock:
+            return _difference(counted, self._counts)
+
+    def request_recount(self):
+        """
+        Asks the background thread to recount now, e.g. after another process wrote to the table.
+        """
+        self._wake.set()
+
+    def _start(self):
+        if self.recount_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='employee-counters', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.recount_interval)
+            self._wake.clear()
+
+            try:
+                drift = self.recount()
+
+                if drift:
+                    logger.warning('Employee counters drift: %s', _format_drift(drift))
+
+            except Exception as e:
+                logger.exception('Employee counters recount Error: %s', e)
+
+
+def _difference(counted: Counter, kept: Counter):
+    return {key: counted[key] - kept[key] for key in counted.keys() | kept.keys() if counted[key] != kept[key]}
+
+
+def _format_drift(drift: dict):
+    return ', '.join(f'{dimension}={value}: {difference:+d}' for (dimension, value), difference in sorted(
+        drift.items(), key=lambda item: (item[0][0], str(item[0][1]))))
+
+
+def _build_snapshot(counts: Counter):
+    snapshot = {dimension: {} for dimension in DIMENSIONS}
+
+    for (dimension, value), count in counts.items():
+        if count:
+            snapshot[dimension][value] = count
+
+    snapshot['total'] = sum(snapshot['role'].values())
+
+    return snapshot
+
+
+headcounts = Headcounts(_recount_interval)
+
+
+@on_remote_change
+def _recount_on_remote_change():
+    headcounts.request_recount()
+
+
+def _register(delta: Counter):
+    if any(delta.values()):
+        on_commit(partial(headcounts.apply, delta))
+
+
+def count_added(employees):
+    """
+    Counts added employees once the current transaction commits.
+
+    :param employees: Dictionaries with (at least) the columns of COUNTER_COLUMNS.
+    """
+    delta = Counter()
+
+    for employee in employees:
+        delta.update(_employee_keys(employee))
+
+    _register(delta)
+
+
+def count_removed(employees):
+    """
+    Uncounts deleted employees once the current transaction commits.
+
+    :param employees: Dictionaries with the columns of COUNTER_COLUMNS, read before the delete.
+    """
+    delta = Counter()
+
+    for employee in employees:
+        delta.subtract(_employee_keys(employee))
+
+    _register(delta)
+
+
+def count_edited(employees, changes: dict):
+    """
+    Moves edited employees between the counters once the current transaction commits.
+
+    :param employees: Dictionaries with the columns of COUNTER_COLUMNS, read before the update.
+    :param changes: Column -> new value, applied to every employee.
+    """
+    delta = Counter()
+
+    for employee in employees:
+        delta.subtract(_employee_keys(employee))
+        delta.update(_employee_keys({**employee, **changes}))
+
+    _register(delta)
+
+
+def count_cleared():
+    """
+    Sets every counter to zero once the current transaction, which emptied the table, commits.
+    """
+    on_commit(headcounts.reset)
+
+
+def get_headcount_summary():
+    """
+    Returns the statistics shown on the employees page, read from the counters.
+
+    :return: A dictionary with the following keys:
+             - roles_count (dict): The number of employees for each role.
+             - non_it_count (int): The number of employees outside the IT department.
+             - departments (list): The distinct departments.
+             - roles (list): The distinct roles.
+    """
+    snapshot = headcounts.snapshot()
+
+    return {'roles_count': snapshot['role'],
+            'non_it_count': snapshot['total'] - snapshot['department'].get('IT', 0),
+            'departments': sorted(snapshot['department']),
+            'roles': sorted(snapshot['role'])}
+
+
+@register_gauges
+def _counter_gauges():
+    drift = sum(abs(difference) for difference in headcounts.last_drift.values())
+
+    return [('employee_counters_drift', 'Total drift found by the last recount of the employee counters.', drift)]
@@ -1,35 +1,37 @@
 from flask import jsonify
-from services.core_services import create_connection
+from services.core_services import transaction, on_commit
+from services.cache_services import cached, invalidate_employees
+from services.search_services import search_employee_ids, name_index
+from services.session_services import revoke_user_sessions
+from services.record_services import EMPLOYEE_COLUMNS
+from services.repository_services import repository, ORDER_BY_NAME, ORDER_BY_DATE, ORDER_BY_ID
+from services.change_services import publish_upserts, publish_deletes
+from services.counter_services import COUNTER_COLUMNS, count_added, count_removed, count_edited
+from services.login_services import invalidate_logins
 from datetime import datetime
+import base64
+import json
+import logging
+from functools import partial
 from mysql.connector import Error as MySQLInterfaceError
 
 
+logger = logging.getLogger(__name__)
+
+
+@cached
 def get_all_employees_by_role(role: str = None):
     """
     Retrieve all employees from the database based on their role.
 
     :param role: The role of the employees to be fetched from the database. If None, fetches all employees.
-    :return: A list of tuples containing employee data if employees with the specified role exist.
+    :return: A list of EmployeeRecord (every column except the password) if employees with the specified role exist.
 
     :raises ValueError: If no employees are found for the specified role.
     :raises Exception: For any other unexpected errors during the database operation.
     """
-    connection = None
-    cursor = None
-
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        if role is None:
-            sql_query = 'SELECT * FROM Magnum_OPUS.users'
-            cursor.execute(sql_query)
-
-        else:
-            sql_query = 'SELECT * FROM Magnum_OPUS.users WHERE role = %s'
-            cursor.execute(sql_query, (role,))
-
-        result = cursor.fetchall()
+        result = repository.find_employees(EMPLOYEE_COLUMNS, role=role)
 
         if result:
             return result
@@ -38,55 +40,36 @@ def get_all_employees_by_role(role: str = None):
             raise ValueError(f'Result is empty')
 
     except ValueError as ve:
-        print(f'Failed to fetch employees for role: {ve}')
+        logger.warning('Failed to fetch employees for role: %s', ve)
 
     except Exception as e:
-        print(f'Exception: {e}')
-
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
+        logger.exception('Exception: %s', e)
 
+@cached
 def get_employee_by_id(employee_id: int):
     """
     Retrieve an employee from the database based on their ID.
 
     :param employee_id: The ID of the employee to be fetched from the database.
-    :return: A tuple containing the employee data if an employee with the specified ID exists.
+    :return: An EmployeeRecord (every column except the password) if an employee with the specified ID exists.
 
     :raises ValueError: If no employee is found for the specified ID.
     :raises Exception: For any other unexpected errors during the database operation.
     """
-    connection = None
-    cursor = None
-
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-
-        sql_query = ('SELECT * FROM Magnum_OPUS.users WHERE ID = %s')
-        cursor.execute(sql_query, (employee_id,))
-
-        result = cursor.fetchone()
+        result = repository.find_employees(EMPLOYEE_COLUMNS, ids=[employee_id])
 
         if result:
-            return result
+            return result[0]
 
         else:
             raise ValueError ('Result is empty')
 
     except ValueError as ve:
-        print(f'Fail to find employee by ID: {ve}')
+        logger.warning('Fail to find employee by ID: %s', ve)
 
     except Exception as e:
-        print(f'Get employee by id Error: {e}')
-
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
+        logger.exception('Get employee by id Error: %s', e)
 
 def add_new_employee(user_data: dict):
     """
@@ -108,44 +91,35 @@ def add_new_employee(user_data: dict):
     :raises Exception: If there is an error during the database operation, an exception is raised
                       and logged, and a relevant error message is returned.
     """
-    connection = None
-    cursor = None
-
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        sql_query = ('INSERT INTO Magnum_OPUS.users (last_name, first_name, password, department, role, employment_date, county, phone_number, its_active) '
-                     'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)')
-
-        values = (user_data["last_name"],
-                  user_data["first_name"],
-                  user_data["password"],
-                  user_data["department"],
-                  user_data["role"],
-                  user_data["date"],
-                  user_data["county"],
-                  user_data["phone_number"],
-                  user_data["its_active"])
-
-        cursor.execute(sql_query, values)
-
-        connection.commit()
+        with transaction():
+            values = {'last_name': user_data["last_name"],
+                      'first_name': user_data["first_name"],
+                      'password': user_data["password"],
+                      'department': user_data["department"],
+                      'role': user_data["role"],
+                      'employment_date': user_data["date"],
+                      'county': user_data["county"],
+                      'phone_number': user_data["phone_number"],
+                      'its_active': user_data["its_active"]}
+
+            employee_id = repository.insert_employee(values)
+            publish_upserts([employee_id])
+            count_added([values])
+
+            on_commit(invalidate_employees)
+            on_commit(invalidate_logins)
+            on_commit(partial(name_index.add, employee_id, user_data["last_name"], user_data["first_name"]))
 
         return jsonify({'message': f"{user_data["last_name"]} {user_data["first_name"]} a fost adăugat cu succes!",
                         'category': 'Success'}), 200
 
     except Exception as e:
-        print(f'Add New Employee Error: {e}')
+        logger.exception('Add New Employee Error: %s', e)
 
         return jsonify({'message': 'Utilizatorul nu a putut să fie adăugat.',
                         'category': 'Error'}), 400
 
-    finally:
-        if cursor is not None and connection is not None:
-            cursor.close()
-            connection.close()
-
 def create_password(first_name: str, last_name:str, date:str, role:str):
     """
     Generates a password based on the employee's first name, last name, employment date, and role.
@@ -184,73 +158,259 @@ def create_password(first_name: str, last_name:str, date:str, role:str):
 
     return f'{part1}{day}{month}{part2}{symbol}'
 
-def filter_users(filter_by: str, filter_role: str, filter_department: str, search_bar: str = None):
+# Columns read by the employee list, in the order of the returned rows (the password hash is never read)
+LIST_COLUMNS = ('ID', 'last_name', 'first_name', 'department', 'role', 'employment_date', 'county', 'phone_number',
+                'its_active')
+
+# Sort orders accepted by filter_users: the columns that form the keyset (the last one is always
+# the unique ID), also the sort key of the repository, and whether the order is descending.
+FILTER_ORDERINGS = {
+    'asc': (ORDER_BY_NAME, False),
+    'desc': (ORDER_BY_NAME, True),
+    'date_asc': (ORDER_BY_DATE, False),
+    'date_desc': (ORDER_BY_DATE, True),
+    None: (ORDER_BY_ID, False)
+}
+
+# Dictionary-encoded in the columnar format: few distinct values repeated on many rows
+DICTIONARY_COLUMNS = ('department', 'role', 'county')
+
+# Order used when a search term is given without a sort order: the ranking of the name index
+RELEVANCE_ORDER = 'relevance'
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Maximum number of search matches ranked by relevance, the most relevant first
+SEARCH_MAX_RESULTS = 500
+
+# Search matches read with a single ID IN (...) query; a sorted search with more matches walks the sort
+# index of the other filters instead, keeping the rows that match
+SEARCH_ID_BATCH = 1000
+SEARCH_SCAN_MAX_BATCH = 5000
+
+
+def encode_cursor(filter_by: str, row):
+    """
+    Builds the opaque pagination cursor that points after the given row.
+
+    :param filter_by: The sort order the row was fetched with.
+    :param row: The EmployeeRecord of the last row of the page.
+    :return: A URL-safe string holding the sort order and the keyset values of the row.
     """
-    Filters users from the database based on role, name, and sorting criteria.
+    key_columns = FILTER_ORDERINGS[filter_by][0]
+    values = [str(row.employment_date) if column == 'employment_date' else getattr(row, column)
+              for column in key_columns]
+
+    return _pack_cursor(filter_by, values)
+
+
+def _pack_cursor(filter_by: str, values: list):
+    return base64.urlsafe_b64encode(json.dumps([filter_by, values]).encode()).decode()
+
+
+def decode_cursor(filter_by: str, cursor: str):
+    """
+    Reads the keyset values out of a cursor created by encode_cursor().
+
+    :param filter_by: The sort order of the current request.
+    :param cursor: The cursor sent by the client.
+    :return: The list of keyset values (for the relevance order, the position of the next result).
+    :raises ValueError: If the cursor is malformed or was created for another sort order.
+    """
+    try:
+        cursor_filter_by, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+    expected_length = 1 if filter_by == RELEVANCE_ORDER else len(FILTER_ORDERINGS[filter_by][0])
+
+    if cursor_filter_by != filter_by or len(values) != expected_length:
+        raise ValueError('Cursor does not match the sort order')
+
+    return values
+
+
+def build_filters(filter_role: str = None, filter_department: str = None, search_bar: str = None,
+                  search_limit: int = SEARCH_MAX_RESULTS):
+    """
+    Converts the filters of the employees page to the filters of repository.find_employees().
+
+    The role and department filters apply before the search_limit cut: the most relevant matches are
+    chosen among the employees that pass them.
+
+    :param filter_role: The role to filter by, if any.
+    :param filter_department: The department to filter by, if any.
+    :param search_bar: Optional search term, resolved by the name index.
+    :param search_limit: The maximum number of search matches kept, the most relevant first,
+                         or None to keep every match, in ID order.
+    :return: A tuple (filters, ranking). filters holds the keyword arguments role, department and ids,
+             only those that are set; ranking is the list of the matching IDs (by relevance with a search_limit),
+             an empty list if the search term matches nobody, or None without a search term.
+    """
+    filters = {}
+
+    if filter_role:
+        filters['role'] = filter_role
+
+    if filter_department:
+        filters['department'] = filter_department
+
+    ranking = None
+
+    if search_bar and search_bar.strip():
+        # Filtrare după numele de familie și numele mic
+        among = None
+
+        if filters and search_limit is not None:
+            among = {user.ID for user in repository.find_employees(('ID',), **filters)}
+
+        ranking = search_employee_ids(search_bar, search_limit, among)
+
+        if ranking:
+            filters['ids'] = ranking
+
+    return filters, ranking
+
+
+@cached
+def filter_users(filter_by: str, filter_role: str, filter_department: str, search_bar: str = None,
+                 page_size: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+    """
+    Filters users from the database based on role, name, and sorting criteria, one page at a time.
+
+    Sorting is done by the repository and pages are read with keyset (seek) pagination: the cursor holds the
+    sort key of the last row of the previous page, so every page costs the same no matter how deep it is.
+
+    The search term is resolved by the in-memory name index (services.search_services). Without a sort
+    order the SEARCH_MAX_RESULTS most relevant matches are returned by relevance and the cursor holds the
+    position in the ranking; with a sort order every match is paginated like the unfiltered list.
 
     :param filter_by: Sorting criteria. Can be 'asc' (ascending by name), 'desc' (descending by name),
                       'date_asc' (ascending by date), or 'date_desc' (descending by date).
+                      Any other value sorts by ID.
     :param filter_role: The role of the user to filter by.
     :param filter_department: The department of the user to filter by.
     :param search_bar: Optional search term for filtering by last name or first name.
-                       If specified, it will search for users whose names contain this term.
-    :return: A list of users filtered and sorted based on the specified criteria.
+                       If specified, it will search for users whose names contain every word of this term,
+                       ignoring case and diacritics.
+    :param page_size: The maximum number of users returned, capped at MAX_PAGE_SIZE.
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :return: A tuple (users, next_cursor). The users are EmployeeRecord objects with the columns of LIST_COLUMNS;
+             next_cursor is None when there are no more pages.
     :raises: Exception if an error occurs during database interaction.
     """
 
-    connection = None
-    cursor = None
+    if filter_by not in FILTER_ORDERINGS:
+        filter_by = None
 
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        sql_query = "SELECT * FROM Magnum_OPUS.users"
-        conditions = []
-        params = []
-
-        if filter_role:
-            conditions.append("role = %s")
-            params.append(filter_role)
-
-        if filter_department:
-            conditions.append("department = %s")
-            params.append(filter_department)
-
-        if search_bar:
-            # Filtrare după numele de familie și numele mic
-            conditions.append("(last_name LIKE %s OR first_name LIKE %s)")
-            search_pattern = f"%{search_bar}%"
-            params.extend([search_pattern, search_pattern])
-
-        if conditions:
-            sql_query += " WHERE " + " AND ".join(conditions)
-
-        cursor.execute(sql_query, tuple(params))
-        result = cursor.fetchall()
-
-        if filter_by:
-            match filter_by:
-                case 'asc':
-                    result = sorted(result, key=lambda user: user[1])  # Presupunând că user[1] este numele de familie
-                case 'desc':
-                    result = sorted(result, key=lambda user: user[1], reverse=True)
-                case 'date_asc':
-                    result = sorted(result, key=lambda user: user[6])  # Presupunând că user[6] este data
-                case 'date_desc':
-                    result = sorted(result, key=lambda user: user[6], reverse=True)
-
-        return result
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        key_columns, descending = FILTER_ORDERINGS[filter_by]
+
+        by_relevance = search_bar and filter_by is None
+        filters, ranking = build_filters(filter_role, filter_department, search_bar,
+                                         SEARCH_MAX_RESULTS if by_relevance else None)
+
+        if ranking == []:  # The search term matches nobody
+            return [], None
+
+        if ranking is not None and filter_by is None:
+            return _page_by_relevance(filters, ranking, page_size, cursor)
+
+        find = _find_matches if len(filters.get('ids', ())) > SEARCH_ID_BATCH else repository.find_employees
+        result = find(LIST_COLUMNS, **filters, order=key_columns, descending=descending,
+                      after=decode_cursor(filter_by, cursor) if cursor else None,
+                      limit=page_size + 1)  # One extra row tells us whether there is a next page
+
+        next_cursor = None
+
+        if len(result) > page_size:
+            result = result[:page_size]
+            next_cursor = encode_cursor(filter_by, result[-1])
+
+        return result, next_cursor
 
     except Exception as e:
-        print(f'Filter user Error: {e}')
+        logger.exception('Filter user Error: %s', e)
         return jsonify({'message': 'Filtrarea nu a putut fi efectuată.', 'category': 'Error'})
 
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
+def _find_matches(columns: tuple, ids: list, order: tuple, descending: bool, after: list, limit: int, **filters):
+    """
+    repository.find_employees() for more search matches than fit in one ID IN (...) query: walks the
+    employees passing the other filters in the sort order, reading only the sort key (from the index),
+    keeps the matching ones and reads their columns once the page is full.
+    """
+    matches = set(ids)
+    total = len(name_index) or len(matches)
+    # Enough rows for a page if the matches are spread evenly among the employees, twice over
+    batch_size = max(limit, min(SEARCH_SCAN_MAX_BATCH, 2 * limit * total // len(matches)))
+    found = []
+
+    while len(found) < limit:
+        keys = repository.find_employees(order, **filters, order=order, descending=descending, after=after,
+                                         limit=batch_size)
+        found.extend(key.ID for key in keys if key.ID in matches)
+
+        if len(keys) < batch_size:
+            break
+
+        after = [getattr(keys[-1], column) for column in order]
+
+    found = found[:limit]
+    position = {employee_id: index for index, employee_id in enumerate(found)}
+
+    return sorted(repository.find_employees(columns, ids=found), key=lambda user: position[user.ID])
+
+
+def _page_by_relevance(filters: dict, ranking: list, page_size: int, cursor: str = None):
+    """
+    Returns one page of search results in the order of the name index ranking.
+
+    At most SEARCH_MAX_RESULTS rows match, so they are all read and ordered in Python;
+    the cursor is the position of the next result among the rows that passed the filters.
+    """
+    offset = decode_cursor(RELEVANCE_ORDER, cursor)[0] if cursor else 0
+
+    position = {employee_id: index for index, employee_id in enumerate(ranking)}
+    result = sorted(repository.find_employees(LIST_COLUMNS, **filters), key=lambda user: position[user.ID])
+
+    next_cursor = _pack_cursor(RELEVANCE_ORDER, [offset + page_size]) if len(result) > offset + page_size else None
+
+    return result[offset:offset + page_size], next_cursor
+
+
+def encode_columnar(rows: list, columns: tuple):
+    """
+    Converts records read with LIST_COLUMNS to a compact columnar structure: one list per column instead of
+    one object per row, so the column names are sent once. The columns of DICTIONARY_COLUMNS hold indexes
+    into a list of their distinct values; dates are sent as 'aaaa-mm-dd' strings.
+
+    :param rows: The records returned by filter_users().
+    :param columns: The names of the columns to include, a subset of LIST_COLUMNS.
+    :return: A dictionary with the keys columns (name -> list of values) and dictionaries
+             (name -> list of distinct values) for the dictionary-encoded columns.
+    """
+    encoded = {}
+    dictionaries = {}
+
+    for column in columns:
+        values = [getattr(row, column) for row in rows]
+
+        if column == 'employment_date':
+            values = [str(value) if value is not None else None for value in values]
+
+        if column in DICTIONARY_COLUMNS:
+            codes = {}
+            values = [codes.setdefault(value, len(codes)) for value in values]
+            dictionaries[column] = list(codes)
+
+        encoded[column] = values
 
+    return {'columns': encoded, 'dictionaries': dictionaries}
+
+
+@cached
 def get_all_values_from_a_column(column):
     """
     Gets distinct values from the specified column in the users table.
@@ -259,64 +419,66 @@ def get_all_values_from_a_column(column):
     :raises ValueError: If the column name is invalid.
     :return: A list of distinct values from the specified column.
     """
-    connection = None
-    cursor = None
-
     allowed_columns = ['department', 'role']
 
     if column not in allowed_columns:
         raise ValueError(f'Invalid column name: {column}')
 
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
-
-        sql_query = f'SELECT DISTINCT {column} FROM Magnum_OPUS.users'
-
-        cursor.execute(sql_query)
-
-        result = cursor.fetchall()
-
-        return [row[0] for row in result]
+        return repository.distinct_values(column)
 
     except ValueError as ve:
-        print(f'Get all values from a column Error: {ve}')
+        logger.warning('Get all values from a column Error: %s', ve)
 
     except Exception as e:
-        print(f'Get all values from a column Error: {e}')
+        logger.exception('Get all values from a column Error: %s', e)
+
+def parse_user_id(value):
+    """
+    :param value: A user ID from a request body, an int or a string of digits.
+    :return: The ID as an int, or None if the value is not a valid ID.
+    """
+    if isinstance(value, str) and value.isdecimal() and value.isascii():
+        value = int(value)
+
+    return value if type(value) is int else None  # bool is an int too
 
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
 
 def delete_user(user_id: int):
     """
-    Deletes a user from the database.
+    Deletes a user from the database and ends all of their sessions.
+    The row is locked and deleted in a single transaction.
 
     :param user_id: The ID of the user to be deleted.
-    :return: A JSON object containing a success or error message, along with an HTTP status code.
+    :return: A JSON object containing a success or error message, along with an HTTP status code
+             (400 if the ID is not valid).
     :raises ValueError: If the user with the specified ID does not exist in the database.
-    :raises Exception: If an error occurs during the SQL query execution or database connection.
+    :raises Exception: If an error occurs in the storage backend.
     """
+    user_id = parse_user_id(user_id)
 
-    connection = None
-    cursor = None
+    if user_id is None:
+        return jsonify({'message': 'ID-ul utilizatorului nu este valid.',
+                        'category': 'Error'}), 400
 
     try:
-        connection = create_connection()
-        cursor = connection.cursor()
+        with transaction():
+            found = repository.find_employees(('last_name', 'first_name', *COUNTER_COLUMNS), ids=[user_id], lock=True)
 
-        user = get_employee_by_id(user_id)
+            if not found:
+                raise ValueError(f'User with ID {user_id} does not exist.')
 
-        if not user:
-            raise ValueError(f'User with ID {user_id} does not exist.')
+            user = found[0]
+            repository.delete_employees([user_id])
+            publish_deletes([user_id])
+            count_removed([user.to_dict()])
 
-        sql_query = 'DELETE FROM Magnum_OPUS.users WHERE ID = %s'
-        cursor.execute(sql_query, (user_id,))
-        connection.commit()
+            on_commit(partial(invalidate_employees, user_id))
+            on_commit(invalidate_logins)
+            on_commit(partial(name_index.remove, user_id))
+            on_commit(partial(revoke_user_sessions, user_id))
 
-        return jsonify({'message': f'Utilizatorul {user[1]} {user[2]} a fost sters cu succes!',
+        return jsonify({'message': f'Utilizatorul {user.last_name} {user.first_name} a fost sters cu succes!',
                         'category': 'Success'}), 200
 
     except ValueError as ve:
@@ -324,13 +486,10 @@ def delete_user(user_id: int):
                         'category': 'Error'}), 404
 
     except Exception as e:
-        return jsonify({'message': {e},
-                        'category': 'Error'}), 500
+        logger.exception('Delete User Error: %s', e)
 
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
+        return jsonify({'message': 'Utilizatorul nu a putut fi sters.',
+                        'category': 'Error'}), 500
 
 def edit_user(new_data_user: dict):
     """
@@ -338,72 +497,84 @@ def edit_user(new_data_user: dict):
 
     :param new_data_user: A dictionary containing the user data to be updated.
                             Must include 'ID', and may include 'last_name', 'first_name',
-                            'department', 'role', 'date', 'county', and 'phone'.
+                            'department', 'role', 'date', 'county', 'phone' and 'its_active'.
+                            Deactivating a user (its_active = 0) ends all of their sessions.
     :type new_data_user: dict
     :raises ValueError: If the user with the specified ID is not found.
-    :return: A JSON response indicating the result of the operation, along with an HTTP status code.
+    :return: A JSON response indicating the result of the operation, along with an HTTP status code
+             (400 if the ID or its_active is not valid).
     :rtype: tuple (flask.Response, int)
 
-    The function constructs an SQL UPDATE query dynamically based on the fields that are provided
-    in the new_data_user dictionary. If a field is empty or not provided, it is ignored.
+    The function collects the changes from the fields that are provided in the new_data_user
+    dictionary. If a field is empty or not provided, it is ignored.
+    The row is locked and updated in a single transaction.
     If the user is successfully updated, a success message is returned;
     otherwise, an error message is returned.
     """
-    connection = None
-    cursor = None
+    logger.debug('Edit user %s', new_data_user['ID'], extra={'user_data': new_data_user})
 
-    print(new_data_user)
+    user_id = parse_user_id(new_data_user['ID'])
 
-    try:
-        connection = create_connection()
-        cursor = connection.cursor()
+    if user_id is None:
+        return jsonify({'message': 'ID-ul utilizatorului nu este valid.',
+                        'category': 'Error'}), 400
 
-        user = get_employee_by_id(new_data_user['ID'])
+    its_active = new_data_user.get('its_active')
 
-        if not user:
-            raise ValueError('Utilizatorul nu a fost gasit.')
+    if its_active is not None and str(its_active) not in ('0', '1'):
+        return jsonify({'message': 'Campul its_active trebuie sa fie 0 sau 1.',
+                        'category': 'Error'}), 400
 
-        sql_query = 'UPDATE Magnum_OPUS.users SET'
-        updates = []
-        params = []
+    try:
+        updates = {}
 
         if new_data_user['last_name']:
-            updates.append(' last_name = %s')
-            params.append(new_data_user['last_name'])
+            updates['last_name'] = new_data_user['last_name']
 
         if new_data_user['first_name']:
-            updates.append(' first_name = %s')
-            params.append(new_data_user['first_name'])
+            updates['first_name'] = new_data_user['first_name']
 
         if new_data_user['department']:
-            updates.append(' department = %s')
-            params.append(new_data_user['department'])
+            updates['department'] = new_data_user['department']
 
         if new_data_user['role']:
-            updates.append(' role = %s')
-            params.append(new_data_user['role'])
+            updates['role'] = new_data_user['role']
 
         if new_data_user['date']:
-            updates.append(' employment_date = %s')
-            params.append(new_data_user['date'])
+            updates['employment_date'] = new_data_user['date']
 
         if new_data_user['county']:
-            updates.append(' county = %s')
-            params.append(new_data_user['county'])
+            updates['county'] = new_data_user['county']
 
         if new_data_user['phone']:
-            updates.append(' phone_number = %s')
-            params.append(new_data_user['phone'])
+            updates['phone_number'] = new_data_user['phone']
 
-        if updates:
-            sql_query += ', '.join(updates)
-            sql_query += ' WHERE ID = %s'
-            params.append(new_data_user['ID'])
+        if its_active is not None:
+            updates['its_active'] = int(its_active)
+
+        with transaction():
+            found = repository.find_employees(('ID', *COUNTER_COLUMNS), ids=[user_id], lock=True)
+
+            if not found:
+                raise ValueError('Utilizatorul nu a fost gasit.')
+
+            user = found[0]
 
-            cursor.execute(sql_query, params)
-            connection.commit()
+            if updates:
+                repository.update_employees([user.ID], updates)
+                publish_upserts([user.ID])
+                count_edited([user.to_dict()], updates)
 
-            return jsonify({'message': f'Utilizatorul cu ID-ul: {user[0]} a fost editat cu succes!',
+                on_commit(partial(invalidate_employees, user_id))
+                on_commit(invalidate_logins)
+                on_commit(partial(name_index.update, user_id, new_data_user['last_name'], new_data_user['first_name']))
+
+                if updates.get('its_active') == 0:
+                    # A deactivated account must be logged out everywhere
+                    on_commit(partial(revoke_user_sessions, user_id))
+
+        if updates:
+            return jsonify({'message': f'Utilizatorul cu ID-ul: {user.ID} a fost editat cu succes!',
                             'category': f'Success'}), 200
 
         else:
@@ -415,14 +586,13 @@ def edit_user(new_data_user: dict):
                         'category': 'Error'}), 404
 
     except MySQLInterfaceError as db_err:
-        return jsonify({'message': str(db_err),
-                        'category': 'Error'}), 200
+        logger.exception('Edit User Error: %s', db_err)
 
-    except Exception as e:
-        return jsonify({'message': f'{e}',
+        return jsonify({'message': 'Utilizatorul nu a putut fi editat.',
                         'category': 'Error'}), 500
 
-    finally:
-        if connection is not None and cursor is not None:
-            cursor.close()
-            connection.close()
+    except Exception as e:
+        logger.exception('Edit User Error: %s', e)
+
+        return jsonify({'message': 'Utilizatorul nu a putut fi editat.',
+                        'category': 'Error'}), 500
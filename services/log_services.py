@@ -0,0 +1,397 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request, session, current_app
+from flask.logging import default_handler
+
+from services.metrics_services import register_gauges
+
+
+# Records waiting for the writer thread; beyond them (the output cannot keep up) new records are dropped
+# instead of blocking the requests
+DEFAULT_MAX_PENDING = 10000
+
+# Spans written in one request record; the others are only counted
+MAX_SPANS = 100
+
+# Normalized queries listed in the breakdown of a slow request
+MAX_BREAKDOWN = 20
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_ENVIRON = 'HTTP_X_REQUEST_ID'
+_request_id_pattern = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+# The attribute of a span tuple (name, start, duration, detail) holding its detail, by span name
+SPAN_DETAILS = {'db.query': 'query', 'template.render': 'template'}
+
+# Attributes every LogRecord has; the others were passed with extra= and are written as fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+trace_logger = logging.getLogger('request_trace')
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one line of JSON: ts, level, logger, message, the request fields (request_id,
+    user_id, route, method) when it was logged during a request, the fields passed with extra= and the
+    traceback, if any.
+    """
+
+    def format(self, record):
+        entry = {'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage()}
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the request ID, the ID of the logged-in user, the route and the method to the records
+    logged while a request is handled. It runs on the thread that logs, the only one that sees the request.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            user = session.get('user')
+
+            trace = g.get('request_trace')
+
+            record.request_id = trace.request_id if trace is not None else None
+            record.user_id = user.get('id') if user else None
+            record.route = request.url_rule.rule if request.url_rule is not None else None
+            record.method = request.method
+
+        return True
+
+
+class BackgroundHandler(logging.Handler):
+    """
+    Keeps the records in memory for a writer thread, which formats them and writes them by batches.
+
+    The logging thread only resolves what could change later (the message arguments and the traceback)
+    and appends the record to a deque, without waking the writer up: the writer wakes up every
+    flush_interval seconds, so a busy request thread does not hand the interpreter over at every record.
+    A record logged while max_pending records are waiting (the output cannot keep up) is dropped and counted.
+
+    :param output: The handler whose formatter and stream are used, e.g. a logging.StreamHandler.
+    :param max_pending: The records that may wait for the writer.
+    :param flush_interval: The seconds between two writes.
+    """
+
+    def __init__(self, output: logging.StreamHandler, max_pending: int, flush_interval: float):
+        super().__init__()
+        self.output = output
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._records = deque()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def emit(self, record):
+        if len(self._records) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+
+        self._records.append(record)
+
+    def pending(self):
+        return len(self._records)
+
+    def write_pending(self):
+        """
+        Formats and writes the waiting records.
+        """
+        lines = []
+
+        while self._records:
+            record = self._records.popleft()
+
+            try:
+                lines.append(self.output.format(record))
+            except Exception:
+                self.output.handleError(record)
+
+        if not lines:
+            return
+
+        with self.output.lock:
+            if isinstance(self.output, logging.handlers.WatchedFileHandler):
+                self.output.reopenIfNeeded()
+
+            self.output.stream.write('\n'.join(lines) + '\n')
+            self.output.flush()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the writer thread after it wrote the waiting records.
+        """
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self.write_pending()
+
+    def restart_after_fork(self):
+        # In a forked child (a worker of serve.py) the writer thread of the parent does not exist and the
+        # records it had not written yet are written by the parent: the child starts over with its own
+        self._records = deque()
+        self.dropped = 0
+        self.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.write_pending()
+            except Exception as e:
+                sys.stderr.write(f'Log writer Error: {e}\n')
+
+
+def _open_output():
+    """
+    :return: The handler writing the formatted records: to LOG_FILE (reopened when logrotate moves it)
+             or, without it, to the standard error.
+    """
+    path = os.getenv('LOG_FILE')
+    output = logging.handlers.WatchedFileHandler(path, encoding='utf-8') if path else logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    return output
+
+
+def _parse_levels(levels: str):
+    """
+    :param levels: 'logger=LEVEL' pairs separated by commas, e.g. 'werkzeug=WARNING,services.cache_services=DEBUG'.
+    :return: A dictionary logger name -> level name.
+    """
+    parsed = {}
+
+    for pair in filter(None, (pair.strip() for pair in levels.split(','))):
+        name, _, level = pair.partition('=')
+        parsed[name.strip()] = level.strip().upper()
+
+    return parsed
+
+
+def configure_logging():
+    """
+    Sends the records of every logger, as JSON lines, to a background writer thread (see BackgroundHandler).
+    Runs once per process; later calls do nothing.
+
+    Configured by the environment variables LOG_LEVEL (INFO by default), LOG_LEVELS (levels of single
+    loggers, e.g. 'werkzeug=WARNING,services.cache_services=DEBUG'), LOG_FILE (the standard error by
+    default), LOG_FLUSH_INTERVAL (seconds between two writes, 0.5 by default) and LOG_MAX_PENDING (records
+    waiting to be written before new ones are dropped).
+    """
+    global _handler
+
+    with _configure_lock:
+        if _handler is not None:
+            return
+
+        _handler = BackgroundHandler(_open_output(),
+                                     max_pending=int(os.getenv('LOG_MAX_PENDING', DEFAULT_MAX_PENDING)),
+                                     flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 0.5)))
+        _handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+        for name, level in _parse_levels(os.getenv('LOG_LEVELS', '')).items():
+            logging.getLogger(name).setLevel(level)
+
+        _handler.start()
+
+        os.register_at_fork(after_in_child=_handler.restart_after_fork)
+        atexit.register(_handler.stop)
+
+
+@register_gauges
+def _logging_gauges():
+    if _handler is None:
+        return []
+
+    return [('log_records_pending', 'Log records waiting for the writer thread.', _handler.pending()),
+            ('log_records_dropped', 'Log records dropped because too many were waiting.', _handler.dropped)]
+
+
+class RequestTrace:
+    """
+    What is known about the request being handled, kept in g.request_trace.
+
+    :param request_id: The ID of the request.
+    :param sampled: Whether the request is logged even when it is neither slow nor failed.
+    """
+    __slots__ = ('request_id', 'sampled', 'start', 'status', 'spans')
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.request_id = request_id
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.status = None
+        self.spans = []  # (name, start, duration, detail), filled by services.metrics_services.record_span()
+
+
+def _new_request_ids():
+    global _request_id_prefix, _request_id_counter
+
+    # A random prefix per process and a counter: unique without reading the system's random source per request
+    _request_id_prefix = uuid.uuid4().hex[:12]
+    _request_id_counter = itertools.count(1)
+
+
+_new_request_ids()
+os.register_at_fork(after_in_child=_new_request_ids)
+
+
+def _start_trace():
+    request_id = request.environ.get(REQUEST_ID_ENVIRON, '')
+
+    if not _request_id_pattern.fullmatch(request_id):
+        request_id = f'{_request_id_prefix}-{next(_request_id_counter):x}'
+
+    sample_rate = current_app.config['LOG_SAMPLE_RATE']
+    g.request_trace = RequestTrace(request_id, sample_rate >= 1 or random.random() < sample_rate)
+
+
+def _tag_response(response):
+    trace = g.request_trace
+    trace.status = response.status_code
+    response.headers[REQUEST_ID_HEADER] = trace.request_id
+
+    return response
+
+
+def _finish_trace(exception=None):
+    # Runs after a streamed response has been fully sent, like the metrics of the request
+    trace = g.get('request_trace')
+
+    if trace is None:
+        return
+
+    duration = time.perf_counter() - trace.start
+    status = trace.status or (500 if exception is not None else 200)
+    slow_request_ms = current_app.config['SLOW_REQUEST_MS']
+    slow = bool(slow_request_ms) and duration * 1000 >= slow_request_ms
+
+    if not (trace.sampled or slow or status >= 500):
+        return
+
+    spans = trace.spans
+    totals = {}
+
+    for name, _, span_duration, _ in spans:
+        totals[name] = totals.get(name, 0.0) + span_duration
+
+    fields = {'status': status,
+              'duration_ms': round(duration * 1000, 3),
+              'sampled': trace.sampled,
+              'queries': sum(1 for span in spans if span[0] == 'db.query'),
+              'db_ms': round(totals.get('db.query', 0.0) * 1000, 3),
+              'acquire_ms': round(totals.get('db.acquire', 0.0) * 1000, 3),
+              'render_ms': round(totals.get('template.render', 0.0) * 1000, 3),
+              'spans': [_format_span(span, trace.start) for span in spans[:MAX_SPANS]]}
+
+    if len(spans) > MAX_SPANS:
+        fields['spans_dropped'] = len(spans) - MAX_SPANS
+
+    if slow:
+        fields['query_breakdown'] = _query_breakdown(spans)
+
+    trace_logger.log(logging.WARNING if slow or status >= 500 else logging.INFO,
+                     'Slow request' if slow else 'Request', extra=fields)
+
+
+def _format_span(span, request_start):
+    name, start, duration, detail = span
+    formatted = {'name': name, 'start_ms': round((start - request_start) * 1000, 3),
+                 'duration_ms': round(duration * 1000, 3)}
+
+    if detail is not None:
+        formatted[SPAN_DETAILS.get(name, 'detail')] = detail
+
+    return formatted
+
+
+def _query_breakdown(spans):
+    breakdown = {}
+
+    for name, _, duration, normalized in spans:
+        if name == 'db.query':
+            count, total = breakdown.get(normalized, (0, 0.0))
+            breakdown[normalized] = (count + 1, total + duration)
+
+    return [{'query': normalized, 'count': count, 'total_ms': round(total * 1000, 3)}
+            for normalized, (count, total) in sorted(breakdown.items(), key=lambda item: -item[1][1])[:MAX_BREAKDOWN]]
+
+
+def init_logging(app):
+    """
+    Installs the structured logging (see configure_logging()) and the request tracing on a Flask application.
+
+    Every request gets an ID, taken from its X-Request-ID header when it has a valid one and sent back in
+    the response, which the records logged during the request carry. A record of the request itself, with
+    its timed spans (connection acquire, every query, every template render), is logged for the requests
+    sampled at the rate LOG_SAMPLE_RATE (0.01 by default, 1 traces every request), for the requests slower
+    than SLOW_REQUEST_MS (1000 by default, 0 disables it, logged as warnings with a breakdown by query)
+    and for the server errors. LOG_TRACING=0 turns the tracing off. The three are read from the
+    environment, unless app.config has them.
+
+    :param app: The Flask application.
+    """
+    configure_logging()
+    app.logger.removeHandler(default_handler)  # The records go to the background handler of the root logger
+
+    app.config.setdefault('LOG_TRACING', os.getenv('LOG_TRACING', '1') == '1')
+    app.config.setdefault('LOG_SAMPLE_RATE', float(os.getenv('LOG_SAMPLE_RATE', 0.01)))
+    app.config.setdefault('SLOW_REQUEST_MS', float(os.getenv('SLOW_REQUEST_MS', 1000)))
+
+    if not app.config['LOG_TRACING']:
+        return
+
+    app.before_request(_start_trace)
+    app.after_request(_tag_response)
+    app.teardown_request(_finish_trace)
@@ -0,0 +1,248 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.core_services import read_from_primary
+from services.auth_services import split_username
+from services.cache_services import TTLCache, on_remote_change, check_remote_changes
+from services.metrics_services import register_gauges
+from services.repository_services import repository
+
+
+# Namespace of the login lookups in their TTLCache
+LOGIN_NAMESPACE = 'login'
+
+
+class LoginThrottledError(Exception):
+    """
+    Raised when a login attempt is over the limit of its IP address or of its username.
+
+    :param retry_after: The seconds until the next attempt is allowed.
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f'Prea multe incercari de autentificare. Incercati din nou in {math.ceil(retry_after)} '
+                         f'secunde.')
+
+
+class TokenBuckets:
+    """
+    A token bucket per key: every attempt takes a token, a bucket holds at most capacity tokens and
+    gets refill_rate tokens back per second. So a key may make capacity attempts at once, then refill_rate
+    attempts per second.
+
+    Only the max_keys most recently used keys are kept: an evicted key starts again with a full bucket,
+    as it would after being idle.
+
+    :param capacity: The tokens of a full bucket.
+    :param refill_rate: The tokens given back per second.
+    :param max_keys: The maximum number of buckets kept.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = 100000):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+
+        self._buckets = OrderedDict()  # key -> [tokens, time of the last update]
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+
+    def take(self, key):
+        """
+        Takes a token from the bucket of a key, if it has one.
+
+        :param key: The key, e.g. an IP address.
+        :return: 0 if the token was taken, otherwise the seconds until the bucket has one.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now]
+
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+
+            self.rejected += 1
+            return (1 - bucket[0]) / self.refill_rate
+
+    def reset(self, key):
+        """
+        Fills the bucket of a key again.
+
+        :param key: The key.
+        """
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def clear(self):
+        """
+        Fills every bucket again.
+        """
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'rejected': self.rejected}
+
+
+ip_buckets = TokenBuckets(capacity=float(os.getenv('LOGIN_IP_BURST', 30)),
+                          refill_rate=float(os.getenv('LOGIN_IP_RATE', 1)),
+                          max_keys=int(os.getenv('LOGIN_MAX_KEYS', 100000)))
+username_buckets = TokenBuckets(capacity=float(os.getenv('LOGIN_USER_BURST', 5)),
+                                refill_rate=float(os.getenv('LOGIN_USER_RATE', 0.1)),
+                                max_keys=int(os.getenv('LOGIN_MAX_KEYS', 100000)))
+
+# The names that exist, with the active flags of their employees, and separately the names that do not:
+# a flood of random usernames only evicts the other unknown names, not the accounts of the employees
+login_accounts = TTLCache(max_size=int(os.getenv('LOGIN_CACHE_SIZE', 10000)),
+                          ttl=float(os.getenv('LOGIN_ACCOUNT_TTL', 300)))
+unknown_logins = TTLCache(max_size=int(os.getenv('LOGIN_CACHE_SIZE', 10000)),
+                          ttl=float(os.getenv('LOGIN_UNKNOWN_TTL', 30)))
+
+# The (username, IP address) pairs that logged in successfully: their attempts skip the bucket of the
+# username, so that an attacker guessing the password of an employee does not lock the employee out
+trusted_clients = TTLCache(max_size=int(os.getenv('LOGIN_MAX_KEYS', 100000)),
+                           ttl=float(os.getenv('LOGIN_TRUSTED_TTL', 86400)))
+
+
+def normalize_username(username):
+    """
+    :param username: The username typed on the login page, 'LastName FirstName'.
+    :return: The key of the names verify_auth() checks (see auth_services.split_username()), 'last first'
+             in lower case with single spaces, or None if it cannot be the name of an employee.
+    """
+    names = split_username(username)
+
+    return ' '.join(names) if names else None
+
+
+def find_login_flags(username: str):
+    """
+    Returns the active flags of the employees with a name, from the login caches or from the database.
+
+    The lookup reads the primary: a name read from a lagging replica right after the employee was added
+    would be remembered as unknown.
+
+    :param username: A username returned by normalize_username().
+    :return: A tuple of its_active flags, empty if no employee has this name.
+    """
+    check_remote_changes()
+
+    key = (LOGIN_NAMESPACE, username)
+
+    for cache in (login_accounts, unknown_logins):
+        found, flags = cache.get(key)
+
+        if found:
+            return flags
+
+    with read_from_primary():
+        flags = tuple(repository.find_logins(*split_username(username)))
+
+    (login_accounts if flags else unknown_logins).set(key, flags)
+
+    return flags
+
+
+def admit_login(username, remote_address: str):
+    """
+    Decides, before any query of the credentials, whether a login attempt is checked against the database.
+
+    The attempt takes a token from the bucket of its IP address (LOGIN_IP_BURST attempts at once, then
+    LOGIN_IP_RATE per second; generous, since the employees of a site may share one address at the start
+    of a shift), then from the bucket of its username (LOGIN_USER_BURST, then LOGIN_USER_RATE per second),
+    unless this username logged in from this address in the last LOGIN_TRUSTED_TTL seconds.
+    A username that no employee has is remembered for LOGIN_UNKNOWN_TTL seconds, the active flags of the
+    existing ones for LOGIN_ACCOUNT_TTL seconds; the writes to the users table clear both.
+
+    Behind a reverse proxy, remote_address must be the client's address (see werkzeug's ProxyFix).
+
+    :param username: The username typed on the login page.
+    :param remote_address: The IP address of the client.
+    :return: True if the password must be checked, False if the attempt fails without it
+             (malformed or unknown username).
+    :raises LoginThrottledError: If the IP address or the username is over its limit.
+    """
+    retry_after = ip_buckets.take(remote_address)
+
+    if retry_after:
+        raise LoginThrottledError(retry_after)
+
+    username = normalize_username(username)
+
+    if username is None:
+        return False
+
+    if not trusted_clients.get((LOGIN_NAMESPACE, username, remote_address))[0]:
+        retry_after = username_buckets.take(username)
+
+        if retry_after:
+            raise LoginThrottledError(retry_after)
+
+    return bool(find_login_flags(username))
+
+
+def login_succeeded(username: str, remote_address: str):
+    """
+    Gives its attempts back to a username after a successful login, so that the typos made before
+    do not count against the user's next logins, and trusts the address for this username.
+
+    :param username: The username typed on the login page.
+    :param remote_address: The IP address of the client.
+    """
+    username = normalize_username(username)
+
+    if username is not None:
+        username_buckets.reset(username)
+        trusted_clients.set((LOGIN_NAMESPACE, username, remote_address), True)
+
+
+@on_remote_change
+def invalidate_logins():
+    """
+    Forgets the cached login lookups: run after every write that may add, rename, (de)activate or delete
+    an employee, and when another process wrote to the users table.
+    """
+    login_accounts.clear()
+    unknown_logins.clear()
+
+
+def get_login_gate_stats():
+    """
+    :return: A dictionary with the statistics of the buckets ('ip', 'username') and of the caches
+             ('accounts', 'unknown', 'trusted').
+    """
+    return {'ip': ip_buckets.stats(),
+            'username': username_buckets.stats(),
+            'accounts': login_accounts.stats(),
+            'unknown': unknown_logins.stats(),
+            'trusted': trusted_clients.stats()}
+
+
+@register_gauges
+def _login_gauges():
+    stats = get_login_gate_stats()
+
+    return [('login_rejected_ip', 'Login attempts rejected by the limit of their IP address.', stats['ip']['rejected']),
+            ('login_rejected_username', 'Login attempts rejected by the limit of their username.',
+             stats['username']['rejected']),
+            ('login_cache_hits', 'Login lookups answered by the caches.',
+             stats['accounts']['hits'] + stats['unknown']['hits']),
+            ('login_cache_unknown_size', 'Unknown usernames remembered.', stats['unknown']['size'])]
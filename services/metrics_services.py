@@ -0,0 +1,309 @@
+import bisect
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Distinct normalized queries tracked separately; the others are grouped under 'other'
+MAX_QUERY_LABELS = 200
+
+
+class Histogram:
+    """
+    A Prometheus histogram with one series per combination of label values.
+
+    :param name: The metric name.
+    :param documentation: The help text of the metric.
+    :param label_names: The names of the labels.
+    :param buckets: The upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        """
+        Records one observation.
+
+        :param value: The observed value.
+        :param label_values: The values of the labels, in the order of label_names.
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+
+            bucket = bisect.bisect_left(self.buckets, value)
+
+            if bucket < len(self.buckets):
+                series[bucket] += 1
+
+            series[-2] += value
+            series[-1] += 1
+
+    def series_count(self):
+        with self._lock:
+            return len(self._series)
+
+    def totals(self, *label_values):
+        """
+        :param label_values: The values of the labels of a series.
+        :return: A tuple (sum, count) of the observations of the series; (0, 0) if it has none.
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+
+            return (series[-2], series[-1]) if series is not None else (0, 0)
+
+    def render(self):
+        """
+        Renders the histogram in the Prometheus text format.
+
+        :return: A list of lines.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+
+        for label_values, values in sorted(series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values)]
+            cumulative = 0
+
+            for upper_bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(labels + [f'le="{upper_bound}"'])} {cumulative}')
+
+            lines.append(f'{self.name}_bucket{_labels(labels + ['le="+Inf"'])} {values[-1]}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {values[-2]}')
+            lines.append(f'{self.name}_count{_labels(labels)} {values[-1]}')
+
+        return lines
+
+
+def _labels(labels):
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                             ('route', 'method', 'status'))
+queries_per_request = Histogram('db_queries_per_request', 'Number of database queries run by a request.',
+                                ('route',), COUNT_BUCKETS)
+query_duration = Histogram('db_query_duration_seconds', 'Time spent executing a query, by normalized SQL.',
+                           ('query',))
+connection_acquire_duration = Histogram('db_connection_acquire_seconds',
+                                        'Time spent waiting for a connection from the pool.')
+template_render_duration = Histogram('template_render_seconds', 'Time spent rendering a Jinja template.',
+                                     ('template',))
+
+HISTOGRAMS = (request_duration, queries_per_request, query_duration, connection_acquire_duration,
+              template_render_duration)
+
+# Callables returning a list of (metric name, help text, value) gauges, e.g. the pool statistics
+_gauge_collectors = []
+
+
+def register_gauges(collector):
+    """
+    Registers a function whose gauges are added to the /metrics output.
+
+    :param collector: A function without arguments that returns a list of (name, help text, value) tuples.
+    :return: The collector, so the function can be used as a decorator.
+    """
+    _gauge_collectors.append(collector)
+    return collector
+
+
+_literal_pattern = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+\b|%s")
+_list_pattern = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_space_pattern = re.compile(r'\s+')
+
+
+def normalize_sql(sql_query: str):
+    """
+    Reduces a query to its shape, so that the same query with other values is counted together:
+    literals and placeholders become '?' and IN lists of any length become '(?...)'.
+
+    :param sql_query: The SQL text.
+    :return: The normalized SQL text.
+    """
+    normalized = _literal_pattern.sub('?', sql_query)
+    normalized = _list_pattern.sub('(?...)', normalized)
+
+    return _space_pattern.sub(' ', normalized).strip()
+
+
+def record_query(sql_query: str, duration: float):
+    """
+    Records the execution of a query, globally and for the current request.
+
+    :param sql_query: The SQL text.
+    :param duration: The execution time, in seconds.
+    """
+    normalized = normalize_sql(sql_query)
+
+    if query_duration.series_count() >= MAX_QUERY_LABELS and not _is_known_query(normalized):
+        label = 'other'
+    else:
+        label = normalized
+
+    query_duration.observe(duration, label)
+
+    if has_request_context():
+        g.setdefault('metrics_queries', []).append((normalized, duration))
+        record_span('db.query', duration, normalized)
+
+
+def _is_known_query(normalized):
+    with query_duration._lock:
+        return (normalized,) in query_duration._series
+
+
+def record_connection_acquire(duration: float):
+    """
+    Records the time spent taking a connection from the pool.
+
+    :param duration: The waiting time, in seconds.
+    """
+    connection_acquire_duration.observe(duration)
+
+    if has_request_context():
+        record_span('db.acquire', duration)
+
+
+def record_span(name: str, duration: float, detail: str = None):
+    """
+    Adds a timed span, which just ended, to the trace of the current request (see services.log_services).
+    Does nothing when the request is not traced.
+
+    :param name: The kind of span: 'db.acquire', 'db.query' or 'template.render'.
+    :param duration: Its duration, in seconds.
+    :param detail: The normalized query or the template name.
+    """
+    trace = g.get('request_trace') if has_request_context() else None
+
+    if trace is not None:
+        trace.spans.append((name, time.perf_counter() - duration, duration, detail))
+
+
+class TimedCursor:
+    """
+    Cursor wrapper that records the duration of every executed statement.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - start)
+
+
+def render_metrics():
+    """
+    Renders every metric in the Prometheus text exposition format.
+
+    :return: The text of the /metrics response.
+    """
+    lines = []
+
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    for collector in _gauge_collectors:
+        for name, documentation, value in collector():
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} gauge', f'{name} {value}'])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exception=None):
+    # Runs after a streamed response has been fully sent, so the whole request is measured
+    start = g.get('metrics_start')
+
+    if start is None:
+        return
+
+    duration = time.perf_counter() - start
+    route = _route_label()
+    queries = g.get('metrics_queries', [])
+    status = g.get('metrics_status', 500 if exception is not None else 200)
+
+    request_duration.observe(duration, route, request.method, str(status))
+    queries_per_request.observe(len(queries), route)
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('metrics_render_starts', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('metrics_render_starts')
+
+    if not starts:
+        return
+
+    duration = time.perf_counter() - starts.pop()
+    template_render_duration.observe(duration, template.name or 'string')
+    record_span('template.render', duration, template.name or 'string')
+
+
+def init_metrics(app):
+    """
+    Installs the request, query and template instrumentation on a Flask application.
+    The slow requests are logged by services.log_services.
+
+    :param app: The Flask application.
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
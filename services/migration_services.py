@@ -0,0 +1,276 @@
+import hashlib
+import os
+import re
+from datetime import datetime
+
+from flask import g
+
+from services.core_services import open_mysql_connection, transaction
+from services.cache_services import employees_cache
+from services.auth_services import verify_auth
+from services.counter_services import headcounts
+from services.employees_services import get_all_employees_by_role, get_employee_by_id, \
+    get_all_values_from_a_column, filter_users, encode_cursor, edit_user, delete_user, FILTER_ORDERINGS, LIST_COLUMNS
+from services.record_services import get_decoder
+
+
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+def load_migrations():
+    """
+    Reads the migration files from the migrations directory.
+
+    A migration file is named 'NNNN_description.sql', where NNNN is its version,
+    and contains SQL statements separated by semicolons at the end of a line.
+
+    :return: A list of dictionaries with the keys version, name, checksum and statements, sorted by version.
+    :raises ValueError: If two migration files have the same version.
+    """
+    migrations = {}
+
+    for file_name in sorted(os.listdir(MIGRATIONS_DIRECTORY)):
+        match = MIGRATION_FILE_PATTERN.match(file_name)
+
+        if not match:
+            continue
+
+        version = int(match.group(1))
+
+        if version in migrations:
+            raise ValueError(f'Duplicate migration version: {version}')
+
+        with open(os.path.join(MIGRATIONS_DIRECTORY, file_name), encoding='utf-8') as migration_file:
+            content = migration_file.read()
+
+        # Drop the comment lines, then split on the semicolons that end a line
+        sql = '\n'.join(line for line in content.splitlines() if not line.strip().startswith('--'))
+        statements = [statement.strip() for statement in re.split(r';\s*$', sql, flags=re.MULTILINE)]
+
+        migrations[version] = {'version': version,
+                               'name': match.group(2),
+                               'checksum': hashlib.sha256(content.encode()).hexdigest(),
+                               'statements': [statement for statement in statements if statement]}
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute('CREATE DATABASE IF NOT EXISTS Magnum_OPUS')
+    cursor.execute('CREATE TABLE IF NOT EXISTS Magnum_OPUS.schema_migrations ('
+                   'version INT NOT NULL PRIMARY KEY, '
+                   'name VARCHAR(255) NOT NULL, '
+                   'checksum CHAR(64) NOT NULL, '
+                   'applied_at DATETIME NOT NULL)')
+
+
+def get_migration_status():
+    """
+    Compares the migration files with the migrations recorded in the database.
+
+    :return: A list of dictionaries with the keys version, name, applied (bool), applied_at
+             and changed (True if the file was modified after it was applied).
+    """
+    connection = None
+    cursor = None
+
+    try:
+        connection = open_mysql_connection(use_database=False)
+        cursor = connection.cursor()
+
+        _ensure_migrations_table(cursor)
+
+        cursor.execute('SELECT version, checksum, applied_at FROM Magnum_OPUS.schema_migrations')
+        applied = {version: (checksum, applied_at) for version, checksum, applied_at in cursor.fetchall()}
+
+        return [{'version': migration['version'],
+                 'name': migration['name'],
+                 'applied': migration['version'] in applied,
+                 'applied_at': applied.get(migration['version'], (None, None))[1],
+                 'changed': migration['version'] in applied and applied[migration['version']][0] != migration['checksum']}
+                for migration in load_migrations()]
+
+    finally:
+        if connection is not None and cursor is not None:
+            cursor.close()
+            connection.close()
+
+
+def migrate(target: int = None):
+    """
+    Applies every pending migration in version order, up to and including `target`.
+
+    MySQL commits DDL statements implicitly, so a migration is recorded only after all of its
+    statements succeeded; a failed migration stops the run and has to be fixed by hand.
+
+    :param target: The last version to apply, or None to apply all of them.
+    :return: The list of versions that were applied.
+    :raises Exception: Any database error raised by a migration statement.
+    """
+    connection = None
+    cursor = None
+    applied_now = []
+
+    try:
+        connection = open_mysql_connection(use_database=False)
+        cursor = connection.cursor()
+
+        _ensure_migrations_table(cursor)
+
+        cursor.execute('SELECT version FROM Magnum_OPUS.schema_migrations')
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for migration in load_migrations():
+            if migration['version'] in applied or (target is not None and migration['version'] > target):
+                continue
+
+            for statement in migration['statements']:
+                cursor.execute(statement)
+
+            cursor.execute('INSERT INTO Magnum_OPUS.schema_migrations (version, name, checksum, applied_at) '
+                           'VALUES (%s, %s, %s, %s)',
+                           (migration['version'], migration['name'], migration['checksum'], datetime.now()))
+            connection.commit()
+
+            applied_now.append(migration['version'])
+
+        return applied_now
+
+    finally:
+        if connection is not None and cursor is not None:
+            cursor.close()
+            connection.close()
+
+
+class _RecordingCursor:
+    """
+    Cursor wrapper that remembers every statement it executes.
+    """
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, operation, params=None):
+        self._statements.append((operation, tuple(params) if params else ()))
+        return self._cursor.execute(operation, params)
+
+
+class _RecordingConnection:
+    """
+    Request-scoped connection used by explain_check().
+
+    It records the statements of every cursor, ignores commit() and rolls everything back when released,
+    so the write services can be exercised without changing any data.
+    """
+
+    def __init__(self, raw_connection):
+        self._raw = raw_connection
+        self.statements = []
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._raw.cursor(*args, **kwargs), self.statements)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def release(self):
+        try:
+            self._raw.rollback()
+        finally:
+            self._raw.close()
+
+
+def _service_scenarios():
+    """
+    Returns the service calls whose statements are checked by explain_check(),
+    covering every filter and sort order the UI can request.
+    """
+    sample_row = get_decoder(LIST_COLUMNS)([(1, 'm', 'm', None, None, '2020-01-01', None, None, None)])[0]
+    scenarios = [(verify_auth, ('popescu ion', 'parola')),
+                 (headcounts.count_table, ()),
+                 (get_employee_by_id, (1,)),
+                 (get_all_employees_by_role, ('Admin',)),
+                 (get_all_values_from_a_column, ('department',)),
+                 (get_all_values_from_a_column, ('role',))]
+
+    for filter_by in FILTER_ORDERINGS:
+        for role, department in ((None, None), ('Suport', None), (None, 'IT'), ('Suport', 'IT')):
+            scenarios.append((filter_users, (filter_by, role, department)))
+            scenarios.append((filter_users, (filter_by, role, department, None, 50, encode_cursor(filter_by, sample_row))))
+
+    scenarios.append((filter_users, (None, None, None, 'pop')))
+    scenarios.append((filter_users, ('asc', 'Suport', None, 'pop')))
+
+    scenarios.append((edit_user, ({'ID': 1, 'last_name': 'Popescu', 'first_name': None, 'department': None,
+                                   'role': None, 'date': None, 'county': None, 'phone': None},)))
+    scenarios.append((delete_user, (1,)))
+
+    return scenarios
+
+
+def explain_check(app):
+    """
+    Runs EXPLAIN on every statement the services emit and reports the full table scans.
+
+    The services are called inside a request context whose connection records their statements, in a
+    single transaction that is rolled back, so the write services change neither the data nor the
+    in-memory state that follows it. A statement fails the check when MySQL would read the whole table
+    (access type ALL) without any usable index. A full scan chosen by the optimizer although an index
+    exists (usual on small tables) is reported as a warning only.
+
+    :param app: The Flask application, used to create the request context.
+    :return: A tuple (failures, warnings); each item is a dictionary with the keys sql, table, type and possible_keys.
+    """
+    failures = []
+    warnings = []
+    seen = set()
+
+    with app.test_request_context():
+        g.db_connection = _RecordingConnection(open_mysql_connection())
+
+        # The services join this transaction: their writes are rolled back and their on_commit() callbacks
+        # (session revocations, cache and counter updates, change notifications) never run
+        with transaction(rollback_only=True):
+            for service, args in _service_scenarios():
+                employees_cache.clear()  # Make sure the cached services reach the database
+                service(*args)
+
+        statements = g.db_connection.statements
+        cursor = g.db_connection._raw.cursor(dictionary=True)
+
+        try:
+            for sql_query, params in statements:
+                if (sql_query, len(params)) in seen:
+                    continue
+
+                seen.add((sql_query, len(params)))
+
+                cursor.execute(f'EXPLAIN {sql_query}', params)
+
+                for plan in cursor.fetchall():
+                    if plan['type'] != 'ALL':
+                        continue
+
+                    report = {'sql': sql_query, 'table': plan['table'],
+                              'type': plan['type'], 'possible_keys': plan['possible_keys']}
+
+                    if plan['possible_keys']:
+                        warnings.append(report)
+                    else:
+                        failures.append(report)
+        finally:
+            cursor.close()
+
+    return failures, warnings
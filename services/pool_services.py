@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no connection could be checked out of the pool before the wait timeout expired.
+    """
+
+
+class PooledConnection:
+    """
+    Wraps a raw database connection that belongs to a ConnectionPool.
+
+    Every attribute that is not defined here is forwarded to the raw connection, so the object
+    can be used exactly like the connection returned by mysql.connector.connect().
+    Calling close() returns the connection to its pool instead of closing the socket.
+    """
+
+    def __init__(self, pool, raw_connection):
+        self._pool = pool
+        self._raw = raw_connection
+        self._checked_in = True
+        self.created_at = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        """
+        Opens a cursor on the raw connection, wrapped by the pool's cursor_wrapper if it has one.
+        """
+        cursor = self._raw.cursor(*args, **kwargs)
+
+        return self._pool.cursor_wrapper(cursor) if self._pool.cursor_wrapper else cursor
+
+    def close(self):
+        """
+        Returns the connection to the pool. Calling it more than once has no effect.
+        """
+        if not self._checked_in:
+            self._pool.checkin(self)
+
+
+class RequestConnection:
+    """
+    Request-scoped handle around a PooledConnection.
+
+    All service calls made during one Flask request share the same handle. Its close() method is a no-op,
+    so the existing `connection.close()` calls in the services keep working; the connection only goes back
+    to the pool when release() is called by the teardown hook.
+    """
+
+    def __init__(self, pooled_connection):
+        self._pooled = pooled_connection
+
+    def __getattr__(self, name):
+        return getattr(self._pooled, name)
+
+    def close(self):
+        """
+        Does nothing; the connection stays checked out until the end of the request.
+        """
+
+    def release(self):
+        """
+        Returns the underlying connection to the pool.
+        """
+        self._pooled.close()
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of database connections.
+
+    :param connect: Callable that opens and returns a new raw connection.
+    :param size: Number of connections kept open in the pool when idle.
+    :param max_overflow: Number of extra connections allowed above `size` under load.
+                         They are closed as soon as they are returned.
+    :param timeout: Seconds to wait for a free connection before raising PoolTimeoutError.
+    :param recycle: Connections older than this many seconds are reopened on checkout. 0 disables recycling.
+    :param pre_ping: If True, idle connections are pinged on checkout and replaced if they are dead.
+    :param cursor_wrapper: Optional callable applied to every cursor opened on a pooled connection
+                           (used to instrument the queries).
+    """
+
+    def __init__(self, connect, size: int = 5, max_overflow: int = 10, timeout: float = 30,
+                 recycle: float = 3600, pre_ping: bool = True, cursor_wrapper=None):
+        self._connect = connect
+        self.cursor_wrapper = cursor_wrapper
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._condition = threading.Condition()
+
+        self._total = 0  # Open connections, idle and checked out
+        self._checked_out = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+
+    def checkout(self):
+        """
+        Takes a connection out of the pool, opening a new one if the pool is not full.
+
+        :return: A PooledConnection ready to be used.
+        :raises PoolTimeoutError: If every connection stayed busy for longer than the wait timeout.
+        :raises Exception: Any error raised by the connect callable.
+        """
+        deadline = time.monotonic() + self.timeout
+        pooled = None
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f'No connection available after {self.timeout} seconds')
+
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._checked_out += 1
+
+        try:
+            if pooled is None:
+                pooled = self._open()
+            else:
+                pooled = self._validate(pooled)
+
+        except Exception:
+            with self._condition:
+                self._total -= 1
+                self._checked_out -= 1
+                self._condition.notify()
+            raise
+
+        pooled._checked_in = False
+        return pooled
+
+    def checkin(self, pooled):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back first.
+
+        :param pooled: The PooledConnection that was checked out.
+        """
+        pooled._checked_in = True
+        keep = True
+
+        try:
+            if pooled._raw.in_transaction:
+                pooled._raw.rollback()
+        except Exception:
+            keep = False
+
+        with self._condition:
+            self._checked_out -= 1
+
+            if keep and len(self._idle) < self.size:
+                self._idle.append(pooled)
+            else:
+                self._total -= 1
+                self._close_quietly(pooled)
+
+            self._condition.notify()
+
+    def prefill(self):
+        """
+        Opens connections until `size` are open, so that the first requests do not wait for them.
+
+        :return: The number of connections opened.
+        :raises Exception: Any error raised by the connect callable.
+        """
+        with self._condition:
+            missing = self.size - self._total
+
+        connections = []
+
+        try:
+            for _ in range(missing):
+                connections.append(self.checkout())
+
+        finally:
+            for pooled in connections:
+                self.checkin(pooled)
+
+        return len(connections)
+
+    def dispose(self):
+        """
+        Closes every idle connection. Connections that are checked out are closed when they are returned.
+        """
+        with self._condition:
+            while self._idle:
+                self._close_quietly(self._idle.pop())
+                self._total -= 1
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters.
+
+        :return: A dictionary with the keys size, max_overflow, open, idle, checked_out, waiting, created and recycled.
+        """
+        with self._condition:
+            return {'size': self.size,
+                    'max_overflow': self.max_overflow,
+                    'open': self._total,
+                    'idle': len(self._idle),
+                    'checked_out': self._checked_out,
+                    'waiting': self._waiting,
+                    'created': self._created,
+                    'recycled': self._recycled}
+
+    def _open(self):
+        pooled = PooledConnection(self, self._connect())
+
+        with self._condition:
+            self._created += 1
+
+        return pooled
+
+    def _validate(self, pooled):
+        if self.recycle and time.monotonic() - pooled.created_at > self.recycle:
+            self._close_quietly(pooled)
+
+            with self._condition:
+                self._recycled += 1
+
+            return self._open()
+
+        if self.pre_ping:
+            try:
+                pooled._raw.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(pooled)
+                return self._open()
+
+        return pooled
+
+    @staticmethod
+    def _close_quietly(pooled):
+        try:
+            pooled._raw.close()
+        except Exception:
+            pass
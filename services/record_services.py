@@ -0,0 +1,120 @@
+import threading
+import unicodedata
+
+
+# Every column of the users table, in table order
+USERS_COLUMNS = ('ID', 'last_name', 'first_name', 'password', 'department', 'role', 'employment_date', 'county',
+                 'phone_number', 'its_active')
+
+# Every column except the password hash: what the services read when they need a whole employee
+EMPLOYEE_COLUMNS = tuple(column for column in USERS_COLUMNS if column != 'password')
+
+
+class EmployeeRecord:
+    """
+    A row of the users table, with one attribute per column.
+
+    Records are built by fetch_records() for the columns a query selected; reading a column
+    the query did not select raises AttributeError. Records may be shared through the employees
+    cache, so they must be treated as read-only.
+    """
+
+    __slots__ = USERS_COLUMNS
+
+    def to_dict(self):
+        """
+        :return: A dictionary of the columns that were selected.
+        """
+        return {column: getattr(self, column) for column in USERS_COLUMNS if hasattr(self, column)}
+
+    def __repr__(self):
+        return f'EmployeeRecord({", ".join(f"{key}={value!r}" for key, value in self.to_dict().items())})'
+
+
+_decoders = {}
+_decoders_lock = threading.Lock()
+
+
+def _build_decoder(columns: tuple):
+    # Same approach as collections.namedtuple: the decoder is generated once per projection, so
+    # decoding a row is a tuple unpacking and one slot assignment per column, without any dictionary
+    assignments = ''.join(f'        record.{column} = {column}\n' for column in columns)
+    source = (f'def decode(rows, new=object.__new__, record_class=EmployeeRecord):\n'
+              f'    records = []\n'
+              f'    append = records.append\n'
+              f'    for {", ".join(columns)}, in rows:\n'
+              f'        record = new(record_class)\n'
+              f'{assignments}'
+              f'        append(record)\n'
+              f'    return records\n')
+
+    namespace = {'EmployeeRecord': EmployeeRecord}
+    exec(source, namespace)
+
+    return namespace['decode']
+
+
+def get_decoder(columns: tuple):
+    """
+    Returns the function converting rows with the given columns to EmployeeRecord objects.
+
+    :param columns: The selected columns, in the order of the SELECT clause.
+    :return: A function taking an iterable of row tuples and returning a list of EmployeeRecord.
+    :raises ValueError: If a column is not a column of the users table.
+    """
+    decoder = _decoders.get(columns)
+
+    if decoder is None:
+        unknown = set(columns) - set(USERS_COLUMNS)
+
+        if unknown or not columns:
+            raise ValueError(f'Invalid columns: {", ".join(sorted(unknown))}')
+
+        with _decoders_lock:
+            decoder = _decoders.setdefault(columns, _build_decoder(columns))
+
+    return decoder
+
+
+def select_columns(columns: tuple):
+    """
+    :param columns: The columns to select.
+    :return: The column list of a SELECT clause.
+    """
+    return ', '.join(columns)
+
+
+def fetch_records(cursor, columns: tuple):
+    """
+    Reads every row of an executed query as EmployeeRecord objects.
+
+    :param cursor: A plain (tuple) cursor on which the query was executed.
+    :param columns: The columns of the SELECT clause, in order.
+    :return: A list of EmployeeRecord.
+    """
+    return get_decoder(columns)(cursor.fetchall())
+
+
+def fetch_record(cursor, columns: tuple):
+    """
+    Reads the next row of an executed query as an EmployeeRecord.
+
+    :param cursor: A plain (tuple) cursor on which the query was executed.
+    :param columns: The columns of the SELECT clause, in order.
+    :return: An EmployeeRecord, or None if there is no row left.
+    """
+    row = cursor.fetchone()
+
+    return get_decoder(columns)((row,))[0] if row is not None else None
+
+
+def normalize(text: str):
+    """
+    Lowercases a text and removes its diacritics ('Ștefănescu' becomes 'stefanescu').
+
+    :param text: The text to normalize.
+    :return: The normalized text.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+
+    return ''.join(character for character in decomposed if not unicodedata.combining(character)).lower()
@@ -0,0 +1,889 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from functools import partial
+
+from mysql.connector import Error
+
+from services.core_services import create_read_connection, get_pool, transaction, set_connection_factory
+from services.cache_services import bump_version
+from services.record_services import USERS_COLUMNS, select_columns, fetch_records, get_decoder, normalize
+
+
+# Sort keys accepted by find_employees(); the last column is always the unique ID
+ORDER_BY_NAME = ('last_name', 'first_name', 'ID')
+ORDER_BY_DATE = ('employment_date', 'ID')
+ORDER_BY_ID = ('ID',)
+
+# Columns of a new employee, in the order of the rows given to insert_employees()
+INSERT_COLUMNS = USERS_COLUMNS[1:]
+
+
+class EmployeeRepository(ABC):
+    """
+    Storage of the users table, used by the services instead of SQL.
+
+    Every method that writes must run inside core_services.transaction(); a backend joins the transaction
+    of the calling service, so its writes are committed or rolled back with the rest of the unit of work.
+    Reads return EmployeeRecord objects with the requested columns.
+    """
+
+    @abstractmethod
+    def find_employees(self, columns: tuple, role: str = None, department: str = None, ids: list = None,
+                       order: tuple = None, descending: bool = False, after: list = None, limit: int = None,
+                       lock: bool = False):
+        """
+        Returns the employees matching every given filter.
+
+        :param columns: The columns to read.
+        :param role: Only the employees with this role.
+        :param department: Only the employees of this department.
+        :param ids: Only the employees with these IDs.
+        :param order: The sort key, ORDER_BY_NAME, ORDER_BY_DATE or ORDER_BY_ID; unordered if None.
+        :param descending: Sort in descending order.
+        :param after: Keyset values (one per column of order): only the employees sorted after them.
+        :param limit: The maximum number of employees returned.
+        :param lock: Lock the rows until the end of the current transaction (SELECT ... FOR UPDATE).
+        :return: A list of EmployeeRecord.
+        """
+
+    @abstractmethod
+    def authenticate(self, last_name: str, first_name: str, password: str, columns: tuple):
+        """
+        :return: The EmployeeRecord with these credentials (names compared ignoring case), or None.
+        """
+
+    @abstractmethod
+    def find_logins(self, last_name: str, first_name: str):
+        """
+        :return: The its_active flags of the employees with this name (compared ignoring case), for the login gate.
+        """
+
+    @abstractmethod
+    def count_headcounts(self):
+        """
+        :return: A list of (role, department, county, its_active, employment month 'aaaa-mm', number of employees).
+        """
+
+    @abstractmethod
+    def distinct_values(self, column: str):
+        """
+        :return: The distinct values of a column.
+        :raises ValueError: If the column does not exist.
+        """
+
+    @abstractmethod
+    def list_names(self):
+        """
+        :return: A list of (ID, last_name, first_name) of every employee, used to build the name index.
+        """
+
+    @abstractmethod
+    def iter_rows(self, columns: tuple, batch_size: int):
+        """
+        Reads every employee in ID order, batch_size rows at a time, without holding the table in memory.
+
+        :return: A generator of lists of row tuples.
+        """
+
+    @abstractmethod
+    def insert_employee(self, values: dict):
+        """
+        :param values: The value of every column of INSERT_COLUMNS.
+        :return: The ID of the new employee.
+        """
+
+    @abstractmethod
+    def insert_employees(self, rows: list):
+        """
+        :param rows: Tuples with the values of INSERT_COLUMNS, inserted by a single statement.
+        """
+
+    @abstractmethod
+    def update_employees(self, ids: list, changes: dict):
+        """
+        :param ids: The IDs of the employees to update.
+        :param changes: Column -> new value, applied to every employee.
+        """
+
+    @abstractmethod
+    def delete_employees(self, ids: list):
+        """
+        :param ids: The IDs of the employees to delete.
+        """
+
+    @abstractmethod
+    def clear(self):
+        """
+        Deletes every employee.
+        """
+
+    @abstractmethod
+    def record_changes(self, changes: list):
+        """
+        Appends changes to the change log, each with the next version number. Versions are given in commit
+        order: a reader that saw version N never sees a lower version appear later.
+
+        :param changes: A list of (employee ID or None, operation, JSON data or None).
+        """
+
+    @abstractmethod
+    def changes_since(self, version: int, limit: int):
+        """
+        :param version: The last version the reader has seen.
+        :param limit: The maximum number of changes returned.
+        :return: A list of (version, employee ID, operation, JSON data), in version order.
+        """
+
+    @abstractmethod
+    def change_bounds(self):
+        """
+        :return: A tuple (oldest version kept, latest version), (None, 0) if the log is empty.
+        """
+
+    @abstractmethod
+    def prune_changes(self, before_version: int):
+        """
+        Deletes the changes older than a version.
+
+        :param before_version: The oldest version kept.
+        """
+
+
+class SQLEmployeeRepository(EmployeeRepository):
+    """
+    Implementation shared by the SQL backends; the subclasses set the dialect.
+    Reads use the request read connection (create_read_connection(), a replica when there are replicas),
+    writes and locking reads the transaction's one.
+    """
+
+    table = None
+    changes_table = None
+    placeholder = None
+    lock_clause = None
+    clear_statement = None
+
+    def _placeholders(self, count: int):
+        return ', '.join([self.placeholder] * count)
+
+    def _seek_condition(self, order: tuple, descending: bool, after: list):
+        """
+        Builds the keyset condition for the employees sorted after the values of after.
+
+        The row comparison (a, b, c) > (?, ?, ?) is not turned into a range of the sort index by MySQL, so it is
+        written out as a > ? OR (a = ? AND (b > ? OR (b = ? AND c > ?))), preceded by the redundant a >= ?
+        with which SQLite, too, seeks into the index instead of scanning it.
+
+        :return: A tuple (SQL condition, parameters).
+        """
+        operator = '<' if descending else '>'
+        condition, params = f'{order[-1]} {operator} {self.placeholder}', [after[-1]]
+
+        for column, value in zip(reversed(order[:-1]), reversed(after[:-1])):
+            condition = f'{column} {operator} {self.placeholder} OR ({column} = {self.placeholder} AND ({condition}))'
+            params = [value, value, *params]
+
+        if len(order) > 1:
+            condition = f'{order[0]} {operator}= {self.placeholder} AND ({condition})'
+            params = [after[0], *params]
+
+        return f'({condition})', params
+
+    def _after_write(self, cursor):
+        """
+        Called on the cursor of every write, before the commit.
+        """
+
+    @staticmethod
+    def _fetch(connection, sql_query: str, params, columns: tuple = None):
+        cursor = connection.cursor()
+
+        try:
+            cursor.execute(sql_query, tuple(params))
+
+            return fetch_records(cursor, columns) if columns else cursor.fetchall()
+
+        finally:
+            cursor.close()
+
+    def _query(self, sql_query: str, params=(), columns: tuple = None, lock: bool = False):
+        if lock:
+            with transaction() as connection:
+                return self._fetch(connection, sql_query + self.lock_clause, params, columns)
+
+        connection = create_read_connection()
+
+        if connection is None:
+            raise Error('Nu s-a putut realiza conexiunea la baza de date.')
+
+        try:
+            return self._fetch(connection, sql_query, params, columns)
+
+        finally:
+            connection.close()
+
+    def _write(self, sql_query: str, params=(), many: bool = False):
+        with transaction() as connection:
+            cursor = connection.cursor()
+
+            try:
+                if many:
+                    cursor.executemany(sql_query, params)
+                else:
+                    cursor.execute(sql_query, tuple(params))
+
+                self._after_write(cursor)
+
+                return cursor.lastrowid
+
+            finally:
+                cursor.close()
+
+    def find_employees(self, columns: tuple, role: str = None, department: str = None, ids: list = None,
+                       order: tuple = None, descending: bool = False, after: list = None, limit: int = None,
+                       lock: bool = False):
+        conditions = []
+        params = []
+
+        if role is not None:
+            conditions.append(f'role = {self.placeholder}')
+            params.append(role)
+
+        if department is not None:
+            conditions.append(f'department = {self.placeholder}')
+            params.append(department)
+
+        if ids is not None:
+            if not ids:
+                return []
+
+            conditions.append(f'ID IN ({self._placeholders(len(ids))})')
+            params.extend(ids)
+
+        if after is not None:
+            condition, seek_params = self._seek_condition(order, descending, after)
+            conditions.append(condition)
+            params.extend(seek_params)
+
+        sql_query = f'SELECT {select_columns(columns)} FROM {self.table}'
+
+        if conditions:
+            sql_query += ' WHERE ' + ' AND '.join(conditions)
+
+        if order:
+            sql_query += ' ORDER BY ' + ', '.join(f"{column} {'DESC' if descending else 'ASC'}" for column in order)
+
+        if limit is not None:
+            sql_query += f' LIMIT {self.placeholder}'
+            params.append(limit)
+
+        return self._query(sql_query, params, columns, lock)
+
+    def authenticate(self, last_name: str, first_name: str, password: str, columns: tuple):
+        sql_query = (f'SELECT {select_columns(columns)} FROM {self.table} WHERE last_name = {self.placeholder} '
+                     f'AND first_name = {self.placeholder} AND password = {self.placeholder}')
+        result = self._query(sql_query, (last_name, first_name, password), columns)
+
+        return result[0] if result else None
+
+    def find_logins(self, last_name: str, first_name: str):
+        sql_query = (f'SELECT its_active FROM {self.table} WHERE last_name = {self.placeholder} '
+                     f'AND first_name = {self.placeholder}')
+
+        return [row[0] for row in self._query(sql_query, (last_name, first_name))]
+
+    def count_headcounts(self):
+        return self._query(f'SELECT role, department, county, its_active, SUBSTR(employment_date, 1, 7), COUNT(*) '
+                           f'FROM {self.table} '
+                           f'GROUP BY role, department, county, its_active, SUBSTR(employment_date, 1, 7)')
+
+    def distinct_values(self, column: str):
+        if column not in USERS_COLUMNS:
+            raise ValueError(f'Invalid column name: {column}')
+
+        return [row[0] for row in self._query(f'SELECT DISTINCT {column} FROM {self.table}')]
+
+    def list_names(self):
+        return self._query(f'SELECT ID, last_name, first_name FROM {self.table}')
+
+    def iter_rows(self, columns: tuple, batch_size: int):
+        # A connection of its own, so the request connection stays free while the rows are streamed
+        connection = get_pool().checkout()
+        cursor = connection.cursor()
+
+        try:
+            cursor.execute(f'SELECT {select_columns(columns)} FROM {self.table} ORDER BY ID')
+
+            while rows := cursor.fetchmany(batch_size):
+                yield rows
+
+        finally:
+            try:
+                cursor.close()  # Stopped early (client gone): the unread rows are discarded
+            finally:
+                connection.close()
+
+    def insert_employee(self, values: dict):
+        return self._write(f'INSERT INTO {self.table} ({select_columns(INSERT_COLUMNS)}) '
+                           f'VALUES ({self._placeholders(len(INSERT_COLUMNS))})',
+                           [values[column] for column in INSERT_COLUMNS])
+
+    def insert_employees(self, rows: list):
+        if rows:
+            self._write(f'INSERT INTO {self.table} ({select_columns(INSERT_COLUMNS)}) '
+                        f'VALUES ({self._placeholders(len(INSERT_COLUMNS))})', rows, many=True)
+
+    def update_employees(self, ids: list, changes: dict):
+        if ids and changes:
+            assignments = ', '.join(f'{column} = {self.placeholder}' for column in changes)
+            self._write(f'UPDATE {self.table} SET {assignments} WHERE ID IN ({self._placeholders(len(ids))})',
+                        (*changes.values(), *ids))
+
+    def delete_employees(self, ids: list):
+        if ids:
+            self._write(f'DELETE FROM {self.table} WHERE ID IN ({self._placeholders(len(ids))})', ids)
+
+    def clear(self):
+        self._write(self.clear_statement)
+
+    def record_changes(self, changes: list):
+        # The versions are assigned by the table: only right when writers are serialized, as with SQLite
+        with transaction() as connection:
+            cursor = connection.cursor()
+
+            try:
+                cursor.executemany(f'INSERT INTO {self.changes_table} (employee_id, operation, data, changed_at) '
+                                   f'VALUES ({self._placeholders(4)})',
+                                   [(*change, time.time()) for change in changes])
+            finally:
+                cursor.close()
+
+    def changes_since(self, version: int, limit: int):
+        return self._query(f'SELECT version, employee_id, operation, data FROM {self.changes_table} '
+                           f'WHERE version > {self.placeholder} ORDER BY version LIMIT {self.placeholder}',
+                           (version, limit))
+
+    def change_bounds(self):
+        oldest, latest = self._query(f'SELECT MIN(version), MAX(version) FROM {self.changes_table}')[0]
+
+        return oldest, latest or 0
+
+    def prune_changes(self, before_version: int):
+        with transaction() as connection:
+            cursor = connection.cursor()
+
+            try:
+                cursor.execute(f'DELETE FROM {self.changes_table} WHERE version < {self.placeholder}',
+                               (before_version,))
+            finally:
+                cursor.close()
+
+
+class MySQLEmployeeRepository(SQLEmployeeRepository):
+    """
+    Keeps the employees in the Magnum_OPUS.users table of MySQL (created by the migrations).
+    Every write also increments the shared cache version (see cache_services.bump_version).
+    """
+
+    table = 'Magnum_OPUS.users'
+    changes_table = 'Magnum_OPUS.employee_changes'
+    placeholder = '%s'
+    lock_clause = ' FOR UPDATE'
+    clear_statement = 'DELETE FROM Magnum_OPUS.users'
+
+    def _after_write(self, cursor):
+        bump_version(cursor)
+
+    def record_changes(self, changes: list):
+        with transaction() as connection:
+            cursor = connection.cursor()
+
+            try:
+                # The counter row stays locked until the commit, so versions are given in commit order
+                cursor.execute("UPDATE Magnum_OPUS.cache_versions SET version = LAST_INSERT_ID(version + %s) "
+                               "WHERE name = 'employee_changes'", (len(changes),))
+                cursor.execute('SELECT LAST_INSERT_ID()')
+                first_version = cursor.fetchone()[0] - len(changes) + 1
+
+                cursor.executemany('INSERT INTO Magnum_OPUS.employee_changes '
+                                   '(version, employee_id, operation, data, changed_at) VALUES (%s, %s, %s, %s, %s)',
+                                   [(first_version + index, *change, time.time())
+                                    for index, change in enumerate(changes)])
+            finally:
+                cursor.close()
+
+
+class SQLiteCursor:
+    """
+    sqlite3 cursor accepting the calls the services make on mysql.connector cursors.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None):
+        return self._cursor.execute(operation, params or ())
+
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(operation, seq_params)
+
+
+class SQLiteConnection:
+    """
+    Connection to a SQLite database with the interface of a mysql.connector connection
+    used by the pool and by core_services.transaction().
+
+    :param path: The path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        # The pool hands connections from one thread to another, never to two threads at once
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def start_transaction(self):
+        self._connection.execute('BEGIN IMMEDIATE')  # Takes the write lock at once, like the FOR UPDATE reads
+
+    def cursor(self, *args, **kwargs):
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect: bool = False):
+        self._connection.execute('SELECT 1')
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteEmployeeRepository(SQLEmployeeRepository):
+    """
+    Keeps the employees in a SQLite file, for local development and benchmarks without a MySQL server.
+    The table and the indexes of the baseline migration are created if they do not exist. Names are compared
+    ignoring case, as with the MySQL collation. Writers are serialized by the database lock.
+
+    :param path: The path of the SQLite database file.
+    """
+
+    table = 'users'
+    changes_table = 'employee_changes'
+    placeholder = '?'
+    lock_clause = ''
+    clear_statement = 'DELETE FROM users'
+
+    def __init__(self, path: str):
+        self.path = path
+
+        connection = sqlite3.connect(path)
+
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'ID INTEGER PRIMARY KEY AUTOINCREMENT, last_name TEXT NOT NULL COLLATE NOCASE, '
+                'first_name TEXT NOT NULL COLLATE NOCASE, password TEXT NOT NULL, department TEXT NOT NULL, '
+                'role TEXT NOT NULL, employment_date TEXT NOT NULL, county TEXT NOT NULL, '
+                'phone_number TEXT NOT NULL, its_active INTEGER NOT NULL DEFAULT 1);'
+                'CREATE INDEX IF NOT EXISTS idx_users_name ON users (last_name, first_name);'
+                'CREATE INDEX IF NOT EXISTS idx_users_employment_date ON users (employment_date);'
+                'CREATE INDEX IF NOT EXISTS idx_users_role_name ON users (role, last_name, first_name);'
+                'CREATE INDEX IF NOT EXISTS idx_users_role_date ON users (role, employment_date);'
+                'CREATE INDEX IF NOT EXISTS idx_users_department_name ON users (department, last_name, first_name);'
+                'CREATE INDEX IF NOT EXISTS idx_users_department_date ON users (department, employment_date);'
+                'CREATE INDEX IF NOT EXISTS idx_users_headcounts '
+                'ON users (role, department, county, its_active, employment_date);'
+                'DROP INDEX IF EXISTS idx_users_role_department;'
+                'CREATE TABLE IF NOT EXISTS employee_changes ('
+                'version INTEGER PRIMARY KEY AUTOINCREMENT, employee_id INTEGER, operation TEXT NOT NULL, '
+                'data TEXT, changed_at REAL NOT NULL);')
+            connection.commit()
+
+        finally:
+            connection.close()
+
+
+class MemoryConnection:
+    """
+    Connection-like handle on a MemoryEmployeeRepository, so the pool and core_services.transaction()
+    work unchanged. A transaction holds the repository lock from start to end and keeps an undo log:
+    a rollback applies it in reverse order.
+
+    :param repository: The MemoryEmployeeRepository.
+    """
+
+    def __init__(self, repository):
+        self._repository = repository
+        self._undo_log = None
+
+    @property
+    def in_transaction(self):
+        return self._undo_log is not None
+
+    def start_transaction(self):
+        self._repository.lock.acquire()
+        self._undo_log = []
+
+    def record_undo(self, callback):
+        """
+        Registers the function reverting a write of the current transaction.
+
+        :param callback: A function without arguments.
+        """
+        self._undo_log.append(callback)
+
+    def commit(self):
+        if self._undo_log is not None:
+            self._undo_log = None
+            self._repository.lock.release()
+
+    def rollback(self):
+        if self._undo_log is not None:
+            try:
+                for callback in reversed(self._undo_log):
+                    callback()
+            finally:
+                self._undo_log = None
+                self._repository.lock.release()
+
+    def ping(self, reconnect: bool = False):
+        pass
+
+    def close(self):
+        self.rollback()
+
+
+class MemoryEmployeeRepository(EmployeeRepository):
+    """
+    Keeps the employees in the memory of the process, to profile the web tier without a database.
+    The data is lost on restart and is not shared between worker processes.
+
+    The rows are indexed by ID, with hash indexes on role and department (and on the lowercased
+    names, for the login) and sorted indexes for every sort key of find_employees(), so filtering
+    and keyset pagination cost about as much as with the database indexes.
+    """
+
+    # Hash indexes used by find_employees(): column -> value -> set of IDs
+    HASH_COLUMNS = ('role', 'department')
+
+    # Columns sorted without case and diacritics, like the MySQL collation (the SQLite NOCASE folds only ASCII case)
+    FOLDED_COLUMNS = ('last_name', 'first_name')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+        self._positions = {column: index for index, column in enumerate(USERS_COLUMNS)}
+        self._key_folders = {order: self._folder(order) for order in (ORDER_BY_NAME, ORDER_BY_DATE, ORDER_BY_ID)}
+        self._sort_keys = {order: self._sort_key(order) for order in self._key_folders}
+        self._projections = {}
+        self._last_id = 0
+
+        self._changes = []  # (version, employee ID, operation, JSON data), in version order
+        self._last_version = 0
+
+        self._reset()
+
+    def _reset(self):
+        self._rows = {}  # ID -> tuple of the values of USERS_COLUMNS
+        self._hash_indexes = {column: {} for column in self.HASH_COLUMNS}
+        self._name_index = {}  # (last name, first name) lowercased -> set of IDs
+        self._sorted_indexes = {order: [] for order in self._sort_keys}  # Sort key -> sorted list of key tuples
+
+    def _getter(self, columns: tuple):
+        positions = [self._positions[column] for column in columns]
+
+        return lambda row: tuple(row[position] for position in positions)
+
+    def _folder(self, order: tuple):
+        folded = [column in self.FOLDED_COLUMNS for column in order]
+
+        if not any(folded):
+            return tuple
+
+        return lambda values: tuple(normalize(value) if fold else value for value, fold in zip(values, folded))
+
+    def _sort_key(self, order: tuple):
+        getter, fold = self._getter(order), self._key_folders[order]
+
+        return lambda row: fold(getter(row))
+
+    def _project(self, columns: tuple):
+        projection = self._projections.get(columns)
+
+        if projection is None:
+            projection = self._projections.setdefault(columns, self._getter(columns))
+
+        return projection
+
+    def _add(self, row: tuple):
+        employee_id = row[0]
+        self._rows[employee_id] = row
+
+        for column, index in self._hash_indexes.items():
+            index.setdefault(row[self._positions[column]], set()).add(employee_id)
+
+        self._name_index.setdefault((row[1].lower(), row[2].lower()), set()).add(employee_id)
+
+        for order, keys in self._sorted_indexes.items():
+            insort(keys, self._sort_keys[order](row))
+
+    def _remove(self, employee_id: int):
+        row = self._rows.pop(employee_id)
+
+        for column, index in self._hash_indexes.items():
+            self._discard(index, row[self._positions[column]], employee_id)
+
+        self._discard(self._name_index, (row[1].lower(), row[2].lower()), employee_id)
+
+        for order, keys in self._sorted_indexes.items():
+            del keys[bisect_left(keys, self._sort_keys[order](row))]
+
+        return row
+
+    @staticmethod
+    def _discard(index: dict, value, employee_id: int):
+        ids = index[value]
+        ids.discard(employee_id)
+
+        if not ids:
+            del index[value]
+
+    def _replace(self, employee_id: int, row: tuple):
+        self._remove(employee_id)
+        self._add(row)
+
+    def _normalize(self, values: list):
+        # Stored like the SQLite backend returns them: dates as 'aaaa-mm-dd' strings, flags as integers
+        values[self._positions['employment_date']] = str(values[self._positions['employment_date']])
+        values[self._positions['its_active']] = int(values[self._positions['its_active']])
+
+        return tuple(values)
+
+    def find_employees(self, columns: tuple, role: str = None, department: str = None, ids: list = None,
+                       order: tuple = None, descending: bool = False, after: list = None, limit: int = None,
+                       lock: bool = False):
+        with self.lock:  # Rows locked by a transaction are only readable once it ends, like lock=True
+            candidates = None
+
+            if ids is not None:
+                candidates = {int(employee_id) for employee_id in ids} & self._rows.keys()
+
+            for column, value in (('role', role), ('department', department)):
+                if value is not None:
+                    matching = self._hash_indexes[column].get(value, set())
+                    candidates = matching if candidates is None else candidates & matching
+
+            if order is None:
+                selected = list(self._rows if candidates is None else candidates)[:limit]
+            else:
+                selected = self._seek(candidates, tuple(order), descending, after, limit)
+
+            project = self._project(tuple(columns))
+
+            return get_decoder(tuple(columns))([project(self._rows[employee_id]) for employee_id in selected])
+
+    def _seek(self, candidates: set, order: tuple, descending: bool, after: list, limit: int):
+        keys = self._sorted_indexes[order]
+        scan_index = candidates is None or len(candidates) * 8 >= len(keys)
+
+        if not scan_index:  # Few candidates: sorting them is cheaper than scanning the index
+            key = self._sort_keys[order]
+            keys = sorted(key(self._rows[employee_id]) for employee_id in candidates)
+
+        if after is not None:
+            after = self._key_folders[order](after)
+
+        if descending:
+            stop = bisect_left(keys, after) if after is not None else len(keys)
+            positions = range(stop - 1, -1, -1)
+        else:
+            start = bisect_right(keys, after) if after is not None else 0
+            positions = range(start, len(keys))
+
+        selected = []
+
+        for position in positions:
+            employee_id = keys[position][-1]
+
+            if scan_index and candidates is not None and employee_id not in candidates:
+                continue
+
+            selected.append(employee_id)
+
+            if limit is not None and len(selected) == limit:
+                break
+
+        return selected
+
+    def authenticate(self, last_name: str, first_name: str, password: str, columns: tuple):
+        with self.lock:
+            for employee_id in self._name_index.get((last_name.lower(), first_name.lower()), ()):
+                row = self._rows[employee_id]
+
+                if row[self._positions['password']] == password:
+                    return get_decoder(tuple(columns))([self._project(tuple(columns))(row)])[0]
+
+        return None
+
+    def find_logins(self, last_name: str, first_name: str):
+        with self.lock:
+            return [self._rows[employee_id][self._positions['its_active']]
+                    for employee_id in self._name_index.get((last_name.lower(), first_name.lower()), ())]
+
+    def count_headcounts(self):
+        groups = self._getter(('role', 'department', 'county', 'its_active', 'employment_date'))
+
+        with self.lock:
+            counts = Counter(groups(row) for row in self._rows.values())
+
+        return [(role, department, county, its_active, employment_date[:7], count)
+                for (role, department, county, its_active, employment_date), count in counts.items()]
+
+    def distinct_values(self, column: str):
+        if column not in USERS_COLUMNS:
+            raise ValueError(f'Invalid column name: {column}')
+
+        with self.lock:
+            if column in self._hash_indexes:
+                return list(self._hash_indexes[column])
+
+            return list(dict.fromkeys(row[self._positions[column]] for row in self._rows.values()))
+
+    def list_names(self):
+        with self.lock:
+            return [(row[0], row[1], row[2]) for row in self._rows.values()]
+
+    def iter_rows(self, columns: tuple, batch_size: int):
+        project = self._project(tuple(columns))
+
+        with self.lock:
+            ids = [key[0] for key in self._sorted_indexes[ORDER_BY_ID]]
+
+        for start in range(0, len(ids), batch_size):
+            with self.lock:
+                rows = [project(self._rows[employee_id]) for employee_id in ids[start:start + batch_size]
+                        if employee_id in self._rows]
+
+            if rows:
+                yield rows
+
+    def insert_employee(self, values: dict):
+        with transaction() as connection:
+            self._last_id += 1
+            row = self._normalize([self._last_id, *(values[column] for column in INSERT_COLUMNS)])
+
+            self._add(row)
+            connection.record_undo(partial(self._remove, row[0]))
+
+            return row[0]
+
+    def insert_employees(self, rows: list):
+        with transaction() as connection:
+            for values in rows:
+                self._last_id += 1
+                row = self._normalize([self._last_id, *values])
+
+                self._add(row)
+                connection.record_undo(partial(self._remove, row[0]))
+
+    def update_employees(self, ids: list, changes: dict):
+        unknown = set(changes) - set(INSERT_COLUMNS)
+
+        if unknown:
+            raise ValueError(f'Invalid columns: {", ".join(sorted(unknown))}')
+
+        with transaction() as connection:
+            for employee_id in {int(employee_id) for employee_id in ids} & self._rows.keys():
+                previous = self._rows[employee_id]
+                values = list(previous)
+
+                for column, value in changes.items():
+                    values[self._positions[column]] = value
+
+                self._replace(employee_id, self._normalize(values))
+                connection.record_undo(partial(self._replace, employee_id, previous))
+
+    def delete_employees(self, ids: list):
+        with transaction() as connection:
+            for employee_id in {int(employee_id) for employee_id in ids} & self._rows.keys():
+                connection.record_undo(partial(self._add, self._remove(employee_id)))
+
+    def clear(self):
+        with transaction() as connection:
+            rows = list(self._rows.values())
+            self._reset()
+
+            connection.record_undo(lambda: [self._add(row) for row in rows])
+
+    def record_changes(self, changes: list):
+        with transaction() as connection:
+            for employee_id, operation, data in changes:
+                self._last_version += 1
+                self._changes.append((self._last_version, employee_id, operation, data))
+
+            connection.record_undo(partial(self._forget_changes, len(changes)))
+
+    def _forget_changes(self, count: int):
+        del self._changes[len(self._changes) - count:]
+        self._last_version -= count
+
+    def changes_since(self, version: int, limit: int):
+        with self.lock:
+            start = bisect_right(self._changes, version, key=lambda change: change[0])
+
+            return self._changes[start:start + limit]
+
+    def change_bounds(self):
+        with self.lock:
+            return (self._changes[0][0] if self._changes else None), self._last_version
+
+    def prune_changes(self, before_version: int):
+        with transaction():
+            del self._changes[:bisect_left(self._changes, before_version, key=lambda change: change[0])]
+
+
+def create_repository():
+    """
+    Creates the employee repository configured by the environment variables:
+    DB_BACKEND ('mysql', 'sqlite' or 'memory') and DB_SQLITE_PATH.
+
+    The SQLite and memory backends also replace the connections of the pool, so that
+    core_services.transaction() opens its units of work on them.
+
+    :return: An EmployeeRepository.
+    :raises ValueError: If DB_BACKEND is unknown.
+    """
+    backend_name = os.getenv('DB_BACKEND', 'mysql')
+
+    match backend_name:
+        case 'mysql':
+            return MySQLEmployeeRepository()
+        case 'sqlite':
+            path = os.getenv('DB_SQLITE_PATH', 'magnum_opus.sqlite3')
+            set_connection_factory(partial(SQLiteConnection, path))
+            return SQLiteEmployeeRepository(path)
+        case 'memory':
+            memory_repository = MemoryEmployeeRepository()
+            set_connection_factory(partial(MemoryConnection, memory_repository))
+            return memory_repository
+        case _:
+            raise ValueError(f'Unknown storage backend: {backend_name}')
+
+
+repository = create_repository()
@@ -0,0 +1,297 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict
+
+from services.core_services import read_from_primary
+from services.record_services import normalize
+from services.repository_services import repository
+from services.cache_services import on_remote_change, check_remote_changes
+
+
+# Scores of a query word matching a name word; the score of an employee is the sum over the query words
+EXACT_MATCH_SCORE = 3
+PREFIX_MATCH_SCORE = 2
+SUBSTRING_MATCH_SCORE = 1
+
+
+def trigrams(word: str):
+    """
+    Returns the set of three-letter substrings of a word.
+
+    :param word: A normalized word of at least three letters.
+    :return: A set of strings.
+    """
+    return {word[index:index + 3] for index in range(len(word) - 2)}
+
+
+class NameSearchIndex:
+    """
+    In-memory index of the employee names, used instead of LIKE '%term%' queries.
+
+    The index works on the distinct name words rather than on the employees: a trigram index over the
+    word vocabulary finds the words that contain a query word, and each word maps to the set of
+    employees carrying it. Romanian directories have far fewer distinct names than employees, so a
+    query touches a few thousand words at most, whatever the size of the users table.
+
+    Matching is case- and diacritic-insensitive. Every query word must be found in the name
+    (as a whole word, a prefix or a substring, in decreasing order of relevance).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.loaded = False
+        self.loaded_at = 0.0
+
+    def _clear(self):
+        self._names = {}  # ID -> (normalized last name, normalized first name)
+        self._word_ids = defaultdict(set)  # word -> IDs of the employees carrying it
+        self._word_trigrams = defaultdict(set)  # trigram -> words containing it
+        self._sorted_words = []  # every word, sorted, for the prefix search of one and two letter queries
+
+    def build(self, rows):
+        """
+        Replaces the content of the index.
+
+        :param rows: An iterable of (ID, last_name, first_name) tuples.
+        """
+        with self._lock:
+            self._clear()
+
+            for employee_id, last_name, first_name in rows:
+                self._add(employee_id, last_name, first_name)
+
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+
+    def add(self, employee_id: int, last_name: str, first_name: str):
+        """
+        Adds an employee to the index, replacing the previous name if the ID is already indexed.
+
+        :param employee_id: The ID of the employee.
+        :param last_name: The last name of the employee.
+        :param first_name: The first name of the employee.
+        """
+        with self._lock:
+            if self.loaded:
+                self._remove(int(employee_id))
+                self._add(employee_id, last_name, first_name)
+
+    def update(self, employee_id: int, last_name: str = None, first_name: str = None):
+        """
+        Changes the name of an indexed employee. Names given as None or empty keep their current value.
+
+        :param employee_id: The ID of the employee.
+        :param last_name: The new last name, if it changed.
+        :param first_name: The new first name, if it changed.
+        """
+        with self._lock:
+            if not self.loaded or int(employee_id) not in self._names or not (last_name or first_name):
+                return
+
+            current_last_name, current_first_name = self._names[int(employee_id)]
+            self._remove(int(employee_id))
+            self._add(employee_id, last_name or current_last_name, first_name or current_first_name)
+
+    def remove(self, employee_id: int):
+        """
+        Removes an employee from the index.
+
+        :param employee_id: The ID of the employee.
+        """
+        with self._lock:
+            if self.loaded:
+                self._remove(int(employee_id))
+
+    def invalidate(self):
+        """
+        Marks the index as stale; it is rebuilt from the database on the next search.
+        """
+        with self._lock:
+            self.loaded = False
+            self._clear()
+
+    def search(self, term: str, limit: int = None, among: set = None):
+        """
+        Finds the employees whose name contains every word of the search term.
+
+        :param term: The text typed in the search bar.
+        :param limit: The maximum number of IDs returned, or None for every match.
+        :param among: Only these IDs can match (e.g. those of the role filtered by), so that the limit
+                      applies to the employees that pass the other filters.
+        :return: A list of employee IDs, the most relevant first and ties ordered by ID; without a limit,
+                 every match in ID order, without ranking them.
+        """
+        query_words = normalize(term).split()
+
+        if not query_words or (limit is not None and limit <= 0):
+            return []
+
+        with self._lock:
+            # For each query word: score -> IDs of the employees having a name word that matches with that score
+            matches = []
+
+            for query_word in query_words:
+                levels = defaultdict(set)
+
+                for word, score in self._matching_words(query_word):
+                    levels[score] |= self._word_ids[word]
+
+                if not levels:
+                    return []
+
+                matches.append(levels)
+
+            if limit is None:
+                found = set.intersection(*(set().union(*levels.values()) for levels in matches))
+
+                return sorted(found & among if among is not None else found)
+
+            if len(matches) == 1:
+                # Typing a single word is the common case: walk the score levels from the best one
+                # and stop as soon as the page is full, without scoring every match
+                ranked = []
+                seen = set()
+
+                for score in sorted(matches[0], reverse=True):
+                    ids = matches[0][score] - seen
+                    seen |= ids
+
+                    if among is not None:
+                        ids &= among
+
+                    ranked.extend(heapq.nsmallest(limit - len(ranked), ids))
+
+                    if len(ranked) >= limit:
+                        break
+
+                return ranked
+
+            candidates = set.intersection(*(set().union(*levels.values()) for levels in matches))
+
+            if among is not None:
+                candidates &= among
+
+            scores = {employee_id: sum(max(score for score, ids in levels.items() if employee_id in ids)
+                                       for levels in matches)
+                      for employee_id in candidates}
+
+            return heapq.nsmallest(limit, scores, key=lambda employee_id: (-scores[employee_id], employee_id))
+
+    def __len__(self):
+        return len(self._names)
+
+    def _matching_words(self, query_word: str):
+        if len(query_word) < 3:
+            # Too short for trigrams: only words starting with the query match
+            start = bisect.bisect_left(self._sorted_words, query_word)
+            end = bisect.bisect_left(self._sorted_words, query_word + '￿')
+
+            for word in self._sorted_words[start:end]:
+                yield word, EXACT_MATCH_SCORE if word == query_word else PREFIX_MATCH_SCORE
+
+            return
+
+        candidates = None
+
+        for trigram in sorted(trigrams(query_word), key=lambda item: len(self._word_trigrams.get(item, ()))):
+            words = self._word_trigrams.get(trigram)
+
+            if not words:
+                return
+
+            candidates = set(words) if candidates is None else candidates & words
+
+            if not candidates:
+                return
+
+        for word in candidates:
+            if word == query_word:
+                yield word, EXACT_MATCH_SCORE
+            elif word.startswith(query_word):
+                yield word, PREFIX_MATCH_SCORE
+            elif query_word in word:
+                yield word, SUBSTRING_MATCH_SCORE
+
+    def _add(self, employee_id, last_name, first_name):
+        employee_id = int(employee_id)
+        normalized = (normalize(last_name), normalize(first_name))
+        self._names[employee_id] = normalized
+
+        for word in set(' '.join(normalized).replace('-', ' ').split()):
+            if word not in self._word_ids:
+                bisect.insort(self._sorted_words, word)
+
+                for trigram in trigrams(word):
+                    self._word_trigrams[trigram].add(word)
+
+            self._word_ids[word].add(employee_id)
+
+    def _remove(self, employee_id):
+        normalized = self._names.pop(employee_id, None)
+
+        if normalized is None:
+            return
+
+        for word in set(' '.join(normalized).replace('-', ' ').split()):
+            ids = self._word_ids.get(word)
+
+            if ids is None:
+                continue
+
+            ids.discard(employee_id)
+
+            if not ids:
+                del self._word_ids[word]
+                del self._sorted_words[bisect.bisect_left(self._sorted_words, word)]
+
+                for trigram in trigrams(word):
+                    self._word_trigrams[trigram].discard(word)
+
+                    if not self._word_trigrams[trigram]:
+                        del self._word_trigrams[trigram]
+
+
+name_index = NameSearchIndex()
+
+# Safety net for deployments without the cache version row: the index is rebuilt after this many seconds
+_index_max_age = float(os.getenv('SEARCH_INDEX_MAX_AGE', 300))
+_build_lock = threading.Lock()
+
+
+@on_remote_change
+def _invalidate_on_remote_change():
+    name_index.invalidate()
+
+
+def _load_index():
+    """
+    Builds the name index from the users table. Only one thread builds it; the others wait for it.
+    """
+    with _build_lock:
+        if name_index.loaded and time.monotonic() - name_index.loaded_at < _index_max_age:
+            return
+
+        with read_from_primary():  # Rebuilt rarely, and must not miss the names written meanwhile
+            name_index.build(repository.list_names())
+
+
+def search_employee_ids(term: str, limit: int = None, among: set = None):
+    """
+    Searches the employees by name.
+
+    :param term: The text typed in the search bar.
+    :param limit: The maximum number of IDs returned, or None for every match.
+    :param among: Only these IDs can match, see NameSearchIndex.search().
+    :return: A list of employee IDs ordered by relevance, or by ID without a limit.
+    :raises Exception: If the index has to be built and the database query fails.
+    """
+    check_remote_changes()
+
+    if not name_index.loaded or time.monotonic() - name_index.loaded_at >= _index_max_age:
+        _load_index()
+
+    return name_index.search(term, limit, among)
@@ -0,0 +1,389 @@
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from services.core_services import get_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_principal(user):
+    """
+    Builds the compact user principal kept in the session from a users record.
+    Only what the routes need is kept; the password never leaves the database.
+
+    :param user: The EmployeeRecord returned by verify_auth().
+    :return: A dictionary with the keys id, last_name, first_name, role and active.
+    """
+    return {'id': user.ID,
+            'last_name': user.last_name,
+            'first_name': user.first_name,
+            'role': user.role,
+            'active': user.its_active == 1}
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session whose data is kept by a session backend; the cookie only holds its random ID.
+    """
+
+    def __init__(self, initial=None, sid: str = None, new: bool = False, created_at: float = None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.new = new
+        self.modified = False
+        self.created_at = created_at or time.time()
+        self.needs_touch = False  # Set when last_seen must be refreshed to extend the idle expiry
+        self.previous_sid = None
+
+    def regenerate(self):
+        """
+        Gives the session a new ID, e.g. after login, so a session ID known before login cannot be reused.
+        """
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.created_at = time.time()
+        self.modified = True
+
+
+class MemorySessionBackend:
+    """
+    Keeps the sessions in the memory of the process, evicting the least recently used ones.
+    Sessions are lost on restart and are not shared between worker processes.
+
+    :param max_size: The maximum number of sessions kept.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._records = OrderedDict()  # sid -> record
+        self._user_sids = {}  # user ID -> set of sids
+        self._lock = threading.Lock()
+
+    def get(self, sid: str):
+        with self._lock:
+            record = self._records.get(sid)
+
+            if record is not None:
+                self._records.move_to_end(sid)
+
+            return record
+
+    def set(self, sid: str, record: dict):
+        with self._lock:
+            self._store(sid, record)
+
+    def update(self, sid: str, record: dict):
+        with self._lock:
+            if sid in self._records:
+                self._store(sid, record)
+
+    def _store(self, sid, record):
+        self._discard(sid)
+        self._records[sid] = record
+
+        if record['user_id'] is not None:
+            self._user_sids.setdefault(record['user_id'], set()).add(sid)
+
+        while len(self._records) > self.max_size:
+            self._discard(next(iter(self._records)))
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._discard(sid)
+
+    def delete_user(self, user_id: int):
+        with self._lock:
+            for sid in list(self._user_sids.get(user_id, ())):
+                self._discard(sid)
+
+    def purge_expired(self, idle_before: float, created_before: float):
+        with self._lock:
+            for sid, record in list(self._records.items()):
+                if record['last_seen'] < idle_before or record['created_at'] < created_before:
+                    self._discard(sid)
+
+    def _discard(self, sid):
+        record = self._records.pop(sid, None)
+
+        if record is not None and record['user_id'] is not None:
+            sids = self._user_sids.get(record['user_id'])
+            sids.discard(sid)
+
+            if not sids:
+                del self._user_sids[record['user_id']]
+
+
+class SQLiteSessionBackend:
+    """
+    Keeps the sessions in a SQLite file, shared by every worker process of the same machine.
+
+    :param path: The path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._serializer = TaggedJSONSerializer()
+        self._local = threading.local()
+
+        # Closed right away: a preforking server creates the backend in its master, whose connections
+        # must not be inherited by the workers
+        connection = sqlite3.connect(self.path, timeout=5)
+
+        try:
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                                   'sid TEXT PRIMARY KEY, user_id INTEGER, data TEXT NOT NULL, '
+                                   'created_at REAL NOT NULL, last_seen REAL NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)')
+
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+
+        return connection
+
+    def get(self, sid: str):
+        row = self._connect().execute('SELECT user_id, data, created_at, last_seen FROM sessions WHERE sid = ?',
+                                      (sid,)).fetchone()
+
+        if row is None:
+            return None
+
+        return {'user_id': row[0], 'data': self._serializer.loads(row[1]), 'created_at': row[2], 'last_seen': row[3]}
+
+    def set(self, sid: str, record: dict):
+        with self._connect() as connection:
+            connection.execute('REPLACE INTO sessions (sid, user_id, data, created_at, last_seen) VALUES (?, ?, ?, ?, ?)',
+                               (sid, record['user_id'], self._serializer.dumps(record['data']),
+                                record['created_at'], record['last_seen']))
+
+    def update(self, sid: str, record: dict):
+        with self._connect() as connection:
+            connection.execute('UPDATE sessions SET user_id = ?, data = ?, last_seen = ? WHERE sid = ?',
+                               (record['user_id'], self._serializer.dumps(record['data']), record['last_seen'], sid))
+
+    def delete(self, sid: str):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_user(self, user_id: int):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+
+    def purge_expired(self, idle_before: float, created_before: float):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM sessions WHERE last_seen < ? OR created_at < ?', (idle_before, created_before))
+
+
+class MySQLSessionBackend:
+    """
+    Keeps the sessions in the Magnum_OPUS.sessions table (created by the migrations),
+    shared by every worker process and every server.
+
+    It uses its own pooled connection rather than the request-scoped one, so committing a session
+    never commits the pending work of a service.
+    """
+
+    def __init__(self):
+        self._serializer = TaggedJSONSerializer()
+
+    def _execute(self, sql_query: str, params: tuple, fetch: bool = False):
+        connection = None
+        cursor = None
+
+        try:
+            connection = get_pool().checkout()
+            cursor = connection.cursor()
+            cursor.execute(sql_query, params)
+
+            if fetch:
+                return cursor.fetchone()
+
+            connection.commit()
+
+        finally:
+            if connection is not None and cursor is not None:
+                cursor.close()
+                connection.close()
+
+    def get(self, sid: str):
+        row = self._execute('SELECT user_id, data, created_at, last_seen FROM Magnum_OPUS.sessions WHERE sid = %s',
+                            (sid,), fetch=True)
+
+        if row is None:
+            return None
+
+        return {'user_id': row[0], 'data': self._serializer.loads(row[1]), 'created_at': row[2], 'last_seen': row[3]}
+
+    def set(self, sid: str, record: dict):
+        self._execute('REPLACE INTO Magnum_OPUS.sessions (sid, user_id, data, created_at, last_seen) '
+                      'VALUES (%s, %s, %s, %s, %s)',
+                      (sid, record['user_id'], self._serializer.dumps(record['data']),
+                       record['created_at'], record['last_seen']))
+
+    def update(self, sid: str, record: dict):
+        self._execute('UPDATE Magnum_OPUS.sessions SET user_id = %s, data = %s, last_seen = %s WHERE sid = %s',
+                      (record['user_id'], self._serializer.dumps(record['data']), record['last_seen'], sid))
+
+    def delete(self, sid: str):
+        self._execute('DELETE FROM Magnum_OPUS.sessions WHERE sid = %s', (sid,))
+
+    def delete_user(self, user_id: int):
+        self._execute('DELETE FROM Magnum_OPUS.sessions WHERE user_id = %s', (user_id,))
+
+    def purge_expired(self, idle_before: float, created_before: float):
+        self._execute('DELETE FROM Magnum_OPUS.sessions WHERE last_seen < %s OR created_at < %s',
+                      (idle_before, created_before))
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface that stores the session data in a backend and only the session ID in the cookie.
+
+    :param backend: The session backend (memory, SQLite or MySQL).
+    :param idle_timeout: Seconds without any request after which a session expires.
+    :param absolute_timeout: Seconds after login after which a session expires in any case.
+    :param touch_interval: Minimum number of seconds between two refreshes of last_seen,
+                           so that a read-only request does not write to the backend each time.
+    :param purge_interval: Seconds between two deletions of the expired sessions from the backend.
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, backend, idle_timeout: float = 1800, absolute_timeout: float = 43200,
+                 touch_interval: float = 60, purge_interval: float = 600):
+        self.backend = backend
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+        self.touch_interval = touch_interval
+        self.purge_interval = purge_interval
+        self._next_purge = time.time() + purge_interval
+
+    def open_session(self, app, request):
+        # Static files never need the session: do not look it up for them
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.make_null_session(app)
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+
+        if not sid:
+            return self.session_class(new=True)
+
+        record = self.backend.get(sid)
+        now = time.time()
+
+        if record is None:
+            return self.session_class(new=True)
+
+        if now - record['last_seen'] > self.idle_timeout or now - record['created_at'] > self.absolute_timeout:
+            self.backend.delete(sid)
+            return self.session_class(new=True)
+
+        session = self.session_class(record['data'], sid=sid, created_at=record['created_at'])
+        session.needs_touch = now - record['last_seen'] > self.touch_interval
+
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.backend.delete(session.previous_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+
+            return
+
+        if time.time() > self._next_purge:
+            self._next_purge = time.time() + self.purge_interval
+            self.backend.purge_expired(time.time() - self.idle_timeout, time.time() - self.absolute_timeout)
+
+        if session.new or session.previous_sid or session.modified or session.needs_touch:
+            user = session.get('user')
+            record = {'user_id': user['id'] if user else None,
+                      'data': dict(session),
+                      'created_at': session.created_at,
+                      'last_seen': time.time()}
+
+            if session.new or session.previous_sid:
+                self.backend.set(session.sid, record)
+            else:
+                # Only an existing session is rewritten: one revoked while this request ran stays deleted
+                self.backend.update(session.sid, record)
+
+        if session.new or session.previous_sid:
+            response.set_cookie(name, session.sid,
+                                max_age=int(self.absolute_timeout),
+                                domain=domain,
+                                path=path,
+                                httponly=self.get_cookie_httponly(app),
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+
+def create_session_interface():
+    """
+    Creates the session interface configured by the environment variables:
+    SESSION_BACKEND ('memory', 'sqlite' or 'mysql'), SESSION_SQLITE_PATH, SESSION_MEMORY_MAX_SIZE,
+    SESSION_IDLE_TIMEOUT and SESSION_ABSOLUTE_TIMEOUT (seconds).
+
+    :return: A ServerSideSessionInterface.
+    :raises ValueError: If SESSION_BACKEND is unknown.
+    """
+    backend_name = os.getenv('SESSION_BACKEND', 'memory')
+
+    match backend_name:
+        case 'memory':
+            backend = MemorySessionBackend(int(os.getenv('SESSION_MEMORY_MAX_SIZE', 10000)))
+        case 'sqlite':
+            backend = SQLiteSessionBackend(os.getenv('SESSION_SQLITE_PATH', 'sessions.sqlite3'))
+        case 'mysql':
+            backend = MySQLSessionBackend()
+        case _:
+            raise ValueError(f'Unknown session backend: {backend_name}')
+
+    return ServerSideSessionInterface(backend,
+                                      idle_timeout=float(os.getenv('SESSION_IDLE_TIMEOUT', 1800)),
+                                      absolute_timeout=float(os.getenv('SESSION_ABSOLUTE_TIMEOUT', 43200)))
+
+
+session_interface = create_session_interface()
+
+
+def revoke_user_sessions(user_id: int):
+    """
+    Ends every session of a user, e.g. after the account was deactivated or deleted.
+
+    :param user_id: The ID of the user.
+    """
+    try:
+        session_interface.backend.delete_user(int(user_id))
+
+    except Exception as e:
+        logger.exception('Revoke user sessions Error: %s', e)
@@ -180,7 +180,7 @@ export class EmployeeFormController {
                 if (data.category === 'Success') {
                     this.notification.showNotification(data.category, data.message);
                     this.updateFormSizeAndState();
-                    this.cardEmployee.filterEmployees();
+                    this.cardEmployee.refreshAfterWrite();
                 } else if (data.category === 'Error'){
                     throw new Error(data.message);
                 }
@@ -0,0 +1,150 @@
+/**
+ * Class editing or deleting many employees at once, from the bulk bar above the employee cards.
+ *
+ * The action applies to the selected cards or, when "Toti angajatii filtrati" is checked, to every employee
+ * matching the current filters; either way the server changes all of them in a single request.
+ */
+export class BulkActions {
+    /**
+     * Create a BulkActions instance.
+     * @param {HTMLElement} bulkBar - The bar holding the bulk inputs and buttons.
+     * @param {CardEmployee} cardEmployees - The cardEmployee instance holding the selection and the filters.
+     * @param {Notification} notification - Notification system to display messages to the user.
+     */
+    constructor(bulkBar, cardEmployees, notification) {
+        this.bulkBar = bulkBar;
+        this.cardEmployees = cardEmployees;
+        this.notification = notification;
+
+        this.selectedCount = bulkBar.querySelector('#bulk-selected-count');
+        this.useFilter = bulkBar.querySelector('#bulk-use-filter');
+        this.department = bulkBar.querySelector('#bulk-department');
+        this.role = bulkBar.querySelector('#bulk-role');
+        this.date = bulkBar.querySelector('#bulk-date');
+        this.active = bulkBar.querySelector('#bulk-active');
+        this.allInputs = bulkBar.querySelectorAll('.bulk-input');
+        this.editButton = bulkBar.querySelector('#bulk-edit-button');
+        this.deleteButton = bulkBar.querySelector('#bulk-delete-button');
+
+        this.syncSelectOptionsBetweenDepartmentAndRole();
+        this.updateState();
+
+        this.setupEventListeners();
+    }
+
+    /**
+     * Set up event listeners for the bulk bar and the card checkboxes.
+     */
+    setupEventListeners() {
+        this.cardEmployees.employeesContainer.addEventListener('selectionchange', () => this.updateState());
+        this.useFilter.addEventListener('change', () => this.updateState());
+        this.department.addEventListener('change', () => this.syncSelectOptionsBetweenDepartmentAndRole());
+        this.editButton.addEventListener('click', () => this.editEmployees());
+        this.deleteButton.addEventListener('click', () => this.deleteEmployees());
+    }
+
+    /**
+     * Sync role options based on the selected department.
+     */
+    syncSelectOptionsBetweenDepartmentAndRole() {
+        const options = {
+            IT: ['Manager IT', 'Suport', 'Tehnic'],
+            Operational: ['Director Operational', 'Manager Regional', 'Manager Zonal', 'Manager Local', 'Operator']
+        };
+
+        this.role.innerHTML = '';
+
+        const placeholder = document.createElement('option');
+        placeholder.value = '';
+        placeholder.textContent = 'Rol';
+        placeholder.selected = true;
+        this.role.appendChild(placeholder);
+
+        (options[this.department.value] || []).forEach(role => {
+            const newOption = document.createElement('option');
+            newOption.value = role;
+            newOption.textContent = role;
+            this.role.appendChild(newOption);
+        });
+    }
+
+    /**
+     * Update the selection counter and enable the buttons when there is something to change.
+     */
+    updateState() {
+        const count = this.cardEmployees.selection.size;
+
+        this.selectedCount.textContent = this.useFilter.checked ? 'Toti filtrati' : `${count} selectati`;
+        this.editButton.disabled = this.deleteButton.disabled = !this.useFilter.checked && count === 0;
+    }
+
+    /**
+     * Return the users targeted by the bulk action, in the shape expected by the bulk endpoints.
+     * @returns {Object} - {filter} when the filtered employees are targeted, {userIDs} otherwise.
+     */
+    getTarget() {
+        if (this.useFilter.checked) {
+            return { filter: this.cardEmployees.getFilters() };
+        }
+        return { userIDs: Array.from(this.cardEmployees.selection) };
+    }
+
+    /**
+     * Apply the bulk inputs that were filled to the targeted employees.
+     * Prompts for confirmation before proceeding with the edit.
+     */
+    editEmployees() {
+        const confirmation = confirm("Sigur vrei sa editezi toti utilizatorii selectati ?");
+
+        if (confirmation) {
+            this.send('employees/edit/bulk', 'PUT', {
+                ...this.getTarget(),
+                department: this.department.value,
+                role: this.role.value,
+                date: this.date.value,
+                itsActive: this.active.value
+            });
+        }
+    }
+
+    /**
+     * Delete the targeted employees.
+     * Prompts for confirmation before proceeding with deletion.
+     */
+    deleteEmployees() {
+        const confirmation = confirm("Sigur vrei sa stergi toti utilizatorii selectati ?");
+
+        if (confirmation) {
+            this.send('employees/delete/bulk', 'DELETE', this.getTarget());
+        }
+    }
+
+    /**
+     * Send a bulk request, then clear the selection and reload the employee cards.
+     * @param {string} url - The bulk endpoint.
+     * @param {string} method - The HTTP method.
+     * @param {Object} body - The request body.
+     */
+    send(url, method, body) {
+        fetch(url, {
+            method: method,
+            headers: { 'Content-type': 'application/json' },
+            body: JSON.stringify(body)
+        })
+            .then(response => response.json())
+            .then(data => {
+                this.notification.showNotification(data.category, data.message);
+
+                if (data.category !== 'Error') {
+                    this.allInputs.forEach(input => input.value = '');
+                    this.syncSelectOptionsBetweenDepartmentAndRole();
+                    this.useFilter.checked = false;
+                    this.cardEmployees.clearSelection();
+                    this.cardEmployees.refreshAfterWrite();
+                }
+            })
+            .catch(error => {
+                this.notification.showNotification('Error', error.message);
+            });
+    }
+}
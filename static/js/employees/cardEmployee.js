@@ -1,3 +1,9 @@
+import { EmployeesRenderer } from "./employeesRenderer.js";
+
+// Edit form rendered once per page; a copy is added to a card the first time it is edited
+const editFormTemplate = document.getElementById('edit-employee-template');
+const cardTemplate = document.getElementById('employee-card-template');
+
 /**
  * Class representing an employee card management system.
  */
@@ -19,6 +25,23 @@ export class CardEmployee {
         this.employeesContainer = employeesContainer;
         this.notification = notification;
 
+        this.pageSize = 50;  // Number of employees requested per page
+        this.nextCursor = null;  // Cursor of the next page, null when every page was loaded
+        this.loading = false;
+        this.generation = 0;  // Incremented on every new filter so late pages of an old filter are dropped
+        this.abortController = null;  // Aborts the requests of the previous filter when a new one starts
+        this.searchDelay = 250;  // Milliseconds without typing before the search is sent
+        this.searchTimer = null;
+        this.selection = new Set();  // IDs of the selected employees, kept while the filters change
+
+        this.events = null;  // EventSource of the change feed, opened with the first page
+        this.recentChanges = [];  // Last changes received, applied again to a page read before them
+        this.maxRecentChanges = 200;
+        this.reloadTimer = null;
+
+        this.renderer = new EmployeesRenderer(employeesContainer, cardTemplate,
+            card => new FullCardEmployee(card, this.notification, this.refreshAfterWrite.bind(this), this.selection));
+
         this.filterEmployees();
 
         this.syncSelectOptionsBetweenDepartmentAndRole();
@@ -36,7 +59,8 @@ export class CardEmployee {
             this.syncSelectOptionsBetweenDepartmentAndRole();
             this.filterEmployees();
         });
-        this.searchBar.addEventListener('input', this.filterEmployees.bind(this));
+        this.searchBar.addEventListener('input', this.scheduleFilter.bind(this));
+        this.employeesContainer.addEventListener('scroll', () => this.loadMoreOnScroll());
     }
 
     /**
@@ -103,87 +127,329 @@ export class CardEmployee {
         });
     }
 
+    /**
+     * Return the current filters, in the shape expected by the bulk endpoints.
+     * @returns {Object} - The filterRole, filterDepartment and searchBar values.
+     */
+    getFilters() {
+        return {
+            filterRole: this.filterRole.value,
+            filterDepartment: this.filterDepartment.value,
+            searchBar: this.searchBar.value
+        };
+    }
+
+    /**
+     * Unselect every employee.
+     */
+    clearSelection() {
+        this.selection.clear();
+        this.employeesContainer.querySelectorAll('.card-select:checked').forEach(checkbox => checkbox.checked = false);
+        this.employeesContainer.dispatchEvent(new Event('selectionchange'));
+    }
+
+    /**
+     * Filter employees once the user stops typing in the search bar, so that a word typed quickly
+     * sends one request instead of one per keystroke.
+     */
+    scheduleFilter() {
+        clearTimeout(this.searchTimer);
+        this.searchTimer = setTimeout(() => this.filterEmployees(), this.searchDelay);
+    }
+
     /**
      * Filter employees based on selected criteria and search input.
+     * Replaces the container with the first page of results; the requests of the previous filter are aborted.
      */
     filterEmployees() {
-        fetch('employees/filter', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                filterBy: this.filterBy.value,
-                filterRole: this.filterRole.value,
-                filterDepartment: this.filterDepartment.value,
-                searchBar: this.searchBar.value
-            })
-        })
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('Network response was not ok');
+        clearTimeout(this.searchTimer);
+
+        if (this.abortController) {
+            this.abortController.abort();
+        }
+        this.abortController = new AbortController();
+
+        this.generation++;
+        this.nextCursor = null;
+
+        this.fetchEmployeesPage(null)
+            .then(payload => {
+                if (payload === null) {
+                    return;
                 }
-                return response.text();
+                this.renderer.render(payload);  // Update the container with the filtered results
+                this.employeesContainer.scrollTop = 0;
+                this.replayChanges(payload.version);
+                this.subscribe(payload.version);
             })
-            .then(html => {
-                this.employeesContainer.innerHTML = html;  // Update the container with the filtered results
-                this.setFullCard();
+            .catch(error => this.showError(error));
+    }
+
+    /**
+     * Append the next page of employees to the container, if there is one.
+     */
+    loadMoreEmployees() {
+        if (!this.nextCursor || this.loading) {
+            return;
+        }
+
+        this.fetchEmployeesPage(this.nextCursor)
+            .then(payload => {
+                if (payload === null) {
+                    return;
+                }
+                this.renderer.render(payload, true);
+                this.replayChanges(payload.version);
             })
-            .catch(error => this.notification.showNotification('Error', error.message));  // Show error notification
+            .catch(error => this.showError(error));
+    }
+
+    /**
+     * Refresh the list after a write made on this page. While the change feed is connected the write comes
+     * back as a change that patches the affected cards, otherwise the list is filtered again.
+     */
+    refreshAfterWrite() {
+        if (!this.events || this.events.readyState !== EventSource.OPEN) {
+            this.filterEmployees();
+        }
+    }
+
+    /**
+     * Subscribe to the change feed of the employees, starting after the version of the first page.
+     * On a reconnection the browser sends the ID of the last change received and the server resumes after it.
+     * @param {number|null} version - The version of the change log the page was read at.
+     */
+    subscribe(version) {
+        if (this.events || version === null || version === undefined) {
+            return;
+        }
+
+        this.events = new EventSource(`/api/v1/employees/events?since=${version}`);
+
+        this.events.addEventListener('change', event => this.onChange(JSON.parse(event.data)));
+        this.events.addEventListener('reset', () => this.scheduleReload());  // Changes missed for too long
+    }
+
+    /**
+     * Apply a change received from the change feed to the displayed cards.
+     * @param {Object} change - The change: {version, op, id, row}.
+     */
+    onChange(change) {
+        this.recentChanges.push(change);
+
+        if (this.recentChanges.length > this.maxRecentChanges) {
+            this.recentChanges.shift();
+        }
+
+        this.applyChange(change);
+    }
+
+    /**
+     * Apply again the changes received after the version a page was read at, which it may not include.
+     * @param {number|null} version - The version of the change log the page was read at.
+     */
+    replayChanges(version) {
+        if (version === null || version === undefined) {
+            return;
+        }
+
+        this.recentChanges.filter(change => change.version > version).forEach(change => this.applyChange(change));
+    }
+
+    /**
+     * Patch the cards affected by one change.
+     * @param {Object} change - The change: {version, op, id, row}.
+     */
+    applyChange(change) {
+        if (change.op === 'reload') {
+            this.scheduleReload();
+            return;
+        }
+
+        if (change.op === 'delete' && this.selection.delete(change.id)) {
+            this.employeesContainer.dispatchEvent(new Event('selectionchange'));
+        }
+
+        this.renderer.applyChange(change, this.currentView());
+    }
+
+    /**
+     * Filter the employees again shortly, once for a burst of reloads (an import commits in several parts).
+     */
+    scheduleReload() {
+        clearTimeout(this.reloadTimer);
+        this.reloadTimer = setTimeout(() => this.filterEmployees(), this.searchDelay);
+    }
+
+    /**
+     * Describe the displayed list for EmployeesRenderer.applyChange().
+     * With a search term only the displayed cards are updated: the ranking of the matches is the server's.
+     * @returns {Object} - {accepts(employee), compare(a, b) or null, complete}.
+     */
+    currentView() {
+        const role = this.filterRole.value;
+        const department = this.filterDepartment.value;
+        const search = this.searchBar.value.trim();
+
+        const byName = (a, b) => a.last_name.localeCompare(b.last_name, 'ro', { sensitivity: 'base' }) ||
+            a.first_name.localeCompare(b.first_name, 'ro', { sensitivity: 'base' }) || a.ID - b.ID;
+        const byDate = (a, b) => a.employment_date.localeCompare(b.employment_date) || a.ID - b.ID;
+
+        const orders = {
+            asc: byName,
+            desc: (a, b) => byName(b, a),
+            date_asc: byDate,
+            date_desc: (a, b) => byDate(b, a)
+        };
+
+        return {
+            accepts: employee => (!role || employee.role === role) &&
+                (!department || employee.department === department) &&
+                (!search || Boolean(this.renderer.cards.get(employee.ID)?.isConnected)),
+            compare: orders[this.filterBy.value] || (search ? null : (a, b) => a.ID - b.ID),
+            complete: this.nextCursor === null
+        };
+    }
+
+    /**
+     * Show the error of a page request, except for the requests aborted by a newer filter.
+     * @param {Error} error - The error of the request.
+     */
+    showError(error) {
+        if (error.name !== 'AbortError') {
+            this.notification.showNotification('Error', error.message);  // Show error notification
+        }
     }
 
     /**
-     * Set up full employee cards based on the filtered results.
+     * Load the next page when the user scrolls close to the bottom of the container.
      */
-    setFullCard() {
-        this.employeeCard = this.employeesContainer.querySelectorAll('.full-card-employee');
+    loadMoreOnScroll() {
+        const container = this.employeesContainer;
 
-        this.employeeCard.forEach(card => {
-            new FullCardEmployee(card, this.notification, this.filterEmployees.bind(this));
+        if (container.scrollTop + container.clientHeight >= container.scrollHeight - 400) {
+            this.loadMoreEmployees();
+        }
+    }
+
+    /**
+     * Request one page of employees matching the current filters.
+     * The server answers with an ETag; the browser revalidates its copy and gets 304 Not Modified
+     * as long as no employee was changed.
+     * @param {string|null} cursor - Cursor of the page to load, null for the first page.
+     * @returns {Promise<Object|null>} - The columnar page of employees, or null if the filters changed meanwhile.
+     */
+    fetchEmployeesPage(cursor) {
+        const generation = this.generation;
+        this.loading = true;
+
+        const params = new URLSearchParams({
+            filterBy: this.filterBy.value,
+            filterRole: this.filterRole.value,
+            filterDepartment: this.filterDepartment.value,
+            searchBar: this.searchBar.value,
+            pageSize: this.pageSize
         });
+
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+
+        return fetch(`/api/v1/employees?${params}`, { signal: this.abortController.signal })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Network response was not ok');
+                }
+                return response.json();
+            })
+            .then(payload => {
+                if (generation !== this.generation) {
+                    return null;
+                }
+                this.nextCursor = payload.next_cursor;
+                return payload;
+            })
+            .finally(() => {
+                if (generation === this.generation) {
+                    this.loading = false;
+                }
+            });
     }
 }
 
 /**
  * Class representing an employee's full card with editing capabilities.
+ * The card only carries the employee's data; its edit form is created from the shared template on the first edit.
  */
 class FullCardEmployee {
     /**
      * Create a FullCardEmployee instance.
      * @param {HTMLElement} card - The card element representing an employee.
      * @param {Notification} notification - Notification system to display messages to the user.
-     * @param {Function} filter - Function to filter employees after actions like editing or deleting.
+     * @param {Function} filter - Function refreshing the list after actions like editing or deleting.
+     * @param {Set<number>} selection - IDs of the selected employees, shared by all the cards.
      */
-    constructor(card, notification, filter) {
+    constructor(card, notification, filter, selection) {
         this.card = card;
         this.notification = notification;
         this.filter = filter;
+        this.selection = selection;
 
         this.userID = this.card.dataset.userId;
 
-        this.editContainer = card.querySelector('.edit-employee');
+        this.editContainer = null;  // Created by hydrateEditForm()
 
         this.editButton = card.querySelector('.card-edit-button');
+        this.selectCheckbox = card.querySelector('.card-select');
 
-        this.deleteButton = card.querySelector('.edit-delete');
-        this.saveButton = card.querySelector('.edit-save');
-
-        this.allInputs = card.querySelectorAll('.edit-input');
-
-        this.department = card.querySelector('#edit-departmnet');
-        this.role = card.querySelector('#edit-role');
+        this.selectCheckbox.checked = this.selection.has(Number(this.userID));
 
         this.setupEventListeners();
-
-        this.syncSelectOptionsBetweenDepartmentAndRole();
     }
 
     /**
-     * Set up event listeners for the card's buttons and inputs.
+     * Set up event listeners for the card's buttons.
      */
     setupEventListeners() {
-        this.editButton.addEventListener('click', () => this.updateFormSizeAndState());
+        this.editButton.addEventListener('click', () => {
+            if (!this.editContainer) {
+                this.hydrateEditForm();
+            }
+            this.updateFormSizeAndState();
+        });
+        this.selectCheckbox.addEventListener('change', () => {
+            if (this.selectCheckbox.checked) {
+                this.selection.add(Number(this.userID));
+            } else {
+                this.selection.delete(Number(this.userID));
+            }
+            this.card.dispatchEvent(new Event('selectionchange', { bubbles: true }));
+        });
+    }
+
+    /**
+     * Add a copy of the shared edit form to the card and set up its inputs.
+     */
+    hydrateEditForm() {
+        this.card.appendChild(editFormTemplate.content.cloneNode(true));
+
+        this.editContainer = this.card.querySelector('.edit-employee');
+
+        this.deleteButton = this.card.querySelector('.edit-delete');
+        this.saveButton = this.card.querySelector('.edit-save');
+
+        this.allInputs = this.card.querySelectorAll('.edit-input');
+
+        this.department = this.card.querySelector('#edit-departmnet');
+        this.role = this.card.querySelector('#edit-role');
+
         this.deleteButton.addEventListener('click', () => this.deleteEmployee());
         this.saveButton.addEventListener('click', () => this.editEmployee());
         this.department.addEventListener('change', () => this.syncSelectOptionsBetweenDepartmentAndRole());
+
+        this.syncSelectOptionsBetweenDepartmentAndRole();
+
+        void this.editContainer.offsetWidth;  // Apply the initial width so that opening the form is animated
     }
 
     /**
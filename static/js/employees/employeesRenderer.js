@@ -0,0 +1,196 @@
+/**
+ * Class rendering the employee cards from the columnar payload of /api/v1/employees.
+ *
+ * Card elements are kept by employee ID and reused: when the filters change, the cards that are still
+ * in the results are only moved and have their changed texts updated, the others are detached,
+ * and new elements are only created for employees that were never displayed.
+ */
+export class EmployeesRenderer {
+    /**
+     * Create an EmployeesRenderer instance.
+     * @param {HTMLElement} container - Container element for the employee cards.
+     * @param {HTMLTemplateElement} cardTemplate - Template of an empty employee card.
+     * @param {Function} onCardCreated - Called with every newly created card element.
+     * @param {number} maxCachedCards - Maximum number of cards kept in memory, displayed or not.
+     */
+    constructor(container, cardTemplate, onCardCreated, maxCachedCards = 1000) {
+        this.container = container;
+        this.cardTemplate = cardTemplate;
+        this.onCardCreated = onCardCreated;
+        this.maxCachedCards = maxCachedCards;
+
+        this.cards = new Map();  // Employee ID -> card element
+        this.employees = new Map();  // Employee ID -> data of the card, used to place the changed cards
+    }
+
+    /**
+     * Convert the columnar payload to a list of employee objects.
+     * @param {Object} payload - The JSON returned by /api/v1/employees.
+     * @returns {Array<Object>} - One object per employee, keyed by column name.
+     */
+    static decode(payload) {
+        const names = Object.keys(payload.columns);
+        const employees = [];
+
+        for (let row = 0; row < payload.count; row++) {
+            const employee = {};
+
+            names.forEach(name => {
+                const value = payload.columns[name][row];
+                employee[name] = name in payload.dictionaries ? payload.dictionaries[name][value] : value;
+            });
+
+            employees.push(employee);
+        }
+
+        return employees;
+    }
+
+    /**
+     * Display a page of employees.
+     * @param {Object} payload - The JSON returned by /api/v1/employees.
+     * @param {boolean} append - Add the cards after the displayed ones instead of replacing them.
+     */
+    render(payload, append = false) {
+        let next = append ? null : this.container.firstElementChild;  // First card not yet at its place
+
+        EmployeesRenderer.decode(payload).forEach(employee => {
+            const card = this.getCard(employee);
+
+            if (card === next) {
+                next = next.nextElementSibling;
+            } else {
+                this.container.insertBefore(card, next);
+            }
+        });
+
+        while (next) {
+            const following = next.nextElementSibling;
+            next.remove();
+            next = following;
+        }
+
+        this.evictDetachedCards();
+    }
+
+    /**
+     * Return the card of an employee, creating it or updating its texts.
+     * @param {Object} employee - The employee data.
+     * @returns {HTMLElement} - The card element.
+     */
+    getCard(employee) {
+        let card = this.cards.get(employee.ID);
+
+        this.employees.set(employee.ID, employee);
+
+        if (!card) {
+            card = this.cardTemplate.content.firstElementChild.cloneNode(true);
+            card.dataset.userId = employee.ID;
+            this.fillCard(card, employee);
+            this.cards.set(employee.ID, card);
+            this.onCardCreated(card);
+        } else {
+            this.fillCard(card, employee);
+        }
+
+        return card;
+    }
+
+    /**
+     * Write the employee data in a card, touching only the texts that changed.
+     * @param {HTMLElement} card - The card element.
+     * @param {Object} employee - The employee data.
+     */
+    fillCard(card, employee) {
+        const phone = employee.phone_number || '';
+
+        setText(card.querySelector('#info-employee h1'), `${employee.last_name} ${employee.first_name}`);
+        setText(card.querySelector('#info-employee h3'), employee.role);
+        setText(card.querySelector('#department-container p'), employee.department);
+        setText(card.querySelector('#phone-container p'), `${phone.slice(0, 4)} ${phone.slice(4, 7)} ${phone.slice(7)}`);
+        setText(card.querySelector('#date-container p'), employee.employment_date);
+
+        card.querySelector('#active-container').style.display = employee.its_active === 0 ? '' : 'none';
+    }
+
+    /**
+     * Apply a change of the change feed to the cards, without reloading the list.
+     * @param {Object} change - The change: {version, op, id, row}; row holds the new data of an 'upsert'.
+     * @param {Object} view - The displayed list: accepts(employee) tells whether an employee belongs to it,
+     *                        compare(a, b) is its sort order (null to leave the cards where they are)
+     *                        and complete is true once every page is displayed.
+     */
+    applyChange(change, view) {
+        const card = this.cards.get(change.id);
+        const displayed = Boolean(card && card.isConnected);
+
+        if (change.op === 'delete') {
+            if (card) {
+                card.remove();
+                this.cards.delete(change.id);
+                this.employees.delete(change.id);
+            }
+            return;
+        }
+
+        const employee = change.row;
+
+        if (!view.accepts(employee) || !view.compare) {
+            if (card) {
+                this.getCard(employee);  // Only updates the texts
+
+                if (displayed && !view.accepts(employee)) {
+                    card.remove();
+                }
+            }
+            return;
+        }
+
+        // The first displayed card that comes after the employee; without one, the employee is either last
+        // or part of a page that is not loaded yet
+        const next = Array.from(this.container.children).find(other => other !== card &&
+            view.compare(employee, this.employees.get(Number(other.dataset.userId))) < 0) || null;
+
+        if (!next && !view.complete) {
+            if (card) {
+                this.getCard(employee);
+                card.remove();
+            }
+            return;
+        }
+
+        const target = this.getCard(employee);
+
+        if (!displayed || target.nextElementSibling !== next) {
+            this.container.insertBefore(target, next);
+        }
+    }
+
+    /**
+     * Forget the oldest cards that are not displayed once more than maxCachedCards are kept.
+     */
+    evictDetachedCards() {
+        for (const [employeeID, card] of this.cards) {
+            if (this.cards.size <= this.maxCachedCards) {
+                break;
+            }
+            if (!card.isConnected) {
+                this.cards.delete(employeeID);
+                this.employees.delete(employeeID);
+            }
+        }
+    }
+}
+
+/**
+ * Set the text of an element if it is different.
+ * @param {HTMLElement} element - The element.
+ * @param {string} text - The new text.
+ */
+function setText(element, text) {
+    text = text ?? '';
+
+    if (element.textContent !== text) {
+        element.textContent = text;
+    }
+}
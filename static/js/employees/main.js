@@ -1,6 +1,7 @@
 import { EmployeeFormController } from "./addEmployee.js";
 import { Notification } from "./notification.js";
 import { CardEmployee } from "./cardEmployee.js";
+import { BulkActions } from "./bulkActions.js";
 
 
 // DOM elements for notification
@@ -25,4 +26,10 @@ const AddEmployeeFormButton = document.getElementById('add-employee-button');  /
 const addEmployeeForm = document.getElementById('add-employeed-form');  // Form
 
 // Initialize the EmployeeFormController instance to manage the employee form
-new EmployeeFormController(AddEmployeeFormButton, addEmployeeForm, notification, cardEmployees);
\ No newline at end of file
+new EmployeeFormController(AddEmployeeFormButton, addEmployeeForm, notification, cardEmployees);
+
+// Bar editing or deleting the selected employees at once
+const bulkBar = document.getElementById('bulk-bar');
+
+// Initialize the BulkActions instance to manage the bulk bar
+new BulkActions(bulkBar, cardEmployees, notification);